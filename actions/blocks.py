@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+from shared_data.shared_data import web3, ws_transport
+from shared_data.events import publish, subscribe
+
+# BASE produces a block every 2 seconds
+BLOCK_POLL_INTERVAL = float(os.getenv("BLOCK_POLL_INTERVAL", "1"))
+BLOCK_MAX_STALENESS = float(os.getenv("BLOCK_MAX_STALENESS", "10"))  # seconds before callers fetch the block themselves
+
+_latest_block = None
+_block_lock = threading.Lock()
+_poller_thread = None
+
+
+def update_latest_block(block):
+    """
+    Store a new block header if it is more recent than the cached one, and publish it as a "block" event.
+    """
+    global _latest_block
+    header = {
+        "number": block["number"],
+        "timestamp": block["timestamp"],
+        "base_fee": block.get("baseFeePerGas"),
+        "received_at": time.time(),
+    }
+    with _block_lock:
+        is_new = _latest_block is None or header["number"] > _latest_block["number"]
+        if is_new or header["number"] == _latest_block["number"]:
+            _latest_block = header
+    if is_new:
+        publish("block", header)
+    return header
+
+
+def _is_pushed():
+    """
+    True while the websocket delivers blocks, polling is then not needed.
+    """
+    if ws_transport is None or not ws_transport.is_connected():
+        return False
+    with _block_lock:
+        header = _latest_block
+    return header is not None and time.time() - header["received_at"] < BLOCK_MAX_STALENESS
+
+
+def _poll_blocks():
+    while True:
+        try:
+            if not _is_pushed():
+                update_latest_block(web3.eth.get_block("latest"))
+        except Exception as e:
+            print(f"[ERROR] Failed to poll latest block: {e}")
+        time.sleep(BLOCK_POLL_INTERVAL)
+
+
+def start_block_poller():
+    """
+    Start the background thread that keeps the latest block header fresh,
+    and the websocket transport if one is configured (polling then only runs while it is down).
+    """
+    global _poller_thread
+    with _block_lock:
+        if _poller_thread is not None:
+            return
+        _poller_thread = threading.Thread(target=_poll_blocks, name="block-poller", daemon=True)
+    if ws_transport is not None:
+        subscribe("new_head", update_latest_block)
+        ws_transport.start()
+    _poller_thread.start()
+
+
+def get_latest_block():
+    """
+    Return the latest block header (number, timestamp, base_fee) from the cache.
+    Only fetches it from the node when the cache is empty or older than BLOCK_MAX_STALENESS.
+    """
+    start_block_poller()
+    with _block_lock:
+        header = _latest_block
+    if header is None or time.time() - header["received_at"] > BLOCK_MAX_STALENESS:
+        header = update_latest_block(web3.eth.get_block("latest"))
+    return header
+
+
+def swap_deadline(seconds=600):
+    """
+    Deadline for a swap, `seconds` after the latest block.
+    """
+    return get_latest_block()["timestamp"] + seconds
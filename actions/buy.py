@@ -1,37 +1,42 @@
 from decimal import Decimal
-from shared_data.shared_data import web3, user_gwei_preferences, fee_recipient, weth_address, virtual_token_address
-from actions.contracts import uniswap_router
-from actions.utils import calculate_fees, load_contract
+from shared_data.shared_data import web3, get_chain_id, user_gwei_preferences, fee_recipient, weth_address, virtual_token_address, TRADE_ROUTE_MODE, PIPELINE_TRANSACTIONS
+from actions.contracts import uniswap_router, load_erc20, encode_path
+from actions.utils import calculate_fees
+from actions.nonces import allocate_nonces
+from actions.transactions import send_transaction, release_trade_nonces, confirming, run_steps, report_progress
+from actions.blocks import swap_deadline
+from actions.receipts import wait_for_receipt
+from actions.gas import gas_key, estimate_gas_limit, expected_gas
+from actions.fee_oracle import get_gas_fees, DEFAULT_FEE_TIER
+from actions.quotes import amount_out_minimum, get_slippage, buy_path
 
-def send_fees(wallet, fee_recipient, fee_amount, gas_price, nonce):
+def send_fees(wallet, fee_recipient, fee_amount, gas_fees, nonce, wait=True):
     """
     Send fees to the specified address.
+    With wait=False, return as soon as the transaction is broadcast.
     """
     tx_fee_transfer = {
         "from": wallet["address"],
         "to": web3.to_checksum_address(fee_recipient),
         "value": web3.to_wei(fee_amount, "ether"),
-        "gas": 21000,  # Simple transfer
-        "gasPrice": gas_price,
-        "nonce": nonce,
     }
+    fee_gas_key = gas_key("transfer", tx_fee_transfer["to"])
+    tx_fee_transfer["gas"] = estimate_gas_limit(fee_gas_key, lambda: web3.eth.estimate_gas(dict(tx_fee_transfer)))
+    tx_fee_transfer.update(gas_fees)
+    tx_fee_transfer["nonce"] = nonce
+    tx_fee_transfer["chainId"] = get_chain_id()
     print("[DEBUG] Fee Transaction:", tx_fee_transfer)
 
-    signed_fee_transfer = web3.eth.account.sign_transaction(tx_fee_transfer, wallet["private_key"])
-    print("[DEBUG] Signed Fee Transaction:", signed_fee_transfer)
-
-    raw_transaction = getattr(signed_fee_transfer, "raw_transaction", None)
-    if not raw_transaction:
-        raise Exception("[ERROR] Missing raw_transaction in the signed transaction.")
-
-    tx_hash_fee_transfer = web3.eth.send_raw_transaction(raw_transaction)
+    tx_hash_fee_transfer = send_transaction(wallet, tx_fee_transfer, gas_key=fee_gas_key)
     print("[DEBUG] Fee Transaction Hash:", tx_hash_fee_transfer.hex())
-    web3.eth.wait_for_transaction_receipt(tx_hash_fee_transfer)
+    if wait:
+        wait_for_receipt(tx_hash_fee_transfer)
     return tx_hash_fee_transfer
 
-def swap_eth_to_weth(wallet, eth_amount, gas_price, nonce):
+def swap_eth_to_weth(wallet, eth_amount, gas_fees, nonce, wait=True):
     """
     Deposit ETH into the WETH contract to obtain WETH.
+    With wait=False, return as soon as the transaction is broadcast.
     """
     weth_abi = [
         {
@@ -45,62 +50,73 @@ def swap_eth_to_weth(wallet, eth_amount, gas_price, nonce):
         }
     ]
     weth_contract = web3.eth.contract(address=weth_address, abi=weth_abi)
+    value = web3.to_wei(eth_amount, "ether")
+    deposit_gas_key = gas_key("wrap", weth_address)
+    gas = estimate_gas_limit(deposit_gas_key, lambda: weth_contract.functions.deposit().estimate_gas({"from": wallet["address"], "value": value}))
 
     tx = weth_contract.functions.deposit().build_transaction({
         "from": wallet["address"],
-        "value": web3.to_wei(eth_amount, "ether"),
-        "gas": 100000,  
-        "gasPrice": gas_price,
+        "value": value,
+        "gas": gas,
+        **gas_fees,
         "nonce": nonce,
+        "chainId": get_chain_id(),
     })
 
     print("[DEBUG] WETH Deposit Transaction:", tx)
 
-    signed_tx = web3.eth.account.sign_transaction(tx, wallet["private_key"])
-    tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+    tx_hash = send_transaction(wallet, tx, gas_key=deposit_gas_key)
     print("[DEBUG] WETH Deposit Transaction Hash:", tx_hash.hex())
-    web3.eth.wait_for_transaction_receipt(tx_hash)
+    if wait:
+        wait_for_receipt(tx_hash)
     return tx_hash
 
-def swap_weth_to_virtual(wallet, amount_in, gas_price, nonce):
+def swap_weth_to_virtual(wallet, amount_in, gas_fees, nonce, wait=True):
     """
     Swap WETH to Virtual Token via Uniswap.
+    With wait=False, return as soon as the transaction is broadcast.
     """
+    amount_in = web3.to_wei(amount_in, "ether")
     params = {
         "tokenIn": weth_address,
         "tokenOut": virtual_token_address,
         "fee": 3000,  
         "recipient": wallet["address"],
-        "deadline": web3.eth.get_block("latest")["timestamp"] + 600,
-        "amountIn": web3.to_wei(amount_in, "ether"),
-        "amountOutMinimum": 1,  
+        "deadline": swap_deadline(),
+        "amountIn": amount_in,
+        "amountOutMinimum": amount_out_minimum([weth_address, virtual_token_address], [3000], amount_in, get_slippage(wallet.get("chat_id"))),
         "sqrtPriceLimitX96": 0,
     }
     print("[DEBUG] WETH to Virtual Params:", params)
 
+    swap_gas_key = gas_key("swap", uniswap_router.address, weth_address, virtual_token_address, 3000)
+    # the WETH deposit may not be mined yet, the estimate then falls back to the last known limit
+    gas = estimate_gas_limit(swap_gas_key, lambda: uniswap_router.functions.exactInputSingle(params).estimate_gas({"from": wallet["address"]}))
     tx = uniswap_router.functions.exactInputSingle(params).build_transaction({
         "from": wallet["address"],
         "nonce": nonce,
-        "gas": 250000,
-        "gasPrice": gas_price,
+        "chainId": get_chain_id(),
+        "gas": gas,
+        **gas_fees,
     })
 
     print("[DEBUG] WETH to Virtual Transaction:", tx)
 
-    signed_tx = web3.eth.account.sign_transaction(tx, wallet["private_key"])
-    tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+    tx_hash = send_transaction(wallet, tx, gas_key=swap_gas_key)
     print("[DEBUG] WETH to Virtual Transaction Hash:", tx_hash.hex())
 
-    receipt = web3.eth.wait_for_transaction_receipt(tx_hash, timeout=300)
-    if receipt.status == 0:
-        raise Exception("WETH to Virtual swap transaction failed.")
+    if wait:
+        receipt = wait_for_receipt(tx_hash, timeout=300)
+        if receipt.status == 0:
+            raise Exception("WETH to Virtual swap transaction failed.")
     return tx_hash
 
-def swap_virtual_to_token(wallet, token_address, gas_price, nonce):
+def swap_virtual_to_token(wallet, token_address, gas_fees, nonce, wait=True):
     """
     Swap Virtual Token to the Target Token via Uniswap.
+    With wait=False, return as soon as the transaction is broadcast.
     """
-    virtual_contract = load_contract(virtual_token_address)
+    virtual_contract = load_erc20(virtual_token_address)
     virtual_balance = virtual_contract.functions.balanceOf(wallet["address"]).call()
     
     if virtual_balance <= 0:
@@ -113,53 +129,156 @@ def swap_virtual_to_token(wallet, token_address, gas_price, nonce):
         "tokenOut": web3.to_checksum_address(token_address),
         "fee": 3000,
         "recipient": wallet["address"],
-        "deadline": web3.eth.get_block("latest")["timestamp"] + 600,
+        "deadline": swap_deadline(),
         "amountIn": virtual_balance,
-        "amountOutMinimum": 1,  
+        "amountOutMinimum": amount_out_minimum([virtual_token_address, token_address], [3000], virtual_balance, get_slippage(wallet.get("chat_id"))),
         "sqrtPriceLimitX96": 0,
     }
     print("[DEBUG] Virtual to Token Params:", params_virtual_to_token)
 
+    swap_gas_key = gas_key("swap", uniswap_router.address, params_virtual_to_token["tokenIn"], params_virtual_to_token["tokenOut"], 3000)
+    gas = estimate_gas_limit(swap_gas_key, lambda: uniswap_router.functions.exactInputSingle(params_virtual_to_token).estimate_gas({"from": wallet["address"]}))
     tx_virtual_to_token = uniswap_router.functions.exactInputSingle(params_virtual_to_token).build_transaction({
         "from": wallet["address"],
         "nonce": nonce,
-        "gas": 250000,
-        "gasPrice": gas_price,
+        "chainId": get_chain_id(),
+        "gas": gas,
+        **gas_fees,
     })
     print("[DEBUG] Virtual to Token Transaction:", tx_virtual_to_token)
 
-    signed_virtual_to_token = web3.eth.account.sign_transaction(tx_virtual_to_token, wallet["private_key"])
-    tx_hash_virtual_to_token = web3.eth.send_raw_transaction(signed_virtual_to_token.raw_transaction)
+    tx_hash_virtual_to_token = send_transaction(wallet, tx_virtual_to_token, gas_key=swap_gas_key)
 
     print("[DEBUG] Virtual to Token Transaction Hash:", tx_hash_virtual_to_token.hex())
 
-    receipt = web3.eth.wait_for_transaction_receipt(tx_hash_virtual_to_token, timeout=300)
-    if receipt.status == 0:
-        raise Exception("Swap transaction failed.")
+    if wait:
+        receipt = wait_for_receipt(tx_hash_virtual_to_token, timeout=300)
+        if receipt.status == 0:
+            raise Exception("Swap transaction failed.")
 
     return tx_hash_virtual_to_token
 
-def swap_eth_to_token(wallet, token_address, eth_amount):
+def swap_eth_to_token_route(wallet, token_address, eth_amount, gas_fees, nonce, wait=True):
     """
-    Orchestrate swaps from ETH → WETH → Virtual → Target Token with fees.
+    Swap ETH to the Target Token in a single transaction: WETH → Virtual → Target Token via exactInput.
+    The router wraps the ETH sent as value into WETH itself.
+    With wait=False, return as soon as the transaction is broadcast.
     """
-    try:
-        gas_price = web3.to_wei(user_gwei_preferences.get(wallet["chat_id"], 20), "gwei")
-        nonce = web3.eth.get_transaction_count(wallet["address"])
+    amount_in = web3.to_wei(eth_amount, "ether")
+    tokens, fees = buy_path(token_address)
+    params = {
+        "path": encode_path(tokens, fees),
+        "recipient": wallet["address"],
+        "deadline": swap_deadline(),
+        "amountIn": amount_in,
+        "amountOutMinimum": amount_out_minimum(tokens, fees, amount_in, get_slippage(wallet.get("chat_id"))),
+    }
+    print("[DEBUG] ETH to Token Route Params:", params)
 
-        fee_amount, amount_after_fee = calculate_fees(eth_amount)
+    route_gas_key = gas_key("route", uniswap_router.address, weth_address, web3.to_checksum_address(token_address), (3000, 3000))
+    gas = estimate_gas_limit(route_gas_key, lambda: uniswap_router.functions.exactInput(params).estimate_gas({"from": wallet["address"], "value": amount_in}))
+    tx = uniswap_router.functions.exactInput(params).build_transaction({
+        "from": wallet["address"],
+        "value": amount_in,
+        "nonce": nonce,
+        "chainId": get_chain_id(),
+        "gas": gas,
+        **gas_fees,
+    })
+    print("[DEBUG] ETH to Token Route Transaction:", tx)
 
-        send_fees(wallet, fee_recipient, fee_amount, gas_price, nonce)
-        nonce += 1
+    tx_hash = send_transaction(wallet, tx, gas_key=route_gas_key)
+    print("[DEBUG] ETH to Token Route Transaction Hash:", tx_hash.hex())
 
-        swap_eth_to_weth(wallet, amount_after_fee, gas_price, nonce)
-        nonce += 1
+    if wait:
+        receipt = wait_for_receipt(tx_hash, timeout=300)
+        if receipt.status == 0:
+            raise Exception("Swap transaction failed.")
+    return tx_hash
 
-        swap_weth_to_virtual(wallet, amount_after_fee, gas_price, nonce)
-        nonce += 1
+def buy_gas_keys(token_address):
+    """
+    Gas keys of the transactions a buy sends, for the current TRADE_ROUTE_MODE.
+    """
+    token = web3.to_checksum_address(token_address)
+    virtual = web3.to_checksum_address(virtual_token_address)
+    fee_transfer = gas_key("transfer", web3.to_checksum_address(fee_recipient)) if fee_recipient else gas_key("transfer", None)
+    if TRADE_ROUTE_MODE == "single":
+        return [fee_transfer, gas_key("route", uniswap_router.address, weth_address, token, (3000, 3000))]
+    return [
+        fee_transfer,
+        gas_key("wrap", weth_address),
+        gas_key("swap", uniswap_router.address, weth_address, virtual, 3000),
+        gas_key("swap", uniswap_router.address, virtual, token, 3000),
+    ]
+
+def expected_buy_gas(token_address):
+    """
+    Expected gas of each transaction of a buy, for fee previews.
+    """
+    return [expected_gas(key) for key in buy_gas_keys(token_address)]
 
-        tx_hash = swap_virtual_to_token(wallet, token_address, gas_price, nonce)
+def buy_steps(wallet, token_address, eth_amount, progress=None):
+    """
+    Steps of a buy ETH → WETH → Virtual → Target Token with fees, yielding whenever transactions
+    must be mined (see run_steps). Returns the hash of the last swap.
+    `progress(step, status, tx_hash)` is called as each transaction is sent and confirmed.
+    """
+    gas_fees = get_gas_fees(user_gwei_preferences.get(wallet["chat_id"], DEFAULT_FEE_TIER))
+    nonces = []
+    try:
+        fee_amount, amount_after_fee = calculate_fees(eth_amount)
+
+        # when pipelining, transactions that only need to be mined in nonce order are broadcast
+        # back-to-back, and their receipts are checked together at the end
+        if TRADE_ROUTE_MODE == "single":
+            nonces = allocate_nonces(wallet["address"], 2)
+            fee_hash = send_fees(wallet, fee_recipient, fee_amount, gas_fees, nonces[0], wait=False)
+            report_progress(progress, "Fee transfer", "sent", fee_hash)
+            if not PIPELINE_TRANSACTIONS:
+                yield from confirming({"Fee transfer": fee_hash})
+                report_progress(progress, "Fee transfer", "confirmed", fee_hash)
+            tx_hash = swap_eth_to_token_route(wallet, token_address, amount_after_fee, gas_fees, nonces[1], wait=False)
+            report_progress(progress, "ETH → Token", "sent", tx_hash)
+            yield from confirming({"Fee transfer": fee_hash, "Swap": tx_hash})
+            if PIPELINE_TRANSACTIONS:
+                report_progress(progress, "Fee transfer", "confirmed", fee_hash)
+            report_progress(progress, "ETH → Token", "confirmed", tx_hash)
+            return tx_hash.hex()
+
+        nonces = allocate_nonces(wallet["address"], 4)
+        fee_hash = send_fees(wallet, fee_recipient, fee_amount, gas_fees, nonces[0], wait=False)
+        report_progress(progress, "Fee transfer", "sent", fee_hash)
+        if not PIPELINE_TRANSACTIONS:
+            yield from confirming({"Fee transfer": fee_hash})
+            report_progress(progress, "Fee transfer", "confirmed", fee_hash)
+        deposit_hash = swap_eth_to_weth(wallet, amount_after_fee, gas_fees, nonces[1], wait=False)
+        report_progress(progress, "ETH → WETH", "sent", deposit_hash)
+        if not PIPELINE_TRANSACTIONS:
+            yield from confirming({"WETH deposit": deposit_hash})
+            report_progress(progress, "ETH → WETH", "confirmed", deposit_hash)
+        # the last hop swaps the VIRTUAL balance this one produces, so it has to be mined first
+        virtual_hash = swap_weth_to_virtual(wallet, amount_after_fee, gas_fees, nonces[2], wait=False)
+        report_progress(progress, "WETH → VIRTUAL", "sent", virtual_hash)
+        yield from confirming({"WETH to Virtual swap": virtual_hash})
+        report_progress(progress, "WETH → VIRTUAL", "confirmed", virtual_hash)
+        tx_hash = swap_virtual_to_token(wallet, token_address, gas_fees, nonces[3], wait=False)
+        report_progress(progress, "VIRTUAL → Token", "sent", tx_hash)
+        yield from confirming({"Swap": tx_hash})
+        report_progress(progress, "VIRTUAL → Token", "confirmed", tx_hash)
+        if PIPELINE_TRANSACTIONS:
+            yield from confirming({"Fee transfer": fee_hash, "WETH deposit": deposit_hash})
+            report_progress(progress, "Fee transfer", "confirmed", fee_hash)
+            report_progress(progress, "ETH → WETH", "confirmed", deposit_hash)
         return tx_hash.hex()
 
     except Exception as e:
+        release_trade_nonces(wallet, nonces, gas_fees)
         raise Exception(f"Swap failed: {e}")
+
+def swap_eth_to_token(wallet, token_address, eth_amount, progress=None):
+    """
+    Orchestrate swaps from ETH → WETH → Virtual → Target Token with fees, on this thread.
+    `progress(step, status, tx_hash)` is called as each transaction is sent and confirmed.
+    """
+    return run_steps(buy_steps(wallet, token_address, eth_amount, progress))
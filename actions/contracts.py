@@ -1,6 +1,10 @@
 import json
+import os
+import threading
+from collections import OrderedDict
 from shared_data.shared_data import web3
 from actions.get_abi import get_contract_abi
+from shared_data.metrics import register_stats
 
 UNISWAP_ROUTER_ADDRESS = "0xE592427A0AEce92De3Edee1F18E0157C05861564"
 UNISWAP_ROUTER_ABI = """
@@ -22,22 +26,121 @@ UNISWAP_ROUTER_ABI = """
         ],
         "outputs": [],
         "stateMutability": "nonpayable"
+    },
+    {
+        "name": "exactInput",
+        "type": "function",
+        "inputs": [
+            {"name": "params", "type": "tuple", "components": [
+                {"name": "path", "type": "bytes"},
+                {"name": "recipient", "type": "address"},
+                {"name": "deadline", "type": "uint256"},
+                {"name": "amountIn", "type": "uint256"},
+                {"name": "amountOutMinimum", "type": "uint256"}
+            ]}
+        ],
+        "outputs": [{"name": "amountOut", "type": "uint256"}],
+        "stateMutability": "payable"
+    },
+    {
+        "name": "unwrapWETH9",
+        "type": "function",
+        "inputs": [
+            {"name": "amountMinimum", "type": "uint256"},
+            {"name": "recipient", "type": "address"}
+        ],
+        "outputs": [],
+        "stateMutability": "payable"
+    },
+    {
+        "name": "multicall",
+        "type": "function",
+        "inputs": [{"name": "data", "type": "bytes[]"}],
+        "outputs": [{"name": "results", "type": "bytes[]"}],
+        "stateMutability": "payable"
     }
 ]
 """
 
+# minimal ERC-20 view ABI (plus Virtuals tax getters), bound locally without BaseScan
+ERC20_VIEW_ABI = """
+[
+    {"name": "name", "type": "function", "inputs": [], "outputs": [{"name": "", "type": "string"}], "stateMutability": "view"},
+    {"name": "symbol", "type": "function", "inputs": [], "outputs": [{"name": "", "type": "string"}], "stateMutability": "view"},
+    {"name": "decimals", "type": "function", "inputs": [], "outputs": [{"name": "", "type": "uint8"}], "stateMutability": "view"},
+    {"name": "totalSupply", "type": "function", "inputs": [], "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view"},
+    {"name": "balanceOf", "type": "function", "inputs": [{"name": "account", "type": "address"}], "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view"},
+    {"name": "allowance", "type": "function", "inputs": [{"name": "owner", "type": "address"}, {"name": "spender", "type": "address"}], "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view"},
+    {"name": "projectBuyTaxBasisPoints", "type": "function", "inputs": [], "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view"},
+    {"name": "projectSellTaxBasisPoints", "type": "function", "inputs": [], "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view"}
+]
+"""
+_erc20_view_abi = json.loads(ERC20_VIEW_ABI)
+ERC20_VIEW_FUNCTIONS = {abi["name"] for abi in _erc20_view_abi}
+
 # load uniswap router contract
 uniswap_router = web3.eth.contract(address=UNISWAP_ROUTER_ADDRESS, abi=json.loads(UNISWAP_ROUTER_ABI))
 
-# Check if connected to Alchemy
-if not web3.is_connected():
-    raise Exception("Failed to connect to Alchemy!")
+def encode_path(tokens, fees):
+    """
+    Encode a Uniswap V3 multi-hop path: token0 | fee0 | token1 | fee1 | token2 ...
+    """
+    if len(fees) != len(tokens) - 1:
+        raise ValueError("A path needs exactly one fee per hop.")
+    path = bytes.fromhex(web3.to_checksum_address(tokens[0])[2:])
+    for fee, token in zip(fees, tokens[1:]):
+        path += fee.to_bytes(3, "big") + bytes.fromhex(web3.to_checksum_address(token)[2:])
+    return path
+
+# constructed Contract objects, keyed by (checksum address, abi kind)
+CONTRACT_CACHE_SIZE = int(os.getenv("CONTRACT_CACHE_SIZE", "128"))
+_contract_cache = OrderedDict()
+_contract_cache_lock = threading.Lock()
+
+contract_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "size": 0}
+register_stats("contract_cache", lambda: contract_cache_stats)
+
+def _cached_contract(contract_address, kind, get_abi):
+    """
+    Return the cached Contract for this address, building it with `get_abi()` on a miss.
+    """
+    key = (web3.to_checksum_address(contract_address), kind)
+    with _contract_cache_lock:
+        contract = _contract_cache.get(key)
+        if contract is not None:
+            _contract_cache.move_to_end(key)
+            contract_cache_stats["hits"] += 1
+            return contract
+        contract_cache_stats["misses"] += 1
+
+    contract = web3.eth.contract(address=key[0], abi=get_abi())
+
+    with _contract_cache_lock:
+        _contract_cache[key] = contract
+        while len(_contract_cache) > CONTRACT_CACHE_SIZE:
+            _contract_cache.popitem(last=False)
+            contract_cache_stats["evictions"] += 1
+        contract_cache_stats["size"] = len(_contract_cache)
+    return contract
 
 # Load a smart contract dynamically
-def load_contract(contract_address):
+def load_contract(contract_address, functions=None):
+    """
+    Load a contract with its verified ABI from BaseScan.
+    If every name in `functions` is covered by the ERC-20 view ABI, bind that one instead (no network I/O).
+    """
+    if functions is not None and set(functions) <= ERC20_VIEW_FUNCTIONS:
+        return load_erc20(contract_address)
+    try:
+        return _cached_contract(contract_address, "verified", lambda: json.loads(get_contract_abi(contract_address)))
+    except Exception as e:
+        raise Exception(f"Failed to load contract: {e}")
+
+def load_erc20(contract_address):
+    """
+    Load a token with the bundled ERC-20 view ABI. Works for unverified tokens too.
+    """
     try:
-        abi = get_contract_abi(contract_address)
-        contract = web3.eth.contract(address=contract_address, abi=json.loads(abi))
-        return contract
+        return _cached_contract(contract_address, "erc20", lambda: _erc20_view_abi)
     except Exception as e:
         raise Exception(f"Failed to load contract: {e}")
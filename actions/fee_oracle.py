@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from shared_data.shared_data import web3
+from shared_data.metrics import register_stats
+
+FEE_ORACLE_INTERVAL = float(os.getenv("FEE_ORACLE_INTERVAL", "4"))  # seconds between two eth_feeHistory samples
+FEE_HISTORY_BLOCKS = int(os.getenv("FEE_HISTORY_BLOCKS", "20"))  # blocks sampled for the priority fee percentiles
+FEE_MAX_STALENESS = float(os.getenv("FEE_MAX_STALENESS", "60"))  # seconds before callers sample fees themselves
+
+# priority fee percentile of the sampled blocks for each tier
+FEE_TIERS = {"slow": 10, "normal": 50, "fast": 90}
+DEFAULT_FEE_TIER = "normal"
+
+_fees = None
+_fees_lock = threading.Lock()
+_oracle_thread = None
+
+fee_oracle_stats = {"samples": 0, "errors": 0}
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else 0
+
+
+def sample_fees():
+    """
+    Sample eth_feeHistory and store the next block base fee and the priority fee of each tier.
+    """
+    global _fees
+    percentiles = list(FEE_TIERS.values())
+    history = web3.eth.fee_history(FEE_HISTORY_BLOCKS, "latest", percentiles)
+    # one row per block, one column per percentile; empty blocks report 0 and are skipped
+    rewards = [row for row in history["reward"] if any(row)]
+    fees = {
+        # the last base fee is the one of the next block
+        "base_fee": history["baseFeePerGas"][-1],
+        "sampled_at": time.time(),
+    }
+    for idx, tier in enumerate(FEE_TIERS):
+        fees[tier] = _median([row[idx] for row in rewards])
+    with _fees_lock:
+        _fees = fees
+    fee_oracle_stats["samples"] += 1
+    return fees
+
+
+def _sample_loop():
+    while True:
+        try:
+            sample_fees()
+        except Exception as e:
+            fee_oracle_stats["errors"] += 1
+            print(f"[ERROR] Failed to sample fee history: {e}")
+        time.sleep(FEE_ORACLE_INTERVAL)
+
+
+def start_fee_oracle():
+    """
+    Start the background thread that keeps the fee tiers fresh.
+    """
+    global _oracle_thread
+    with _fees_lock:
+        if _oracle_thread is not None:
+            return
+        _oracle_thread = threading.Thread(target=_sample_loop, name="fee-oracle", daemon=True)
+    _oracle_thread.start()
+
+
+def get_fee_tiers():
+    """
+    Next block base fee and slow/normal/fast priority fees (wei) from the cache.
+    Only samples them on the spot when the cache is empty or older than FEE_MAX_STALENESS.
+    """
+    start_fee_oracle()
+    with _fees_lock:
+        fees = _fees
+    if fees is None or time.time() - fees["sampled_at"] > FEE_MAX_STALENESS:
+        fees = sample_fees()
+    return fees
+
+
+def get_gas_fees(preference=DEFAULT_FEE_TIER):
+    """
+    EIP-1559 fee fields for a transaction. `preference` is a tier name, or a gwei amount
+    used as the max fee per gas (the priority fee is then the fast tier, capped to it).
+    """
+    fees = get_fee_tiers()
+    if preference in FEE_TIERS:
+        priority_fee = fees[preference]
+        # room for the base fee to double before the transaction stops being includable
+        return {"maxFeePerGas": 2 * fees["base_fee"] + priority_fee, "maxPriorityFeePerGas": priority_fee}
+    max_fee = web3.to_wei(preference, "gwei")
+    return {"maxFeePerGas": max_fee, "maxPriorityFeePerGas": min(fees["fast"], max_fee)}
+
+
+def expected_gas_price(preference=DEFAULT_FEE_TIER):
+    """
+    Price per gas (wei) a transaction is expected to actually pay, for fee previews.
+    """
+    fees = get_fee_tiers()
+    params = get_gas_fees(preference)
+    return min(params["maxFeePerGas"], fees["base_fee"] + params["maxPriorityFeePerGas"])
+
+
+def _fee_oracle_metrics():
+    with _fees_lock:
+        fees = dict(_fees) if _fees else {}
+    fees.pop("sampled_at", None)
+    return dict(fee_oracle_stats, **fees)
+
+
+register_stats("fee_oracle", _fee_oracle_metrics)
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from collections import deque
+from shared_data.metrics import register_stats
+
+GAS_SAFETY_MARGIN = float(os.getenv("GAS_SAFETY_MARGIN", "1.2"))  # gas limit = estimate * margin
+GAS_ESTIMATE_TTL = float(os.getenv("GAS_ESTIMATE_TTL", "300"))  # seconds an eth_estimateGas result is reused for a route
+
+# used when a transaction cannot be estimated (e.g. it spends the output of a transaction not mined yet)
+# and nothing was learned for its route yet
+DEFAULT_GAS_LIMITS = {
+    "transfer": 21000,
+    "wrap": 100000,
+    "unwrap": 100000,
+    "swap": 250000,
+    "route": 400000,
+}
+
+_GAS_USED_WINDOW = 20  # last gasUsed values kept per route
+
+_routes = {}  # gas key -> {"estimate", "estimated_at", "gas_used"}
+_gas_lock = threading.Lock()
+
+gas_stats = {"estimates": 0, "cache_hits": 0, "fallbacks": 0, "learned": 0, "out_of_gas": 0}
+register_stats("gas_estimator", lambda: dict(gas_stats, routes=len(_routes)))
+
+
+def gas_key(kind, to, token_in=None, token_out=None, fee=None):
+    """
+    Cache key of a transaction type: kind (see DEFAULT_GAS_LIMITS), contract called, tokens and pool fee(s).
+    """
+    return (kind, to, token_in, token_out, fee)
+
+
+def _route(key):
+    route = _routes.get(key)
+    if route is None:
+        route = {"estimate": None, "estimated_at": 0, "gas_used": deque(maxlen=_GAS_USED_WINDOW)}
+        _routes[key] = route
+    return route
+
+
+def _limit(route, default):
+    observed = max([route["estimate"] or 0] + list(route["gas_used"]))
+    return int(observed * GAS_SAFETY_MARGIN) if observed else default
+
+
+def estimate_gas_limit(key, estimate):
+    """
+    Gas limit for a transaction of route `key`: the highest of its estimate and the gas it recently used,
+    plus GAS_SAFETY_MARGIN. `estimate()` runs eth_estimateGas, only if the cached estimate is older than GAS_ESTIMATE_TTL.
+    """
+    with _gas_lock:
+        route = _route(key)
+        fresh = route["estimate"] is not None and time.time() - route["estimated_at"] < GAS_ESTIMATE_TTL
+        if fresh:
+            gas_stats["cache_hits"] += 1
+            return _limit(route, DEFAULT_GAS_LIMITS[key[0]])
+
+    try:
+        gas = estimate()
+        with _gas_lock:
+            gas_stats["estimates"] += 1
+            route["estimate"] = gas
+            route["estimated_at"] = time.time()
+    except Exception as e:
+        gas_stats["fallbacks"] += 1
+        print(f"[DEBUG] Gas estimate for {key} failed, using the last known limit: {e}")
+
+    with _gas_lock:
+        return _limit(route, DEFAULT_GAS_LIMITS[key[0]])
+
+
+def learn_gas_used(key, receipt, gas_limit):
+    """
+    Record the gas a mined transaction of route `key` used. A transaction that ran out of gas
+    raises the limit of its route by GAS_SAFETY_MARGIN for the next ones.
+    """
+    with _gas_lock:
+        route = _route(key)
+        if receipt.status == 0 and receipt.gasUsed >= gas_limit:
+            gas_stats["out_of_gas"] += 1
+            print(f"[ERROR] Transaction ran out of gas ({gas_limit}), raising the limit for {key}")
+            route["gas_used"].append(int(gas_limit * GAS_SAFETY_MARGIN))
+        elif receipt.status == 1:
+            gas_stats["learned"] += 1
+            route["gas_used"].append(receipt.gasUsed)
+
+
+def expected_gas(key):
+    """
+    Gas a transaction of route `key` is expected to use, for fee previews (no RPC call).
+    """
+    with _gas_lock:
+        route = _routes.get(key)
+        if route is not None and route["gas_used"]:
+            return int(sum(route["gas_used"]) / len(route["gas_used"]))
+        if route is not None and route["estimate"] is not None:
+            return route["estimate"]
+    return DEFAULT_GAS_LIMITS[key[0]]
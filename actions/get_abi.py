@@ -1,12 +1,102 @@
-import requests
-from dotenv import load_dotenv
+import json
 import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from web3 import Web3
+from shared_data.http_session import http_session
+from shared_data.metrics import register_stats
 
 load_dotenv()
 
 BASESCAN_API_KEY = os.getenv("BASESCAN_API_KEY")
 
-def get_contract_abi(contract_address):
+# abi cache config
+ABI_CACHE_DIR = os.getenv("ABI_CACHE_DIR", "abi_cache")
+ABI_CACHE_SIZE = int(os.getenv("ABI_CACHE_SIZE", "256"))  # entries kept in memory
+ABI_NEGATIVE_TTL = int(os.getenv("ABI_NEGATIVE_TTL", "600"))  # seconds before retrying an unverified contract
+
+# in-memory LRU in front of the on-disk store, keyed by checksum address
+_abi_cache = OrderedDict()
+_abi_cache_lock = threading.Lock()
+
+abi_cache_stats = {
+    "memory_hits": 0,
+    "disk_hits": 0,
+    "negative_hits": 0,
+    "misses": 0,
+    "evictions": 0,
+}
+register_stats("abi_cache", lambda: dict(abi_cache_stats, size=len(_abi_cache)))
+
+
+def _cache_path(checksum_address):
+    return os.path.join(ABI_CACHE_DIR, f"{checksum_address}.json")
+
+
+def _remember(checksum_address, entry):
+    """
+    Put an entry in the memory LRU, evicting the least recently used one if full.
+    """
+    with _abi_cache_lock:
+        _abi_cache[checksum_address] = entry
+        _abi_cache.move_to_end(checksum_address)
+        while len(_abi_cache) > ABI_CACHE_SIZE:
+            _abi_cache.popitem(last=False)
+            abi_cache_stats["evictions"] += 1
+
+
+def _read_disk(checksum_address):
+    try:
+        with open(_cache_path(checksum_address), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_disk(checksum_address, entry):
+    try:
+        os.makedirs(ABI_CACHE_DIR, exist_ok=True)
+        tmp_path = _cache_path(checksum_address) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, _cache_path(checksum_address))
+    except OSError as e:
+        print(f"[ERROR] Failed to write ABI cache for {checksum_address}: {e}")
+
+
+def _is_expired(entry):
+    return entry.get("expires_at") is not None and entry["expires_at"] < time.time()
+
+
+def _lookup(checksum_address):
+    """
+    Return a cached entry (memory first, then disk) or None.
+    """
+    with _abi_cache_lock:
+        entry = _abi_cache.get(checksum_address)
+        if entry is not None and not _is_expired(entry):
+            _abi_cache.move_to_end(checksum_address)
+            abi_cache_stats["memory_hits"] += 1
+            return entry
+
+    entry = _read_disk(checksum_address)
+    if entry is None or _is_expired(entry):
+        return None
+
+    with _abi_cache_lock:
+        abi_cache_stats["disk_hits"] += 1
+    _remember(checksum_address, entry)
+    return entry
+
+
+def fetch_contract_abi(contract_address):
+    """
+    Fetch the ABI of a verified contract from BaseScan, bypassing the cache.
+    Returns a (verified, result) tuple where result is the ABI or the error message.
+    """
     url = f"https://api.basescan.org/api"
     params = {
         "module": "contract",
@@ -14,20 +104,47 @@ def get_contract_abi(contract_address):
         "address": contract_address,
         "apikey": BASESCAN_API_KEY
     }
-    
+
     print(f"[DEBUG] Sending request to {url} with params: {params}")
-    
-    response = requests.get(url, params=params)
+
+    response = http_session.get(url, params=params)
     data = response.json()
-    
+
     print(f"[DEBUG] Response received: {data}")
-    
-    if data["status"] == "1":  
-        abi = data["result"]
+
+    return data["status"] == "1", data["result"]
+
+
+def get_contract_abi(contract_address):
+    checksum_address = Web3.to_checksum_address(contract_address)
+
+    entry = _lookup(checksum_address)
+    if entry is not None:
+        if entry["abi"] is None:
+            with _abi_cache_lock:
+                abi_cache_stats["negative_hits"] += 1
+            raise Exception(f"Error retrieving ABI: {entry['error']}")
+        return entry["abi"]
+
+    with _abi_cache_lock:
+        abi_cache_stats["misses"] += 1
+
+    verified, result = fetch_contract_abi(checksum_address)
+
+    if verified:
+        abi = result
         # abi log
         print(f"[DEBUG] ABI successfully retrieved: {abi[:500]}...")  # show only first 500 characters
+        entry = {"abi": abi, "error": None, "expires_at": None}
+        _remember(checksum_address, entry)
+        _write_disk(checksum_address, entry)
         return abi
     else:
-        error_message = data["result"]
+        error_message = result
         print(f"[ERROR] Error retrieving ABI: {error_message}")
+        # only unverified contracts are cached, rate limits and API errors are retried
+        if "not verified" in str(error_message).lower():
+            entry = {"abi": None, "error": error_message, "expires_at": time.time() + ABI_NEGATIVE_TTL}
+            _remember(checksum_address, entry)
+            _write_disk(checksum_address, entry)
         raise Exception(f"Error retrieving ABI: {error_message}")
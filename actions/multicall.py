@@ -0,0 +1,58 @@
+import json
+from eth_utils.abi import get_abi_output_types
+from shared_data.shared_data import web3
+
+# Multicall3 is deployed at the same address on every EVM chain, including BASE
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_ABI = """
+[
+    {
+        "name": "aggregate3",
+        "type": "function",
+        "inputs": [
+            {"name": "calls", "type": "tuple[]", "components": [
+                {"name": "target", "type": "address"},
+                {"name": "allowFailure", "type": "bool"},
+                {"name": "callData", "type": "bytes"}
+            ]}
+        ],
+        "outputs": [
+            {"name": "returnData", "type": "tuple[]", "components": [
+                {"name": "success", "type": "bool"},
+                {"name": "returnData", "type": "bytes"}
+            ]}
+        ],
+        "stateMutability": "payable"
+    }
+]
+"""
+
+multicall3 = web3.eth.contract(address=MULTICALL3_ADDRESS, abi=json.loads(MULTICALL3_ABI))
+
+
+def decode_result(call, success, return_data):
+    """
+    Decode the raw return data of one call. Returns None if the call reverted or returned garbage.
+    """
+    if not success or not return_data:
+        return None
+    try:
+        values = web3.codec.decode(get_abi_output_types(call.abi), return_data)
+    except Exception as e:
+        print(f"[DEBUG] Failed to decode {call.abi.get('name')} on {call.address}: {e}")
+        return None
+    return values[0] if len(values) == 1 else values
+
+
+def multicall(calls, block_identifier="latest"):
+    """
+    Execute several contract reads in a single eth_call through Multicall3.aggregate3.
+    `calls` are bound contract functions, e.g. [token.functions.name(), token.functions.decimals()].
+    Returns one value per call, None for each call that failed.
+    """
+    if not calls:
+        return []
+
+    requests = [(call.address, True, call._encode_transaction_data()) for call in calls]
+    results = multicall3.functions.aggregate3(requests).call(block_identifier=block_identifier)
+    return [decode_result(call, success, return_data) for call, (success, return_data) in zip(calls, results)]
@@ -0,0 +1,145 @@
+import threading
+from shared_data.shared_data import web3, get_chain_id
+
+# local nonce state per wallet, so trades don't need an RPC to get a nonce and parallel trades don't collide
+_wallet_nonces = {}
+_nonces_lock = threading.Lock()
+
+
+def _state(address):
+    """
+    Return the nonce state of a wallet, reconciling it with the chain the first time it is used.
+    Must be called without _nonces_lock held: the chain is read outside of it, so a slow RPC
+    only delays the wallet being initialized.
+    """
+    with _nonces_lock:
+        state = _wallet_nonces.get(address)
+    if state is not None:
+        return state
+    chain_nonce = web3.eth.get_transaction_count(address, "pending")
+    with _nonces_lock:
+        state = _wallet_nonces.get(address)
+        if state is None:
+            state = {
+                "next": chain_nonce,
+                "allocated": set(),  # handed out, not broadcast yet
+                "sent": set(),  # broadcast, maybe not mined yet
+                "gaps": set(),  # released without being broadcast
+            }
+            _wallet_nonces[address] = state
+            print(f"[DEBUG] Nonce manager initialized for {address} at {state['next']}")
+    return state
+
+
+def allocate_nonces(address, count):
+    """
+    Hand out `count` nonces for a wallet, in increasing order. Gaps left by failed trades are reused first.
+    """
+    address = web3.to_checksum_address(address)
+    nonces = []
+    state = _state(address)
+    with _nonces_lock:
+        while len(nonces) < count:
+            if state["gaps"]:
+                nonce = min(state["gaps"])
+                state["gaps"].discard(nonce)
+            else:
+                nonce = state["next"]
+                state["next"] += 1
+            state["allocated"].add(nonce)
+            nonces.append(nonce)
+    return nonces
+
+
+def mark_nonce_sent(address, nonce):
+    """
+    Record that a transaction using this nonce was broadcast.
+    """
+    address = web3.to_checksum_address(address)
+    state = _state(address)
+    with _nonces_lock:
+        state["allocated"].discard(nonce)
+        state["sent"].add(nonce)
+
+
+def reconcile_nonce(address):
+    """
+    Compare local state with the chain's pending transaction count.
+    Nonces the chain already consumed are forgotten, and nonces below our next one that are
+    neither broadcast nor still allocated to a running trade are recorded as gaps. Returns the set of gaps.
+    """
+    address = web3.to_checksum_address(address)
+    chain_nonce = web3.eth.get_transaction_count(address, "pending")
+    state = _state(address)
+    with _nonces_lock:
+        state["sent"] = {nonce for nonce in state["sent"] if nonce >= chain_nonce}
+        state["gaps"] = {nonce for nonce in state["gaps"] if nonce >= chain_nonce}
+        in_flight = state["sent"] | state["allocated"]
+
+        if chain_nonce >= state["next"]:
+            # transactions were sent from outside the bot, or everything we sent got mined
+            state["next"] = chain_nonce
+            state["gaps"].clear()
+        elif not in_flight:
+            # nothing of ours is in flight, simply roll back to the chain
+            state["next"] = chain_nonce
+            state["gaps"].clear()
+        else:
+            state["gaps"] = set(range(chain_nonce, state["next"])) - in_flight
+            # trailing gaps don't block anything, just hand them out again
+            while state["next"] - 1 in state["gaps"]:
+                state["next"] -= 1
+                state["gaps"].discard(state["next"])
+
+        if state["gaps"]:
+            print(f"[DEBUG] Nonce gaps for {address}: {sorted(state['gaps'])}")
+        return set(state["gaps"])
+
+
+def release_nonces(address, nonces):
+    """
+    Give back nonces allocated for a trade that failed. Nonces that were already broadcast are kept,
+    then the wallet is reconciled with the chain. Returns the remaining gaps.
+    """
+    address = web3.to_checksum_address(address)
+    state = _state(address)
+    with _nonces_lock:
+        for nonce in nonces:
+            if nonce in state["allocated"]:
+                state["allocated"].discard(nonce)
+                state["gaps"].add(nonce)
+    return reconcile_nonce(address)
+
+
+def fill_nonce_gaps(wallet, gas_fees):
+    """
+    Send a 0 ETH transfer to self for every gap, so transactions with higher nonces are not stuck.
+    Gaps the node already has a transaction for are skipped.
+    """
+    address = web3.to_checksum_address(wallet["address"])
+    state = _state(address)
+    chain_nonce = web3.eth.get_transaction_count(address, "pending")
+    with _nonces_lock:
+        gaps = sorted(nonce for nonce in state["gaps"] if nonce >= chain_nonce)
+        state["gaps"].clear()
+
+    for nonce in gaps:
+        tx = {
+            "from": address,
+            "to": address,
+            "value": 0,
+            "gas": 21000,
+            **gas_fees,
+            "nonce": nonce,
+            "chainId": get_chain_id(),
+        }
+        try:
+            signed_tx = web3.eth.account.sign_transaction(tx, wallet["private_key"])
+            tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            mark_nonce_sent(address, nonce)
+            print(f"[DEBUG] Filled nonce gap {nonce} for {address}: {tx_hash.hex()}")
+        except Exception as e:
+            print(f"[ERROR] Failed to fill nonce gap {nonce} for {address}: {e}")
+            with _nonces_lock:
+                state["gaps"].add(nonce)
+    return gaps
@@ -0,0 +1,427 @@
+import bisect
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from hexbytes import HexBytes
+from shared_data.shared_data import web3, ws_transport
+from shared_data.events import subscribe
+from shared_data.metrics import register_stats
+from actions.multicall import multicall
+from actions.blocks import get_latest_block
+from actions.v3_math import (
+    MIN_TICK, MAX_TICK, MIN_SQRT_RATIO, MAX_SQRT_RATIO, TICK_SPACINGS,
+    get_sqrt_ratio_at_tick, compute_swap_step,
+)
+
+# Uniswap V3 factory on BASE
+UNISWAP_FACTORY_ADDRESS = os.getenv("UNISWAP_FACTORY_ADDRESS", "0x33128a8fC17869897dcE68Ed026d694621f6FDfD")
+UNISWAP_FACTORY_ABI = """
+[
+    {
+        "name": "getPool",
+        "type": "function",
+        "inputs": [
+            {"name": "tokenA", "type": "address"},
+            {"name": "tokenB", "type": "address"},
+            {"name": "fee", "type": "uint24"}
+        ],
+        "outputs": [{"name": "pool", "type": "address"}],
+        "stateMutability": "view"
+    }
+]
+"""
+UNISWAP_POOL_ABI = """
+[
+    {
+        "name": "slot0",
+        "type": "function",
+        "inputs": [],
+        "outputs": [
+            {"name": "sqrtPriceX96", "type": "uint160"},
+            {"name": "tick", "type": "int24"},
+            {"name": "observationIndex", "type": "uint16"},
+            {"name": "observationCardinality", "type": "uint16"},
+            {"name": "observationCardinalityNext", "type": "uint16"},
+            {"name": "feeProtocol", "type": "uint8"},
+            {"name": "unlocked", "type": "bool"}
+        ],
+        "stateMutability": "view"
+    },
+    {
+        "name": "liquidity",
+        "type": "function",
+        "inputs": [],
+        "outputs": [{"name": "", "type": "uint128"}],
+        "stateMutability": "view"
+    },
+    {
+        "name": "tickBitmap",
+        "type": "function",
+        "inputs": [{"name": "wordPosition", "type": "int16"}],
+        "outputs": [{"name": "", "type": "uint256"}],
+        "stateMutability": "view"
+    },
+    {
+        "name": "ticks",
+        "type": "function",
+        "inputs": [{"name": "tick", "type": "int24"}],
+        "outputs": [
+            {"name": "liquidityGross", "type": "uint128"},
+            {"name": "liquidityNet", "type": "int128"},
+            {"name": "feeGrowthOutside0X128", "type": "uint256"},
+            {"name": "feeGrowthOutside1X128", "type": "uint256"},
+            {"name": "tickCumulativeOutside", "type": "int56"},
+            {"name": "secondsPerLiquidityOutsideX128", "type": "uint160"},
+            {"name": "secondsOutside", "type": "uint32"},
+            {"name": "initialized", "type": "bool"}
+        ],
+        "stateMutability": "view"
+    }
+]
+"""
+
+POOL_BITMAP_WORDS = int(os.getenv("POOL_BITMAP_WORDS", "2"))  # tick bitmap words loaded on each side of the current tick
+POOL_RELOAD_INTERVAL = float(os.getenv("POOL_RELOAD_INTERVAL", "600"))  # seconds before a pool is fully reloaded
+
+SWAP_TOPIC = web3.keccak(text="Swap(address,address,int256,int256,uint160,uint128,int24)").to_0x_hex()
+MINT_TOPIC = web3.keccak(text="Mint(address,address,int24,int24,uint128,uint256,uint256)").to_0x_hex()
+BURN_TOPIC = web3.keccak(text="Burn(address,int24,int24,uint128,uint256,uint256)").to_0x_hex()
+
+uniswap_factory = web3.eth.contract(address=UNISWAP_FACTORY_ADDRESS, abi=json.loads(UNISWAP_FACTORY_ABI))
+_pool_abi = json.loads(UNISWAP_POOL_ABI)
+
+_pool_addresses = {}  # (token0, token1, fee), lowercase -> pool address, None if the pool does not exist
+_pools = {}  # pool address -> state
+_pools_lock = threading.RLock()
+# pool loads and log catch-up run here, one at a time and off the caller's thread
+_pool_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pools")
+_feed_started = False
+_subscribed_pools = set()
+
+pool_stats = {"loads": 0, "load_errors": 0, "logs_applied": 0, "simulations": 0, "out_of_range": 0}
+register_stats("pools", lambda: dict(pool_stats, pools=len(_pools)))
+
+
+def _sort_tokens(token_a, token_b):
+    # lowercase, checksumming costs more than the whole simulation
+    token_a, token_b = token_a.lower(), token_b.lower()
+    return (token_a, token_b) if int(token_a, 16) < int(token_b, 16) else (token_b, token_a)
+
+
+def _to_int24(word):
+    value = int.from_bytes(HexBytes(word)[-3:], "big")
+    return value - (1 << 24) if value >= 1 << 23 else value
+
+
+def _bitmap_ticks(word_position, bitmap, tick_spacing):
+    return [(word_position * 256 + bit) * tick_spacing for bit in range(256) if bitmap >> bit & 1]
+
+
+def _load_pool(address, token0, token1, fee, block_number=None):
+    """
+    Read slot0, liquidity and the initialized ticks of POOL_BITMAP_WORDS bitmap words around the current tick,
+    all at the same block (default: the latest one).
+    """
+    pool = web3.eth.contract(address=address, abi=_pool_abi)
+    tick_spacing = TICK_SPACINGS[fee]
+    if block_number is None:
+        block_number = get_latest_block()["number"]
+
+    slot0, liquidity = multicall([pool.functions.slot0(), pool.functions.liquidity()], block_identifier=block_number)
+    if slot0 is None or liquidity is None:
+        raise Exception(f"Failed to read the state of pool {address}")
+    center = (slot0[1] // tick_spacing) >> 8
+    words = list(range(center - POOL_BITMAP_WORDS, center + POOL_BITMAP_WORDS + 1))
+    bitmaps = multicall([pool.functions.tickBitmap(word) for word in words], block_identifier=block_number)
+    ticks = [tick for word, bitmap in zip(words, bitmaps) for tick in _bitmap_ticks(word, bitmap or 0, tick_spacing)]
+    tick_data = multicall([pool.functions.ticks(tick) for tick in ticks], block_identifier=block_number)
+
+    return {
+        "address": address,
+        "token0": token0,
+        "token1": token1,
+        "fee": fee,
+        "tick_spacing": tick_spacing,
+        "sqrt_price": slot0[0],
+        "tick": slot0[1],
+        "liquidity": liquidity,
+        "ticks": sorted(ticks),
+        "gross": {tick: data[0] for tick, data in zip(ticks, tick_data)},
+        "net": {tick: data[1] for tick, data in zip(ticks, tick_data)},
+        "min_word": words[0],
+        "max_word": words[-1],
+        "block": block_number,  # state is up to date with this block
+        "applied": (block_number, float("inf")),  # (block, log index) of the last log included in the state
+        "loaded_at": time.time(),
+        "pending_logs": [],
+    }
+
+
+def _apply_log(pool, log):
+    """
+    Update a pool with one of its Swap/Mint/Burn logs. Logs already included in the state are skipped.
+    """
+    position = tuple(int(log[key], 16) if isinstance(log[key], str) else log[key] for key in ("blockNumber", "logIndex"))
+    if position <= pool["applied"]:
+        return
+    if log.get("removed"):
+        # a reorg, the state cannot be rolled back
+        pool["loaded_at"] = 0
+        return
+
+    topics = [HexBytes(topic).to_0x_hex() for topic in log["topics"]]
+    data = HexBytes(log["data"])
+    if topics[0] == SWAP_TOPIC:
+        _, _, sqrt_price, liquidity, tick = web3.codec.decode(["int256", "int256", "uint160", "uint128", "int24"], data)
+        pool.update(sqrt_price=sqrt_price, liquidity=liquidity, tick=tick)
+    elif topics[0] in (MINT_TOPIC, BURN_TOPIC):
+        tick_lower, tick_upper = _to_int24(topics[2]), _to_int24(topics[3])
+        if topics[0] == MINT_TOPIC:
+            delta = web3.codec.decode(["address", "uint128", "uint256", "uint256"], data)[1]
+        else:
+            delta = -web3.codec.decode(["uint128", "uint256", "uint256"], data)[0]
+        for tick, net_delta in ((tick_lower, delta), (tick_upper, -delta)):
+            # ticks outside the loaded words are never crossed by a simulation
+            if not pool["min_word"] <= (tick // pool["tick_spacing"]) >> 8 <= pool["max_word"]:
+                continue
+            gross = pool["gross"].get(tick, 0) + delta
+            if gross <= 0:
+                # no position left on this tick, it is no longer initialized
+                if tick in pool["gross"]:
+                    pool["ticks"].remove(tick)
+                    del pool["gross"][tick], pool["net"][tick]
+                continue
+            if tick not in pool["gross"]:
+                bisect.insort(pool["ticks"], tick)
+            pool["gross"][tick] = gross
+            pool["net"][tick] = pool["net"].get(tick, 0) + net_delta
+        if tick_lower <= pool["tick"] < tick_upper:
+            pool["liquidity"] += delta
+    pool["applied"] = position
+    pool_stats["logs_applied"] += 1
+
+
+def _on_pool_log(log):
+    with _pools_lock:
+        pool = _pools.get(web3.to_checksum_address(log["address"]))
+        if pool is None:
+            return
+        if pool.get("loading"):
+            pool["pending_logs"].append(log)
+        else:
+            _apply_log(pool, log)
+
+
+def _catch_up(header):
+    """
+    Without a websocket, fetch the logs of every loaded pool since their last update.
+    """
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if not pool.get("loading")]
+    if not pools:
+        return
+    from_block = min(pool["block"] for pool in pools) + 1
+    if from_block > header["number"]:
+        return
+    logs = web3.eth.get_logs({
+        "fromBlock": from_block,
+        "toBlock": header["number"],
+        "address": [pool["address"] for pool in pools],
+        "topics": [[SWAP_TOPIC, MINT_TOPIC, BURN_TOPIC]],
+    })
+    with _pools_lock:
+        for log in logs:
+            _on_pool_log(log)
+        for pool in pools:
+            pool["block"] = max(pool["block"], header["number"])
+
+
+def _on_block(header):
+    if ws_transport is not None and ws_transport.is_connected():
+        # logs are pushed, and arrive before the next block
+        with _pools_lock:
+            for pool in _pools.values():
+                if not pool.get("loading"):
+                    pool["block"] = max(pool["block"], header["number"] - 1)
+        return
+    _pool_executor.submit(_catch_up_safely, header)
+
+
+def _catch_up_safely(header):
+    try:
+        _catch_up(header)
+    except Exception as e:
+        print(f"[ERROR] Failed to fetch pool logs: {e}")
+
+
+def _start_feed():
+    global _feed_started
+    with _pools_lock:
+        if _feed_started:
+            return
+        _feed_started = True
+    subscribe("block", _on_block)
+
+
+def _track_pool(address, token0, token1, fee):
+    _start_feed()
+    if ws_transport is not None and address not in _subscribed_pools:
+        _subscribed_pools.add(address)
+        # subscribed before loading, logs arriving during the load are replayed after it
+        subscribe(f"logs:pool_{address}", _on_pool_log)
+        ws_transport.add_log_subscription(f"pool_{address}", {"address": address, "topics": [[SWAP_TOPIC, MINT_TOPIC, BURN_TOPIC]]})
+    _reload_pool(address, token0, token1, fee)
+
+
+def _reload_pool(address, token0, token1, fee):
+    with _pools_lock:
+        previous = _pools.get(address)
+        _pools[address] = {"loading": True, "pending_logs": [], "block": previous["block"] if previous else 0}
+    try:
+        pool = _load_pool(address, token0, token1, fee)
+        pool_stats["loads"] += 1
+    except Exception as e:
+        pool_stats["load_errors"] += 1
+        print(f"[ERROR] Failed to load pool {address}: {e}")
+        with _pools_lock:
+            _pools.pop(address, None)
+        return
+    with _pools_lock:
+        for log in _pools[address]["pending_logs"]:
+            _apply_log(pool, log)
+        pool["pending_logs"] = []
+        _pools[address] = pool
+
+
+def _get_pool_address(token_a, token_b, fee):
+    key = _sort_tokens(token_a, token_b) + (fee,)
+    if key not in _pool_addresses:
+        address = uniswap_factory.functions.getPool(web3.to_checksum_address(key[0]), web3.to_checksum_address(key[1]), fee).call()
+        _pool_addresses[key] = None if int(address, 16) == 0 else address
+    return _pool_addresses[key]
+
+
+def _ensure_pool(token_a, token_b, fee):
+    try:
+        address = _get_pool_address(token_a, token_b, fee)
+        if address is None:
+            return
+        with _pools_lock:
+            pool = _pools.get(address)
+        if pool is None:
+            _track_pool(address, *_sort_tokens(token_a, token_b), fee)
+        elif not pool.get("loading") and time.time() - pool["loaded_at"] > POOL_RELOAD_INTERVAL:
+            _reload_pool(address, *_sort_tokens(token_a, token_b), fee)
+    except Exception as e:
+        print(f"[ERROR] Failed to track pool {token_a}/{token_b}/{fee}: {e}")
+
+
+def load_pools(tokens, fees):
+    """
+    Start loading (or refreshing) the pools of a path in the background.
+    """
+    for token_in, token_out, fee in zip(tokens, tokens[1:], fees):
+        _pool_executor.submit(_ensure_pool, token_in, token_out, fee)
+
+
+def invalidate_pools(tokens, fees):
+    """
+    Force the pools of a path to be reloaded, e.g. after the simulation disagreed with the Quoter.
+    """
+    with _pools_lock:
+        for token_in, token_out, fee in zip(tokens, tokens[1:], fees):
+            address = _pool_addresses.get(_sort_tokens(token_in, token_out) + (fee,))
+            pool = _pools.get(address) if address else None
+            if pool is not None and not pool.get("loading"):
+                pool["loaded_at"] = 0
+    load_pools(tokens, fees)
+
+
+def _next_initialized_tick(pool, tick, zero_for_one):
+    """
+    Next initialized tick within one bitmap word, like TickBitmap.nextInitializedTickWithinOneWord.
+    Returns (tick, initialized, word position).
+    """
+    spacing = pool["tick_spacing"]
+    compressed = tick // spacing
+    if zero_for_one:
+        word = compressed >> 8
+        lowest = word * 256 * spacing
+        idx = bisect.bisect_right(pool["ticks"], compressed * spacing) - 1
+        if idx >= 0 and pool["ticks"][idx] >= lowest:
+            return pool["ticks"][idx], True, word
+        return lowest, False, word
+    word = (compressed + 1) >> 8
+    highest = (word * 256 + 255) * spacing
+    idx = bisect.bisect_left(pool["ticks"], (compressed + 1) * spacing)
+    if idx < len(pool["ticks"]) and pool["ticks"][idx] <= highest:
+        return pool["ticks"][idx], True, word
+    return highest, False, word
+
+
+def _simulate_swap(pool, token_in, amount_in):
+    """
+    Exact-input swap on a pool snapshot, like UniswapV3Pool.swap without a price limit.
+    Returns the amount out, or None if the swap leaves the loaded ticks.
+    """
+    zero_for_one = token_in.lower() == pool["token0"]
+    price_limit = MIN_SQRT_RATIO + 1 if zero_for_one else MAX_SQRT_RATIO - 1
+    sqrt_price, tick, liquidity = pool["sqrt_price"], pool["tick"], pool["liquidity"]
+    remaining, amount_out = amount_in, 0
+
+    while remaining != 0 and sqrt_price != price_limit:
+        tick_next, initialized, word = _next_initialized_tick(pool, tick, zero_for_one)
+        if not pool["min_word"] <= word <= pool["max_word"]:
+            pool_stats["out_of_range"] += 1
+            return None
+        tick_next = min(max(tick_next, MIN_TICK), MAX_TICK)
+        sqrt_next = get_sqrt_ratio_at_tick(tick_next)
+        if zero_for_one:
+            target = price_limit if sqrt_next < price_limit else sqrt_next
+        else:
+            target = price_limit if sqrt_next > price_limit else sqrt_next
+
+        sqrt_price, step_in, step_out, step_fee = compute_swap_step(sqrt_price, target, liquidity, remaining, pool["fee"])
+        remaining -= step_in + step_fee
+        amount_out += step_out
+
+        if sqrt_price == sqrt_next:
+            if initialized:
+                net = pool["net"][tick_next]
+                liquidity += -net if zero_for_one else net
+            tick = tick_next - 1 if zero_for_one else tick_next
+    return amount_out
+
+
+def simulate_exact_input(tokens, fees, amount_in, min_block=None):
+    """
+    Expected output of an exact-input swap along a path, computed locally from the cached pool states.
+    Returns None if a pool is not loaded or not synced with `min_block` (default: the block before the latest one);
+    its load is then started if needed.
+    """
+    latest_block = get_latest_block()["number"]
+    if min_block is None:
+        min_block = latest_block - 1
+    amount = int(amount_in)
+    with _pools_lock:
+        for token_in, token_out, fee in zip(tokens, tokens[1:], fees):
+            address = _pool_addresses.get(_sort_tokens(token_in, token_out) + (fee,))
+            pool = _pools.get(address) if address else None
+            if pool is None or pool.get("loading") or time.time() - pool["loaded_at"] > POOL_RELOAD_INTERVAL:
+                load_pools(tokens, fees)
+                return None
+            if pool["block"] < min_block:
+                if pool["block"] < latest_block - 1:
+                    load_pools(tokens, fees)
+                return None
+            amount = _simulate_swap(pool, token_in, amount)
+            if amount is None:
+                if not pool["min_word"] <= (pool["tick"] // pool["tick_spacing"]) >> 8 <= pool["max_word"]:
+                    # the price moved out of the loaded ticks
+                    pool["loaded_at"] = 0
+                    load_pools(tokens, fees)
+                return None
+    pool_stats["simulations"] += 1
+    return amount
@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from shared_data.shared_data import web3, user_slippage_preferences, weth_address, virtual_token_address
+from shared_data.metrics import register_stats
+from actions.contracts import encode_path
+from actions.multicall import multicall
+from actions.blocks import get_latest_block
+from actions.pools import simulate_exact_input, invalidate_pools
+
+# Uniswap V3 QuoterV2 on BASE
+QUOTER_V2_ADDRESS = os.getenv("QUOTER_V2_ADDRESS", "0x3d4e44Eb1374240CE5F1B871ab261CD16335B76a")
+QUOTER_V2_ABI = """
+[
+    {
+        "name": "quoteExactInput",
+        "type": "function",
+        "inputs": [
+            {"name": "path", "type": "bytes"},
+            {"name": "amountIn", "type": "uint256"}
+        ],
+        "outputs": [
+            {"name": "amountOut", "type": "uint256"},
+            {"name": "sqrtPriceX96AfterList", "type": "uint160[]"},
+            {"name": "initializedTicksCrossedList", "type": "uint32[]"},
+            {"name": "gasEstimate", "type": "uint256"}
+        ],
+        "stateMutability": "nonpayable"
+    }
+]
+"""
+
+DEFAULT_SLIPPAGE = float(os.getenv("DEFAULT_SLIPPAGE", "5"))  # percent, used when the user did not set one
+QUOTE_CACHE_SIZE = int(os.getenv("QUOTE_CACHE_SIZE", "256"))
+
+quoter = web3.eth.contract(address=QUOTER_V2_ADDRESS, abi=json.loads(QUOTER_V2_ABI))
+
+# (path, amount in) -> (block number, amount out), only valid for the block it was quoted at
+_quotes = OrderedDict()
+_quotes_lock = threading.Lock()
+
+# quotes for the token card run next to the other lookups instead of after them
+_quote_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="quotes")
+
+quote_stats = {"hits": 0, "misses": 0, "failed": 0, "multicalls": 0, "simulated": 0, "sim_checks": 0, "sim_mismatches": 0}
+register_stats("quotes", lambda: dict(quote_stats, size=len(_quotes)))
+
+
+def buy_path(token_address):
+    """
+    Tokens and pool fees of a buy: WETH → Virtual → Target Token.
+    """
+    return [weth_address, virtual_token_address, token_address], [3000, 3000]
+
+
+def sell_path(token_address):
+    """
+    Tokens and pool fees of a sell: Target Token → Virtual → WETH.
+    """
+    return [token_address, virtual_token_address, weth_address], [3000, 3000]
+
+
+def _check_simulation(tokens, fees, amount_in, amount_out, block_number):
+    """
+    Compare a Quoter result with the local simulation at the same block,
+    and reload the pools of the path when they disagree.
+    """
+    simulated = simulate_exact_input(tokens, fees, amount_in, min_block=block_number)
+    if simulated is None:
+        return
+    quote_stats["sim_checks"] += 1
+    if simulated != amount_out:
+        quote_stats["sim_mismatches"] += 1
+        print(f"[DEBUG] Simulated {simulated} instead of {amount_out} through {tokens}, reloading the pools")
+        invalidate_pools(tokens, fees)
+
+
+def quote_exact_input(requests, simulate=False):
+    """
+    Expected output of several swaps, given as (tokens, fees, amount in) with raw amounts.
+    All the hops of a path are quoted by one QuoterV2 call, and all the quotes missing from the cache
+    for the current block are read in a single multicall. Returns None for swaps that cannot be quoted.
+    With `simulate`, swaps are first simulated locally from the cached pool states (display only,
+    trades always use the Quoter, which is then used to check the simulation).
+    """
+    block_number = get_latest_block()["number"]
+    keys = [(encode_path(tokens, fees), int(amount_in)) for tokens, fees, amount_in in requests]
+
+    amounts = {}
+    if simulate:
+        for key, (tokens, fees, amount_in) in zip(keys, requests):
+            amount_out = simulate_exact_input(tokens, fees, amount_in)
+            if amount_out is not None:
+                amounts[key] = amount_out
+        quote_stats["simulated"] += len(amounts)
+
+    with _quotes_lock:
+        for key in keys:
+            cached = _quotes.get(key)
+            if key not in amounts and cached is not None and cached[0] == block_number:
+                _quotes.move_to_end(key)
+                amounts[key] = cached[1]
+                quote_stats["hits"] += 1
+
+    missing = list(dict.fromkeys(key for key in keys if key not in amounts))
+    if missing:
+        quote_stats["misses"] += len(missing)
+        quote_stats["multicalls"] += 1
+        results = multicall([quoter.functions.quoteExactInput(path, amount_in) for path, amount_in in missing])
+        with _quotes_lock:
+            for key, result in zip(missing, results):
+                if result is None:
+                    quote_stats["failed"] += 1
+                    continue
+                amounts[key] = result[0]
+                _quotes[key] = (block_number, result[0])
+                _quotes.move_to_end(key)
+            while len(_quotes) > QUOTE_CACHE_SIZE:
+                _quotes.popitem(last=False)
+        if not simulate:
+            for key, (tokens, fees, amount_in) in zip(keys, requests):
+                if key in missing and amounts.get(key) is not None:
+                    _check_simulation(tokens, fees, amount_in, amounts[key], block_number)
+
+    return [amounts.get(key) for key in keys]
+
+
+def prefetch_quotes(requests, simulate=False):
+    """
+    Start quote_exact_input(requests, simulate) in the background and return its Future.
+    """
+    return _quote_executor.submit(quote_exact_input, requests, simulate)
+
+
+def get_slippage(chat_id):
+    """
+    Slippage tolerance of a user, in percent.
+    """
+    return user_slippage_preferences.get(chat_id, DEFAULT_SLIPPAGE)
+
+
+def apply_slippage(amount_out, slippage):
+    """
+    Lowest acceptable output for an expected `amount_out` and a slippage in percent (at least 1).
+    """
+    return max(1, amount_out * (10000 - int(slippage * 100)) // 10000)
+
+
+def amount_out_minimum(tokens, fees, amount_in, slippage):
+    """
+    amountOutMinimum of a swap: its quote minus the slippage tolerance.
+    Raises if the swap cannot be quoted, rather than sending it unprotected.
+    """
+    amount_out = quote_exact_input([(tokens, fees, amount_in)])[0]
+    if amount_out is None:
+        raise Exception(f"Failed to quote the swap of {amount_in} through {tokens}.")
+    return apply_slippage(amount_out, slippage)
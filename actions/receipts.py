@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from web3.datastructures import AttributeDict
+from shared_data.rpc_batch import batch_request
+from actions.blocks import get_latest_block
+from shared_data.metrics import register_stats
+from shared_data.events import subscribe
+
+RECEIPT_POLL_INTERVAL = float(os.getenv("RECEIPT_POLL_INTERVAL", "0.5"))  # how often the tracker checks for a new block, if no block event came
+RECEIPT_TRACK_TIMEOUT = float(os.getenv("RECEIPT_TRACK_TIMEOUT", "900"))  # seconds before a transaction is considered dropped
+
+# in-flight transactions, keyed by 0x-prefixed hash
+_pending = {}
+_pending_lock = threading.Lock()
+_tracker_thread = None
+_new_block = threading.Event()  # set on every "block" event, wakes the tracker right away
+_confirmed = OrderedDict()  # last receipts, so waiting again on a mined transaction returns at once
+_CONFIRMED_SIZE = 1000
+
+_latencies = deque(maxlen=500)  # seconds from tracking to receipt, last confirmed transactions
+receipt_stats = {"tracked": 0, "confirmed": 0, "failed": 0, "polls": 0, "receipt_calls": 0}
+
+_RECEIPT_INT_FIELDS = ("status", "blockNumber", "gasUsed", "cumulativeGasUsed", "effectiveGasPrice", "transactionIndex", "type")
+
+
+def normalize_hash(tx_hash):
+    """
+    0x-prefixed hex string of a transaction hash given as bytes or str.
+    """
+    tx_hash = tx_hash if isinstance(tx_hash, str) else tx_hash.hex()
+    return tx_hash if tx_hash.startswith("0x") else "0x" + tx_hash
+
+
+def _format_receipt(raw_receipt):
+    receipt = dict(raw_receipt)
+    for field in _RECEIPT_INT_FIELDS:
+        if isinstance(receipt.get(field), str):
+            receipt[field] = int(receipt[field], 16)
+    return AttributeDict(receipt)
+
+
+def _poll_receipts():
+    """
+    Fetch the receipts of every in-flight transaction in one batch and resolve the confirmed ones.
+    """
+    with _pending_lock:
+        tx_hashes = list(_pending)
+    if not tx_hashes:
+        return
+
+    receipt_stats["polls"] += 1
+    receipt_stats["receipt_calls"] += len(tx_hashes)
+    results = batch_request([("eth_getTransactionReceipt", [tx_hash]) for tx_hash in tx_hashes])
+
+    for tx_hash, raw_receipt in zip(tx_hashes, results):
+        if raw_receipt is None:
+            continue
+        with _pending_lock:
+            entry = _pending.pop(tx_hash, None)
+        if entry is None:
+            continue
+        receipt = _format_receipt(raw_receipt)
+        latency = time.time() - entry["tracked_at"]
+        _latencies.append(latency)
+        receipt_stats["confirmed"] += 1
+        if receipt.status == 0:
+            receipt_stats["failed"] += 1
+        print(f"[DEBUG] Receipt for {tx_hash} after {latency:.2f}s (status {receipt.status})")
+        with _pending_lock:
+            _confirmed[tx_hash] = receipt
+            while len(_confirmed) > _CONFIRMED_SIZE:
+                _confirmed.popitem(last=False)
+        if not entry["future"].done():
+            entry["future"].set_result(receipt)
+
+    # give up on transactions the node never mined (dropped or replaced)
+    now = time.time()
+    with _pending_lock:
+        expired = [tx_hash for tx_hash, entry in _pending.items() if now - entry["tracked_at"] > RECEIPT_TRACK_TIMEOUT]
+        expired_entries = [_pending.pop(tx_hash) for tx_hash in expired]
+    for tx_hash, entry in zip(expired, expired_entries):
+        if not entry["future"].done():
+            entry["future"].set_exception(Exception(f"Transaction {tx_hash} was not mined after {RECEIPT_TRACK_TIMEOUT} seconds"))
+
+
+def _track_receipts():
+    last_block = None
+    while True:
+        _new_block.wait(RECEIPT_POLL_INTERVAL)
+        _new_block.clear()
+        try:
+            block_number = get_latest_block()["number"]
+            # a receipt can only appear with a new block
+            if block_number != last_block:
+                last_block = block_number
+                _poll_receipts()
+        except Exception as e:
+            print(f"[ERROR] Failed to poll transaction receipts: {e}")
+
+
+def start_receipt_tracker():
+    """
+    Start the background thread that resolves pending transactions.
+    """
+    global _tracker_thread
+    with _pending_lock:
+        if _tracker_thread is not None:
+            return
+        _tracker_thread = threading.Thread(target=_track_receipts, name="receipt-tracker", daemon=True)
+    subscribe("block", lambda header: _new_block.set())
+    _tracker_thread.start()
+
+
+def track_transaction(tx_hash, callback=None):
+    """
+    Register a broadcast transaction. Returns a Future resolved with its receipt;
+    `callback`, if given, is called with the receipt once it is mined.
+    """
+    tx_hash = normalize_hash(tx_hash)
+    start_receipt_tracker()
+    with _pending_lock:
+        entry = _pending.get(tx_hash)
+        if entry is None and tx_hash in _confirmed:
+            entry = {"future": Future()}
+            entry["future"].set_result(_confirmed[tx_hash])
+        elif entry is None:
+            entry = {"future": Future(), "tracked_at": time.time()}
+            _pending[tx_hash] = entry
+            receipt_stats["tracked"] += 1
+    if callback is not None:
+        entry["future"].add_done_callback(lambda future: not future.cancelled() and future.exception() is None and callback(future.result()))
+    return entry["future"]
+
+
+def wait_for_receipt(tx_hash, timeout=120):
+    """
+    Block until the transaction is mined and return its receipt.
+    """
+    try:
+        return track_transaction(tx_hash).result(timeout=timeout)
+    except FutureTimeoutError:
+        raise Exception(f"Transaction {normalize_hash(tx_hash)} is not in the chain after {timeout} seconds")
+
+
+def _receipt_metrics():
+    latency = confirmation_latency_stats()
+    return dict(receipt_stats, pending=len(_pending), confirmation_seconds_p50=latency["p50"], confirmation_seconds_p95=latency["p95"])
+
+
+def confirmation_latency_stats():
+    """
+    Confirmation latency (seconds) over the last confirmed transactions.
+    """
+    latencies = sorted(_latencies)
+    if not latencies:
+        return {"count": 0, "p50": None, "p95": None, "max": None}
+    return {
+        "count": len(latencies),
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "max": latencies[-1],
+    }
+
+
+register_stats("receipts", _receipt_metrics)
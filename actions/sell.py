@@ -1,9 +1,18 @@
-from shared_data.shared_data import web3, user_gwei_preferences
-from actions.contracts import uniswap_router, load_contract
-
-def swap_token_to_virtual(wallet, token_address, token_amount, gas_price, nonce):
+import json
+from shared_data.shared_data import web3, get_chain_id, user_gwei_preferences, weth_address, virtual_token_address, TRADE_ROUTE_MODE
+from actions.contracts import uniswap_router, ERC20_VIEW_ABI, encode_path
+from actions.nonces import allocate_nonces
+from actions.transactions import send_transaction, release_trade_nonces, confirming, run_steps, report_progress
+from actions.blocks import swap_deadline
+from actions.receipts import wait_for_receipt
+from actions.gas import gas_key, estimate_gas_limit
+from actions.fee_oracle import get_gas_fees, DEFAULT_FEE_TIER
+from actions.quotes import amount_out_minimum, get_slippage, sell_path
+
+def swap_token_to_virtual(wallet, token_address, token_amount, gas_fees, nonce, wait=True):
     """
     step 1 : Swap Token → Virtual Token
+    With wait=False, return as soon as the transaction is broadcast.
     """
     virtual_token_address = "0x0b3e328455c4059EEb9e3f84b5543F74E24e7E1b"
     params = {
@@ -11,31 +20,35 @@ def swap_token_to_virtual(wallet, token_address, token_amount, gas_price, nonce)
         "tokenOut": virtual_token_address,
         "fee": 3000,  # Uniswap Fee
         "recipient": wallet["address"],
-        "deadline": web3.eth.get_block("latest")["timestamp"] + 600,
+        "deadline": swap_deadline(),
         "amountIn": token_amount,
-        "amountOutMinimum": 1,  # Minimum output tokens
+        "amountOutMinimum": amount_out_minimum([token_address, virtual_token_address], [3000], token_amount, get_slippage(wallet.get("chat_id"))),
         "sqrtPriceLimitX96": 0,
     }
     print("[DEBUG] Params Token to Virtual:", params)
 
+    swap_gas_key = gas_key("swap", uniswap_router.address, web3.to_checksum_address(token_address), virtual_token_address, 3000)
+    gas = estimate_gas_limit(swap_gas_key, lambda: uniswap_router.functions.exactInputSingle(params).estimate_gas({"from": wallet["address"]}))
     tx = uniswap_router.functions.exactInputSingle(params).build_transaction({
         "from": wallet["address"],
         "nonce": nonce,
-        "gas": 250000,
-        "gasPrice": gas_price,
+        "chainId": get_chain_id(),
+        "gas": gas,
+        **gas_fees,
     })
 
-    signed_tx = web3.eth.account.sign_transaction(tx, wallet["private_key"])
-    tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-    web3.eth.wait_for_transaction_receipt(tx_hash)
+    tx_hash = send_transaction(wallet, tx, gas_key=swap_gas_key)
+    if wait:
+        wait_for_receipt(tx_hash)
 
     print("[DEBUG] Token to Virtual TX Hash:", tx_hash.hex())
     return tx_hash.hex()
 
 
-def swap_virtual_to_weth(wallet, token_amount, gas_price, nonce):
+def swap_virtual_to_weth(wallet, token_amount, gas_fees, nonce, wait=True):
     """
     step 2 :Swap Virtual Token → WETH
+    With wait=False, return as soon as the transaction is broadcast.
     """
     virtual_token_address = "0x0b3e328455c4059EEb9e3f84b5543F74E24e7E1b"
     weth_address = "0x4200000000000000000000000000000000000006"
@@ -44,34 +57,38 @@ def swap_virtual_to_weth(wallet, token_amount, gas_price, nonce):
         "tokenOut": weth_address,
         "fee": 3000,  # Uniswap Fee
         "recipient": wallet["address"],
-        "deadline": web3.eth.get_block("latest")["timestamp"] + 600,
+        "deadline": swap_deadline(),
         "amountIn": token_amount,
-        "amountOutMinimum": 1,  # Minimum output tokens
+        "amountOutMinimum": amount_out_minimum([virtual_token_address, weth_address], [3000], token_amount, get_slippage(wallet.get("chat_id"))),
         "sqrtPriceLimitX96": 0,
     }
     print("[DEBUG] Params Virtual to WETH:", params)
 
+    swap_gas_key = gas_key("swap", uniswap_router.address, virtual_token_address, weth_address, 3000)
+    gas = estimate_gas_limit(swap_gas_key, lambda: uniswap_router.functions.exactInputSingle(params).estimate_gas({"from": wallet["address"]}))
     tx = uniswap_router.functions.exactInputSingle(params).build_transaction({
         "from": wallet["address"],
         "nonce": nonce,
-        "gas": 250000,
-        "gasPrice": gas_price,
+        "chainId": get_chain_id(),
+        "gas": gas,
+        **gas_fees,
     })
 
-    signed_tx = web3.eth.account.sign_transaction(tx, wallet["private_key"])
-    tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-    web3.eth.wait_for_transaction_receipt(tx_hash)
+    tx_hash = send_transaction(wallet, tx, gas_key=swap_gas_key)
+    if wait:
+        wait_for_receipt(tx_hash)
 
     print("[DEBUG] Virtual to WETH TX Hash:", tx_hash.hex())
     return tx_hash.hex()
 
 
-def swap_weth_to_eth(wallet, gas_price, nonce):
+def swap_weth_to_eth(wallet, gas_fees, nonce, wait=True):
     """
     step 3 : Swap WETH → ETH
+    With wait=False, return as soon as the transaction is broadcast.
     """
     weth_address = "0x4200000000000000000000000000000000000006"
-    weth_contract = web3.eth.contract(address=weth_address, abi=[
+    weth_contract = web3.eth.contract(address=weth_address, abi=json.loads(ERC20_VIEW_ABI) + [
         {
             "constant": False,
             "inputs": [{"name": "wad", "type": "uint256"}],
@@ -86,41 +103,110 @@ def swap_weth_to_eth(wallet, gas_price, nonce):
     if weth_balance <= 0:
         raise Exception("Insufficient WETH balance for the swap to ETH.")
 
+    unwrap_gas_key = gas_key("unwrap", weth_address)
+    gas = estimate_gas_limit(unwrap_gas_key, lambda: weth_contract.functions.withdraw(weth_balance).estimate_gas({"from": wallet["address"]}))
     tx = weth_contract.functions.withdraw(weth_balance).build_transaction({
         "from": wallet["address"],
         "nonce": nonce,
-        "gas": 100000,
-        "gasPrice": gas_price,
+        "chainId": get_chain_id(),
+        "gas": gas,
+        **gas_fees,
     })
 
-    signed_tx = web3.eth.account.sign_transaction(tx, wallet["private_key"])
-    tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-    web3.eth.wait_for_transaction_receipt(tx_hash)
+    tx_hash = send_transaction(wallet, tx, gas_key=unwrap_gas_key)
+    if wait:
+        wait_for_receipt(tx_hash)
 
     print("[DEBUG] WETH to ETH TX Hash:", tx_hash.hex())
     return tx_hash.hex()
 
 
-def execute_swap_to_eth(wallet, token_address, token_amount):
+def swap_token_to_eth_route(wallet, token_address, token_amount, gas_fees, nonce, wait=True):
     """
-    Orchestrator to manage sell : Token → Virtual → WETH → ETH flow.
+    Swap Token → Virtual Token → WETH → ETH in a single transaction.
+    The router keeps the WETH from exactInput and unwraps it to the wallet in the same multicall.
+    With wait=False, return as soon as the transaction is broadcast.
     """
+    tokens, fees = sell_path(token_address)
+    params = {
+        "path": encode_path(tokens, fees),
+        "recipient": uniswap_router.address,
+        "deadline": swap_deadline(),
+        "amountIn": token_amount,
+        "amountOutMinimum": amount_out_minimum(tokens, fees, token_amount, get_slippage(wallet.get("chat_id"))),
+    }
+    print("[DEBUG] Params Token to ETH Route:", params)
+
+    calls = [
+        uniswap_router.encode_abi("exactInput", args=[params]),
+        uniswap_router.encode_abi("unwrapWETH9", args=[0, wallet["address"]]),
+    ]
+    route_gas_key = gas_key("route", uniswap_router.address, web3.to_checksum_address(token_address), weth_address, (3000, 3000))
+    gas = estimate_gas_limit(route_gas_key, lambda: uniswap_router.functions.multicall(calls).estimate_gas({"from": wallet["address"]}))
+    tx = uniswap_router.functions.multicall(calls).build_transaction({
+        "from": wallet["address"],
+        "nonce": nonce,
+        "chainId": get_chain_id(),
+        "gas": gas,
+        **gas_fees,
+    })
+
+    tx_hash = send_transaction(wallet, tx, gas_key=route_gas_key)
+    if wait:
+        receipt = wait_for_receipt(tx_hash, timeout=300)
+        if receipt.status == 0:
+            raise Exception("Token to ETH swap transaction failed.")
+
+    print("[DEBUG] Token to ETH Route TX Hash:", tx_hash.hex())
+    return tx_hash.hex()
+
+
+def sell_steps(wallet, token_address, token_amount, progress=None):
+    """
+    Steps of a sell Token → Virtual → WETH → ETH, yielding whenever transactions must be mined (see run_steps).
+    `progress(step, status, tx_hash)` is called as each transaction is sent and confirmed.
+    """
+    gas_fees = get_gas_fees(user_gwei_preferences.get(wallet["chat_id"], DEFAULT_FEE_TIER))
+    nonces = []
     try:
-        gas_price = web3.to_wei(user_gwei_preferences.get(wallet["chat_id"], 10), "gwei")
-        nonce = web3.eth.get_transaction_count(wallet["address"])
+        if TRADE_ROUTE_MODE == "single":
+            nonces = allocate_nonces(wallet["address"], 1)
+            tx_hash = swap_token_to_eth_route(wallet, token_address, token_amount, gas_fees, nonces[0], wait=False)
+            report_progress(progress, "Token → ETH", "sent", tx_hash)
+            yield from confirming({"Token to ETH swap": tx_hash})
+            report_progress(progress, "Token → ETH", "confirmed", tx_hash)
+            return tx_hash
+
+        nonces = allocate_nonces(wallet["address"], 3)
 
         # step 1: Token → Virtuals
-        swap_token_to_virtual(wallet, token_address, token_amount, gas_price, nonce)
-        nonce += 1
+        tx_hash = swap_token_to_virtual(wallet, token_address, token_amount, gas_fees, nonces[0], wait=False)
+        report_progress(progress, "Token → VIRTUAL", "sent", tx_hash)
+        yield from confirming({"Token to Virtual swap": tx_hash})
+        report_progress(progress, "Token → VIRTUAL", "confirmed", tx_hash)
 
         # step 2 : Virtuals → WETH
-        swap_virtual_to_weth(wallet, token_amount, gas_price, nonce)
-        nonce += 1
+        tx_hash = swap_virtual_to_weth(wallet, token_amount, gas_fees, nonces[1], wait=False)
+        report_progress(progress, "VIRTUAL → WETH", "sent", tx_hash)
+        yield from confirming({"Virtual to WETH swap": tx_hash})
+        report_progress(progress, "VIRTUAL → WETH", "confirmed", tx_hash)
 
         # step 3 : WETH → ETH
-        tx_hash = swap_weth_to_eth(wallet, gas_price, nonce)
+        tx_hash = swap_weth_to_eth(wallet, gas_fees, nonces[2], wait=False)
+        report_progress(progress, "WETH → ETH", "sent", tx_hash)
+        yield from confirming({"WETH to ETH unwrap": tx_hash})
+        report_progress(progress, "WETH → ETH", "confirmed", tx_hash)
 
         return tx_hash
 
     except Exception as e:
+        release_trade_nonces(wallet, nonces, gas_fees)
         raise Exception(f"Swap to ETH failed: {e}")
+
+
+def execute_swap_to_eth(wallet, token_address, token_amount, progress=None):
+    """
+    Orchestrator to manage sell : Token → Virtual → WETH → ETH flow, on this thread.
+    `progress(step, status, tx_hash)` is called as each transaction is sent and confirmed.
+    """
+    return run_steps(sell_steps(wallet, token_address, token_amount, progress))
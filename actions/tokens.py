@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import time
+from shared_data.shared_data import web3
+from shared_data.metrics import register_stats
+from actions.contracts import load_erc20
+from actions.multicall import multicall
+
+# name, symbol and decimals never change, they are cached forever and persisted
+TOKEN_METADATA_FILE = os.getenv("TOKEN_METADATA_FILE", "token_metadata.json")
+# total supply and taxes can change, they are cached for a short time
+TOKEN_STATE_TTL = float(os.getenv("TOKEN_STATE_TTL", "30"))
+
+IMMUTABLE_FIELDS = ("name", "symbol", "decimals")
+MUTABLE_FIELDS = ("total_supply", "buy_tax_bps", "sell_tax_bps")
+DEFAULT_DECIMALS = 18
+
+_metadata = None  # checksum address -> {name, symbol, decimals}, loaded from disk on first use
+_state = {}  # checksum address -> {total_supply, buy_tax_bps, sell_tax_bps, fetched_at}
+_tokens_lock = threading.Lock()
+
+token_registry_stats = {"hits": 0, "immutable_reads": 0, "state_reads": 0}
+register_stats("token_registry", lambda: token_registry_stats)
+
+
+def _load_metadata():
+    global _metadata
+    if _metadata is None:
+        try:
+            with open(TOKEN_METADATA_FILE, "r") as f:
+                _metadata = json.load(f)
+        except (OSError, ValueError):
+            _metadata = {}
+    return _metadata
+
+
+def _save_metadata():
+    try:
+        tmp_path = TOKEN_METADATA_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(_metadata, f)
+        os.replace(tmp_path, TOKEN_METADATA_FILE)
+    except OSError as e:
+        print(f"[ERROR] Failed to save token metadata: {e}")
+
+
+def _calls(contract, fields):
+    functions = {
+        "name": contract.functions.name,
+        "symbol": contract.functions.symbol,
+        "decimals": contract.functions.decimals,
+        "total_supply": contract.functions.totalSupply,
+        "buy_tax_bps": contract.functions.projectBuyTaxBasisPoints,
+        "sell_tax_bps": contract.functions.projectSellTaxBasisPoints,
+    }
+    return [functions[field]() for field in fields]
+
+
+def get_token_metadata(token_address, include_state=True):
+    """
+    Token name, symbol and decimals, plus total supply and Virtuals buy/sell tax (basis points)
+    if include_state is set. Whatever is missing or stale is read in a single multicall.
+    Values that could not be read are None.
+    """
+    address = web3.to_checksum_address(token_address)
+    with _tokens_lock:
+        metadata = _load_metadata().get(address)
+        state = _state.get(address)
+
+    fields = []
+    if metadata is None:
+        fields += IMMUTABLE_FIELDS
+    if include_state and (state is None or time.time() - state["fetched_at"] > TOKEN_STATE_TTL):
+        fields += MUTABLE_FIELDS
+
+    if fields:
+        values = dict(zip(fields, multicall(_calls(load_erc20(address), fields))))
+        with _tokens_lock:
+            if metadata is None:
+                token_registry_stats["immutable_reads"] += 1
+                metadata = {field: values[field] for field in IMMUTABLE_FIELDS}
+                # a token without decimals() will not grow one, but a failed read may be transient
+                if metadata["decimals"] is not None:
+                    _load_metadata()[address] = metadata
+                    _save_metadata()
+            if "total_supply" in values:
+                token_registry_stats["state_reads"] += 1
+                state = {field: values[field] for field in MUTABLE_FIELDS}
+                state["fetched_at"] = time.time()
+                _state[address] = state
+    else:
+        token_registry_stats["hits"] += 1
+
+    token = dict(metadata, address=address)
+    if include_state:
+        token.update({field: state[field] for field in MUTABLE_FIELDS})
+    return token
+
+
+def get_token_decimals(token_address):
+    """
+    Decimals of a token, the single source for amount conversions. Cached forever.
+    """
+    decimals = get_token_metadata(token_address, include_state=False)["decimals"]
+    return decimals if decimals is not None else DEFAULT_DECIMALS
+
+
+def from_token_units(raw_amount, token_address):
+    """
+    Convert a raw on-chain token amount to a human readable one.
+    """
+    return raw_amount / (10 ** get_token_decimals(token_address))
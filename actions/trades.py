@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from shared_data.shared_data import web3
+from shared_data.metrics import register_stats
+from actions.buy import buy_steps
+from actions.sell import sell_steps
+from actions.transactions import run_steps, run_steps_async
+
+TRADE_JOBS_FILE = os.getenv("TRADE_JOBS_FILE", "trade_jobs.json")  # persisted trade jobs, reported again after a restart
+TRADE_WORKERS = int(os.getenv("TRADE_WORKERS", "8"))  # trades executed at the same time, unless they run on an event loop
+TRADE_JOBS_KEPT = int(os.getenv("TRADE_JOBS_KEPT", "500"))  # finished jobs kept in the file
+
+# queued -> running -> done | failed, or interrupted if the bot restarted while the job was not finished
+FINISHED_STATES = ("done", "failed", "interrupted")
+
+_jobs = None  # job id -> job, loaded from disk on first use
+_interrupted_ids = []  # jobs the previous run left unfinished
+_jobs_lock = threading.RLock()
+_trade_executor = ThreadPoolExecutor(max_workers=TRADE_WORKERS, thread_name_prefix="trades")
+_trade_loop = None  # event loop the trades run on as coroutines, see run_trades_on
+
+trade_stats = {"submitted": 0, "done": 0, "failed": 0, "interrupted": 0}
+
+
+def _load_jobs():
+    global _jobs
+    if _jobs is None:
+        try:
+            with open(TRADE_JOBS_FILE, "r") as f:
+                _jobs = json.load(f)
+        except (OSError, ValueError):
+            _jobs = {}
+        _interrupted_ids.extend(job_id for job_id, job in _jobs.items() if job["state"] not in FINISHED_STATES)
+    return _jobs
+
+
+def _save_jobs():
+    # under _jobs_lock
+    finished = [job for job in _jobs.values() if job["state"] in FINISHED_STATES]
+    for job in sorted(finished, key=lambda job: job["updated_at"])[:max(0, len(finished) - TRADE_JOBS_KEPT)]:
+        del _jobs[job["id"]]
+    try:
+        tmp_path = TRADE_JOBS_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(_jobs, f)
+        os.replace(tmp_path, TRADE_JOBS_FILE)
+    except OSError as e:
+        print(f"[ERROR] Failed to save trade jobs: {e}")
+
+
+def _update_job(job, on_update, **changes):
+    with _jobs_lock:
+        job.update(changes, updated_at=time.time())
+        _save_jobs()
+        snapshot = json.loads(json.dumps(job))
+    if on_update:
+        try:
+            on_update(snapshot)
+        except Exception as e:
+            print(f"[ERROR] Failed to report trade job {job['id']}: {e}")
+
+
+def _set_step(job, on_update, step, status, tx_hash):
+    with _jobs_lock:
+        steps = [dict(s) for s in job["steps"]]
+        existing = next((s for s in steps if s["label"] == step), None)
+        if existing is None:
+            steps.append({"label": step, "status": status, "tx_hash": tx_hash})
+        else:
+            existing.update(status=status, tx_hash=tx_hash)
+    _update_job(job, on_update, steps=steps)
+
+
+def _trade_steps(job, wallet, amount, on_update):
+    progress = lambda step, status, tx_hash: _set_step(job, on_update, step, status, tx_hash)
+    if job["kind"] == "buy":
+        return buy_steps(wallet, job["token_address"], amount, progress=progress)
+    return sell_steps(wallet, job["token_address"], amount, progress=progress)
+
+
+def _finish_job(job, on_update, tx_hash=None, error=None):
+    if error is not None:
+        trade_stats["failed"] += 1
+        print(f"[ERROR] Trade job {job['id']} failed: {error}")
+        _update_job(job, on_update, state="failed", error=str(error))
+        return
+    trade_stats["done"] += 1
+    _update_job(job, on_update, state="done", tx_hash=tx_hash)
+
+
+def _run_job(job, wallet, amount, on_update):
+    _update_job(job, on_update, state="running")
+    try:
+        tx_hash = run_steps(_trade_steps(job, wallet, amount, on_update))
+    except Exception as e:
+        _finish_job(job, on_update, error=e)
+        return
+    _finish_job(job, on_update, tx_hash=tx_hash)
+
+
+async def _run_job_async(job, wallet, amount, on_update):
+    # job updates write the jobs file and call on_update, kept off the event loop
+    await asyncio.to_thread(_update_job, job, on_update, state="running")
+    try:
+        tx_hash = await run_steps_async(_trade_steps(job, wallet, amount, on_update))
+    except Exception as e:
+        await asyncio.to_thread(_finish_job, job, on_update, error=e)
+        return
+    await asyncio.to_thread(_finish_job, job, on_update, tx_hash=tx_hash)
+
+
+def run_trades_on(loop):
+    """
+    Run the trades submitted from now on as coroutines on `loop` (a running asyncio event loop, possibly
+    on another thread) instead of the trade threads: a trade waiting for receipts then holds no thread.
+    """
+    global _trade_loop
+    _trade_loop = loop
+
+
+def submit_trade(kind, wallet, token_address, amount, on_update=None, **info):
+    """
+    Queue a "buy" (amount in ETH) or "sell" (amount in raw token units) and return its job right away.
+    `on_update(job)` is called with a copy of the job at each state change and each transaction sent or confirmed.
+    Extra `info` (e.g. the chat and status message) is stored with the job.
+    """
+    job = {
+        "id": uuid.uuid4().hex[:8],
+        "kind": kind,
+        "state": "queued",
+        "chat_id": wallet.get("chat_id"),
+        "wallet_address": wallet["address"],
+        "token_address": token_address,
+        # buys take a Decimal amount of ETH, kept as a string so the job can be persisted
+        "amount": amount if kind == "sell" else str(amount),
+        "steps": [],
+        "tx_hash": None,
+        "error": None,
+        "created_at": time.time(),
+        "updated_at": time.time(),
+        **info,
+    }
+    with _jobs_lock:
+        _load_jobs()[job["id"]] = job
+        _save_jobs()
+    trade_stats["submitted"] += 1
+    if _trade_loop is not None:
+        asyncio.run_coroutine_threadsafe(_run_job_async(job, wallet, amount, on_update), _trade_loop)
+    else:
+        _trade_executor.submit(_run_job, job, wallet, amount, on_update)
+    return dict(job)
+
+
+def get_trade_job(job_id):
+    """
+    Copy of a trade job, None if unknown.
+    """
+    with _jobs_lock:
+        job = _load_jobs().get(job_id)
+        return json.loads(json.dumps(job)) if job else None
+
+
+def recover_interrupted_trades():
+    """
+    Mark the jobs left unfinished by the previous run as interrupted, and return them with the
+    outcome of each transaction they had sent ("confirmed", "failed" or "pending") read from the chain.
+    """
+    with _jobs_lock:
+        jobs = _load_jobs()
+        unfinished = [jobs[job_id] for job_id in _interrupted_ids if job_id in jobs]
+        _interrupted_ids.clear()
+    for job in unfinished:
+        steps = []
+        for step in job["steps"]:
+            status = step["status"]
+            if step["tx_hash"]:
+                try:
+                    receipt = web3.eth.get_transaction_receipt(step["tx_hash"])
+                    status = "confirmed" if receipt.status == 1 else "failed"
+                except Exception:
+                    status = "pending"
+            steps.append(dict(step, status=status))
+        trade_stats["interrupted"] += 1
+        _update_job(job, None, state="interrupted", steps=steps, error="The bot restarted during the trade.")
+    return [get_trade_job(job["id"]) for job in unfinished]
+
+
+def _trade_metrics():
+    with _jobs_lock:
+        jobs = list(_load_jobs().values())
+    return dict(
+        trade_stats,
+        queued=sum(1 for job in jobs if job["state"] == "queued"),
+        running=sum(1 for job in jobs if job["state"] == "running"),
+        runtime="asyncio" if _trade_loop is not None else "threads",
+    )
+
+
+register_stats("trades", _trade_metrics)
@@ -0,0 +1,158 @@
+import asyncio
+from concurrent.futures import wait as wait_futures
+from shared_data.shared_data import web3
+from actions.nonces import mark_nonce_sent, release_nonces, fill_nonce_gaps
+from actions.receipts import track_transaction, normalize_hash
+from actions.gas import learn_gas_used
+
+
+def send_transaction(wallet, tx, gas_key=None):
+    """
+    Sign a built transaction with the wallet key and broadcast it.
+    The nonce is recorded as used once the node accepted the transaction,
+    and the receipt tracker starts watching it right away.
+    With `gas_key`, the gas it used is learned for its route once mined.
+    """
+    signed_tx = web3.eth.account.sign_transaction(tx, wallet["private_key"])
+    tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+    mark_nonce_sent(wallet["address"], tx["nonce"])
+    callback = (lambda receipt: learn_gas_used(gas_key, receipt, tx["gas"])) if gas_key else None
+    track_transaction(tx_hash, callback)
+    return tx_hash
+
+
+def release_trade_nonces(wallet, nonces, gas_fees):
+    """
+    Give back the nonces of a failed trade and fill any gap it left behind.
+    """
+    if not nonces:
+        return
+    try:
+        if release_nonces(wallet["address"], nonces):
+            fill_nonce_gaps(wallet, gas_fees)
+    except Exception as e:
+        print(f"[ERROR] Failed to release nonces {nonces} for {wallet['address']}: {e}")
+
+
+def _loop_future(future, loop):
+    # asyncio future of `loop` resolved like the concurrent `future`, which is left untouched
+    waiter = loop.create_future()
+
+    def copy_state():
+        if waiter.done():
+            return
+        if future.cancelled():
+            waiter.cancel()
+        elif future.exception() is not None:
+            waiter.set_exception(future.exception())
+        else:
+            waiter.set_result(future.result())
+
+    def on_done(_):
+        try:
+            loop.call_soon_threadsafe(copy_state)
+        except RuntimeError:
+            # the loop was closed, nobody awaits the copy anymore
+            pass
+
+    future.add_done_callback(on_done)
+    return waiter
+
+
+class ReceiptWait:
+    """
+    Yielded by trade steps when they need transactions to be mined, the driver running
+    the steps (run_steps or run_steps_async) sends the receipts back, in order.
+    """
+
+    def __init__(self, tx_hashes, timeout, futures=None):
+        self.tx_hashes = [normalize_hash(tx_hash) for tx_hash in tx_hashes]
+        self.futures = futures if futures is not None else [track_transaction(tx_hash) for tx_hash in self.tx_hashes]
+        self.timeout = timeout
+
+    def _timeout_error(self):
+        tx_hash = next((h for h, future in zip(self.tx_hashes, self.futures) if not future.done()), self.tx_hashes[0])
+        return Exception(f"Transaction {tx_hash} is not in the chain after {self.timeout} seconds")
+
+    def result(self):
+        """
+        Block the thread until the receipts are in.
+        """
+        _, pending = wait_futures(self.futures, timeout=self.timeout)
+        if pending:
+            raise self._timeout_error()
+        return [future.result() for future in self.futures]
+
+    async def async_result(self):
+        """
+        Await the receipts, only the coroutine waits.
+        """
+        # the tracker's futures are shared with other waiters: each coroutine awaits its own copies,
+        # cancelling them never reaches the shared ones (asyncio.wrap_future would cancel them)
+        loop = asyncio.get_running_loop()
+        waiters = [_loop_future(future, loop) for future in self.futures]
+        _, pending = await asyncio.wait(waiters, timeout=self.timeout)
+        if pending:
+            raise self._timeout_error()
+        return [waiter.result() for waiter in waiters]
+
+
+def confirming(labelled_hashes, timeout=300):
+    """
+    Trade step waiting for several broadcast transactions at once, given as {label: tx_hash}:
+    `receipts = yield from confirming(...)`. Raises if any of them reverted.
+    """
+    labels = list(labelled_hashes)
+    receipts = yield ReceiptWait([labelled_hashes[label] for label in labels], timeout)
+    for label, receipt in zip(labels, receipts):
+        if receipt.status == 0:
+            raise Exception(f"{label} transaction failed.")
+    return receipts
+
+
+def _advance(steps, value, error):
+    # returns (finished, next wait or the steps' result), StopIteration cannot be passed through a Future
+    try:
+        return False, steps.throw(error) if error is not None else steps.send(value)
+    except StopIteration as e:
+        return True, e.value
+
+
+def run_steps(steps):
+    """
+    Run trade steps (a generator yielding ReceiptWait) on this thread and return their result.
+    """
+    value, error = None, None
+    while True:
+        finished, wait = _advance(steps, value, error)
+        if finished:
+            return wait
+        try:
+            value, error = wait.result(), None
+        except Exception as e:
+            value, error = None, e
+
+
+async def run_steps_async(steps):
+    """
+    Run trade steps from the event loop: the work between two waits (RPC calls, signing)
+    runs on the default executor, waiting for receipts only holds a coroutine.
+    """
+    value, error = None, None
+    while True:
+        finished, wait = await asyncio.to_thread(_advance, steps, value, error)
+        if finished:
+            return wait
+        try:
+            value, error = await wait.async_result(), None
+        except Exception as e:
+            value, error = None, e
+
+
+def report_progress(progress, step, status, tx_hash=None):
+    """
+    Tell the `progress(step, status, tx_hash)` callback of a trade, if any,
+    that one of its transactions was "sent" or "confirmed".
+    """
+    if progress:
+        progress(step, status, normalize_hash(tx_hash) if tx_hash is not None else None)
@@ -1,6 +1,7 @@
 from decimal import Decimal
 from shared_data.shared_data import web3
-from actions.contracts import load_contract
+from actions.contracts import load_erc20
+from actions.tokens import from_token_units
 
 # Calculate total fees for swap
 def calculate_total_fees(amount_to_swap, gas_price_gwei, gas_limits):
@@ -26,8 +27,8 @@ def check_balance(wallet_address, contract_address=None):
     try:
         eth_balance = web3.eth.get_balance(wallet_address) / (10 ** 18)
         if contract_address:
-            contract = load_contract(contract_address)
-            token_balance = contract.functions.balanceOf(wallet_address).call() / (10 ** 18)
+            contract = load_erc20(contract_address)
+            token_balance = from_token_units(contract.functions.balanceOf(wallet_address).call(), contract_address)
         else:
             token_balance = 0.0
         return eth_balance, token_balance
@@ -0,0 +1,136 @@
+# Uniswap V3 swap math (TickMath, SqrtPriceMath, SwapMath) ported to Python integers.
+# Rounding follows the Solidity libraries exactly, so results match the on-chain Quoter.
+
+MIN_TICK = -887272
+MAX_TICK = 887272
+MIN_SQRT_RATIO = 4295128739
+MAX_SQRT_RATIO = 1461446703485210103287273052203988822378723970342
+Q96 = 1 << 96
+MAX_UINT256 = (1 << 256) - 1
+MAX_UINT160 = (1 << 160) - 1
+
+# pool fee (pips) -> tick spacing, as enabled by the V3 factory
+TICK_SPACINGS = {100: 1, 500: 10, 3000: 60, 10000: 200}
+
+# sqrt(1.0001^-(2^i)) in Q128.128, for each bit i of the absolute tick
+_TICK_RATIOS = (
+    (0x2, 0xfff97272373d413259a46990580e213a),
+    (0x4, 0xfff2e50f5f656932ef12357cf3c7fdcc),
+    (0x8, 0xffe5caca7e10e4e61c3624eaa0941cd0),
+    (0x10, 0xffcb9843d60f6159c9db58835c926644),
+    (0x20, 0xff973b41fa98c081472e6896dfb254c0),
+    (0x40, 0xff2ea16466c96a3843ec78b326b52861),
+    (0x80, 0xfe5dee046a99a2a811c461f1969c3053),
+    (0x100, 0xfcbe86c7900a88aedcffc83b479aa3a4),
+    (0x200, 0xf987a7253ac413176f2b074cf7815e54),
+    (0x400, 0xf3392b0822b70005940c7a398e4b70f3),
+    (0x800, 0xe7159475a2c29b7443b29c7fa6e889d9),
+    (0x1000, 0xd097f3bdfd2022b8845ad8f792aa5825),
+    (0x2000, 0xa9f746462d870fdf8a65dc1f90e061e5),
+    (0x4000, 0x70d869a156d2a1b890bb3df62baf32f7),
+    (0x8000, 0x31be135f97d08fd981231505542fcfa6),
+    (0x10000, 0x9aa508b5b7a84e1c677de54f3e99bc9),
+    (0x20000, 0x5d6af8dedb81196699c329225ee604),
+    (0x40000, 0x2216e584f5fa1ea926041bedfe98),
+    (0x80000, 0x48a170391f7dc42444e8fa2),
+)
+
+
+def mul_div(a, b, denominator):
+    return a * b // denominator
+
+
+def mul_div_rounding_up(a, b, denominator):
+    return -(-a * b // denominator)
+
+
+def div_rounding_up(a, b):
+    return -(-a // b)
+
+
+def get_sqrt_ratio_at_tick(tick):
+    """
+    sqrt(1.0001^tick) as a Q64.96.
+    """
+    abs_tick = abs(tick)
+    if abs_tick > MAX_TICK:
+        raise ValueError(f"Tick {tick} out of range.")
+    ratio = 0xfffcb933bd6fad37aa2d162d1a594001 if abs_tick & 0x1 else 0x100000000000000000000000000000000
+    for bit, factor in _TICK_RATIOS:
+        if abs_tick & bit:
+            ratio = (ratio * factor) >> 128
+    if tick > 0:
+        ratio = MAX_UINT256 // ratio
+    return (ratio >> 32) + (0 if ratio % (1 << 32) == 0 else 1)
+
+
+def get_amount0_delta(sqrt_a, sqrt_b, liquidity, round_up):
+    if sqrt_a > sqrt_b:
+        sqrt_a, sqrt_b = sqrt_b, sqrt_a
+    numerator1 = liquidity << 96
+    numerator2 = sqrt_b - sqrt_a
+    if round_up:
+        return div_rounding_up(mul_div_rounding_up(numerator1, numerator2, sqrt_b), sqrt_a)
+    return mul_div(numerator1, numerator2, sqrt_b) // sqrt_a
+
+
+def get_amount1_delta(sqrt_a, sqrt_b, liquidity, round_up):
+    if sqrt_a > sqrt_b:
+        sqrt_a, sqrt_b = sqrt_b, sqrt_a
+    if round_up:
+        return mul_div_rounding_up(liquidity, sqrt_b - sqrt_a, Q96)
+    return mul_div(liquidity, sqrt_b - sqrt_a, Q96)
+
+
+def _next_sqrt_price_from_amount0(sqrt_price, liquidity, amount):
+    if amount == 0:
+        return sqrt_price
+    numerator1 = liquidity << 96
+    product = amount * sqrt_price
+    # same branch as Solidity, which falls back to a less precise formula when the product overflows
+    if product <= MAX_UINT256 and numerator1 + product <= MAX_UINT256:
+        return mul_div_rounding_up(numerator1, sqrt_price, numerator1 + product)
+    return div_rounding_up(numerator1, numerator1 // sqrt_price + amount)
+
+
+def _next_sqrt_price_from_amount1(sqrt_price, liquidity, amount):
+    return sqrt_price + (amount << 96) // liquidity
+
+
+def get_next_sqrt_price_from_input(sqrt_price, liquidity, amount_in, zero_for_one):
+    if zero_for_one:
+        return _next_sqrt_price_from_amount0(sqrt_price, liquidity, amount_in)
+    return _next_sqrt_price_from_amount1(sqrt_price, liquidity, amount_in)
+
+
+def compute_swap_step(sqrt_current, sqrt_target, liquidity, amount_remaining, fee_pips):
+    """
+    One exact-input swap step towards sqrt_target. Returns (sqrt next, amount in, amount out, fee amount).
+    """
+    zero_for_one = sqrt_current >= sqrt_target
+    amount_remaining_less_fee = mul_div(amount_remaining, 1000000 - fee_pips, 1000000)
+    if zero_for_one:
+        amount_in = get_amount0_delta(sqrt_target, sqrt_current, liquidity, True)
+    else:
+        amount_in = get_amount1_delta(sqrt_current, sqrt_target, liquidity, True)
+
+    if amount_remaining_less_fee >= amount_in:
+        sqrt_next = sqrt_target
+    else:
+        sqrt_next = get_next_sqrt_price_from_input(sqrt_current, liquidity, amount_remaining_less_fee, zero_for_one)
+
+    reached_target = sqrt_next == sqrt_target
+    if zero_for_one:
+        if not reached_target:
+            amount_in = get_amount0_delta(sqrt_next, sqrt_current, liquidity, True)
+        amount_out = get_amount1_delta(sqrt_next, sqrt_current, liquidity, False)
+    else:
+        if not reached_target:
+            amount_in = get_amount1_delta(sqrt_current, sqrt_next, liquidity, True)
+        amount_out = get_amount0_delta(sqrt_current, sqrt_next, liquidity, False)
+
+    if not reached_target:
+        fee_amount = amount_remaining - amount_in
+    else:
+        fee_amount = mul_div_rounding_up(amount_in, fee_pips, 1000000 - fee_pips)
+    return sqrt_next, amount_in, amount_out, fee_amount
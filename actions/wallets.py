@@ -1,5 +1,7 @@
 from shared_data.shared_data import web3
-from actions.contracts import load_contract
+from actions.contracts import load_erc20
+from actions.tokens import from_token_units
+from shared_data.rpc_batch import get_balances
 
 def create_wallet():
     """
@@ -18,10 +20,22 @@ def check_balance(wallet_address, contract_address=None):
     try:
         eth_balance = web3.eth.get_balance(wallet_address) / (10 ** 18)  # Convert from wei to ETH
         if contract_address:
-            contract = load_contract(contract_address)
-            token_balance = contract.functions.balanceOf(wallet_address).call() / (10 ** 18)
+            contract = load_erc20(contract_address)
+            token_balance = from_token_units(contract.functions.balanceOf(wallet_address).call(), contract_address)
         else:
             token_balance = 0.0
         return eth_balance, token_balance
     except Exception as e:
         raise Exception(f"Error checking balance: {e}")
+
+def check_balances(wallet_addresses):
+    """
+    Checks the ETH balance of several wallets with a single batched request.
+    """
+    try:
+        return [
+            balance / (10 ** 18) if balance is not None else 0.0
+            for balance in get_balances(wallet_addresses)
+        ]
+    except Exception as e:
+        raise Exception(f"Error checking balances: {e}")
@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from eth_abi import encode, decode
+from web3 import Web3
+
+# Runs the bot's buy and sell steps (actions/buy.py, actions/sell.py) with the thread driver (run_steps,
+# one thread per trade) and the asyncio driver (run_steps_async, one coroutine per trade), against a stub
+# JSON-RPC node that answers every call after --rpc-latency seconds and mines each transaction with the
+# next block, one every --block-time seconds. The stub only runs the calls a trade makes, no swap happens.
+#
+#   python benchmark_runtimes.py --trades 1000 --block-time 2
+
+_AGGREGATE3 = Web3.keccak(text="aggregate3((address,bool,bytes)[])")[:4]
+_GET_POOL = Web3.keccak(text="getPool(address,address,uint24)")[:4]
+_QUOTE_EXACT_INPUT = Web3.keccak(text="quoteExactInput(bytes,uint256)")[:4]
+_FEE_RECIPIENT = "0x000000000000000000000000000000000000dEaD"
+
+
+class _StubNode:
+    """
+    Just enough of a Base node for the trade steps to run.
+    Quotes are twice the amount in, and no pool exists so the Quoter is always used.
+    """
+
+    def __init__(self, block_time, latency):
+        self.block_time = block_time
+        self.latency = latency
+        self.started_at = time.time()
+        self._mined_in = {}  # tx hash -> block it is mined with
+        self._lock = threading.Lock()
+
+    def block_number(self):
+        return int((time.time() - self.started_at) / self.block_time) + 1
+
+    def _block(self, number):
+        return {
+            "number": hex(number), "hash": "0x" + number.to_bytes(32, "big").hex(), "parentHash": "0x" + "00" * 32,
+            "timestamp": hex(int(self.started_at + number * self.block_time)), "baseFeePerGas": hex(10**7),
+            "gasLimit": hex(30_000_000), "gasUsed": "0x0", "transactions": [], "miner": "0x" + "00" * 20,
+            "difficulty": "0x0", "extraData": "0x", "logsBloom": "0x" + "00" * 256, "nonce": "0x" + "00" * 8,
+            "receiptsRoot": "0x" + "00" * 32, "sha3Uncles": "0x" + "00" * 32, "stateRoot": "0x" + "00" * 32,
+            "transactionsRoot": "0x" + "00" * 32, "mixHash": "0x" + "00" * 32, "size": "0x1", "uncles": [],
+        }
+
+    def _receipt(self, tx_hash):
+        with self._lock:
+            block = self._mined_in.get(tx_hash)
+        if block is None or block > self.block_number():
+            return None
+        return {
+            "transactionHash": tx_hash, "status": "0x1", "blockNumber": hex(block), "blockHash": "0x" + block.to_bytes(32, "big").hex(),
+            "gasUsed": hex(120_000), "cumulativeGasUsed": hex(120_000), "effectiveGasPrice": hex(10**7), "logs": [],
+            "transactionIndex": "0x0", "type": "0x2", "from": "0x" + "00" * 20, "to": "0x" + "00" * 20,
+            "contractAddress": None, "logsBloom": "0x" + "00" * 256,
+        }
+
+    def _send(self, raw_transaction):
+        tx_hash = Web3.keccak(hexstr=raw_transaction).to_0x_hex()
+        with self._lock:
+            self._mined_in[tx_hash] = self.block_number() + 1
+        return tx_hash
+
+    def _call(self, data):
+        if data[:4] == _GET_POOL:
+            return encode(["address"], ["0x" + "00" * 20])
+        if data[:4] == _QUOTE_EXACT_INPUT:
+            path, amount_in = decode(["bytes", "uint256"], data[4:])
+            return encode(["uint256", "uint160[]", "uint32[]", "uint256"], [amount_in * 2, [2**96], [0], 100_000])
+        if data[:4] == _AGGREGATE3:
+            calls = decode(["(address,bool,bytes)[]"], data[4:])[0]
+            return encode(["(bool,bytes)[]"], [[(True, self._call(call_data)) for _, _, call_data in calls]])
+        # balances, allowances and any other read
+        return encode(["uint256"], [10**24])
+
+    def handle(self, method, params):
+        if method == "eth_call":
+            return "0x" + self._call(bytes(Web3.to_bytes(hexstr=params[0].get("data") or params[0].get("input")))).hex()
+        if method == "eth_sendRawTransaction":
+            return self._send(params[0])
+        if method == "eth_getTransactionReceipt":
+            return self._receipt(params[0])
+        if method == "eth_getBlockByNumber":
+            return self._block(self.block_number() if params[0] in ("latest", "pending") else int(params[0], 16))
+        if method == "eth_blockNumber":
+            return hex(self.block_number())
+        if method == "eth_feeHistory":
+            blocks = int(params[0], 16) if isinstance(params[0], str) else params[0]
+            return {
+                "oldestBlock": hex(max(1, self.block_number() - blocks + 1)), "baseFeePerGas": [hex(10**7)] * (blocks + 1),
+                "gasUsedRatio": [0.5] * blocks, "reward": [[hex(10**5 * (i + 1)) for i in range(len(params[2]))]] * blocks,
+            }
+        return {
+            "eth_chainId": "0x2105", "net_version": "8453", "eth_getTransactionCount": "0x0", "eth_estimateGas": hex(150_000),
+            "eth_gasPrice": hex(10**7), "eth_maxPriorityFeePerGas": hex(10**5), "eth_getBalance": hex(10**19),
+        }[method]
+
+    def start(self):
+        """
+        Serve the node on a free local port and return its URL.
+        """
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(node.latency)
+                requests = payload if isinstance(payload, list) else [payload]
+                responses = []
+                for request in requests:
+                    try:
+                        responses.append({"jsonrpc": "2.0", "id": request["id"], "result": node.handle(request["method"], request.get("params", []))})
+                    except Exception as e:
+                        responses.append({"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32000, "message": f"{request['method']}: {e!r}"}})
+                body = json.dumps(responses if isinstance(payload, list) else responses[0]).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 1024
+
+        server = Server(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class _PeakThreads:
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        threading.Thread(target=self._sample, daemon=True).start()
+
+    def _sample(self):
+        while not self._stop.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+    def stop(self):
+        self._stop.set()
+        return self.peak
+
+
+def _trade_steps(trade, wallet):
+    from actions.buy import buy_steps
+    from actions.sell import sell_steps
+
+    # half buys, half sells
+    if trade % 2 == 0:
+        return buy_steps(wallet, "0x1111111111111111111111111111111111111111", 0.01)
+    return sell_steps(wallet, "0x1111111111111111111111111111111111111111", 10**18)
+
+
+def _run_threads(wallets, args):
+    from actions.transactions import run_steps
+
+    def run(trade):
+        try:
+            return run_steps(_trade_steps(trade, wallets[trade]))
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=args.workers or args.trades) as executor:
+        return list(executor.map(run, range(args.trades)))
+
+
+async def _run_asyncio(wallets, args):
+    from actions.transactions import run_steps_async
+
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=args.step_threads))
+    return await asyncio.gather(*(run_steps_async(_trade_steps(trade, wallets[trade])) for trade in range(args.trades)), return_exceptions=True)
+
+
+def run_mode(args):
+    """
+    Run the trades with one driver and return its measurements.
+    """
+    # the bot reads its config at import time
+    os.environ.update({
+        "ALCHEMY_URL": args.rpc_url or _StubNode(args.block_time, args.rpc_latency).start(),
+        "RPC_URLS": "", "RPC_TX_URLS": "", "ALCHEMY_WS_URL": "", "METRICS_PORT": "0", "TRADE_ROUTE_MODE": args.route,
+    })
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+    from eth_account import Account
+    import actions.buy
+
+    actions.buy.fee_recipient = _FEE_RECIPIENT
+    wallets = []
+    for trade in range(args.trades):
+        account = Account.create()
+        wallets.append({"address": account.address, "private_key": account.key.to_0x_hex(), "chat_id": trade})
+
+    peak_threads = _PeakThreads()
+    started_at = time.time()
+    # the steps log every transaction
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        if args.mode == "asyncio":
+            results = asyncio.run(_run_asyncio(wallets, args))
+        else:
+            results = _run_threads(wallets, args)
+    elapsed = time.time() - started_at
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        print(f"[ERROR] {len(errors)} trades failed, first: {errors[0]}", file=sys.stderr)
+    return {
+        "mode": args.mode if args.mode == "asyncio" else f"threads ({args.workers or args.trades} workers)",
+        "trades": len(results) - len(errors),
+        "failed": len(errors),
+        "seconds": round(elapsed, 2),
+        "trades_per_second": round((len(results) - len(errors)) / elapsed, 1),
+        "peak_threads": peak_threads.stop(),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Thread vs asyncio trade runtimes, side by side.")
+    parser.add_argument("--trades", type=int, default=1000, help="trades started at once, half buys and half sells")
+    parser.add_argument("--route", choices=("single", "hops"), default=os.getenv("TRADE_ROUTE_MODE", "single"), help="TRADE_ROUTE_MODE of the trades")
+    parser.add_argument("--block-time", type=float, default=2.0, help="seconds between two blocks of the stub node")
+    parser.add_argument("--rpc-latency", type=float, default=0.02, help="seconds the stub node takes to answer a request")
+    parser.add_argument("--workers", type=int, default=0, help="trade threads, 0 for one per trade")
+    parser.add_argument("--step-threads", type=int, default=int(os.getenv("ASYNC_STEP_THREADS", "32")), help="asyncio executor threads")
+    parser.add_argument("--mode", choices=("threads", "asyncio"), help="run a single driver and print it as JSON")
+    parser.add_argument("--rpc-url", default="", help="node the trades are sent to, a stub node is started if empty")
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args)))
+        return
+
+    # each driver runs in its own process so its threads and memory are measured alone,
+    # against a stub node served from this one
+    common = [*sys.argv[1:], "--rpc-url", _StubNode(args.block_time, args.rpc_latency).start()]
+    runs = [
+        ["--mode", "threads", "--workers", os.getenv("TRADE_WORKERS", "8")],
+        ["--mode", "threads"],
+        ["--mode", "asyncio"],
+    ]
+    print(f"{'runtime':<24}{'trades':>8}{'failed':>8}{'seconds':>10}{'trades/s':>10}{'threads':>9}{'rss MB':>9}")
+    for run in runs:
+        output = subprocess.run([sys.executable, __file__, *common, *run], stdout=subprocess.PIPE, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{result['mode']:<24}{result['trades']:>8}{result['failed']:>8}{result['seconds']:>10}{result['trades_per_second']:>10}"
+              f"{result['peak_threads']:>9}{result['max_rss_mb']:>9}")
+
+
+if __name__ == "__main__":
+    main()
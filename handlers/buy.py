@@ -1,9 +1,13 @@
-import requests
 from telebot import types
-from shared_data.shared_data import bot, user_wallets, user_gwei_preferences
-from actions.contracts import load_contract
-from actions.buy import swap_eth_to_token
-from actions.utils import calculate_total_fees
+from shared_data.shared_data import bot, web3, user_wallets, user_gwei_preferences, user_slippage_preferences
+from shared_data.http_session import http_session
+from actions.contracts import load_erc20
+from actions.tokens import get_token_metadata, get_token_decimals, from_token_units
+from actions.buy import expected_buy_gas
+from actions.utils import calculate_total_fees, calculate_fees
+from actions.fee_oracle import FEE_TIERS, DEFAULT_FEE_TIER, expected_gas_price
+from actions.quotes import buy_path, prefetch_quotes, get_slippage, apply_slippage
+from handlers.trades import start_trade, check_ready
 from decimal import Decimal
 
 def buy_wallets_menu(wallets):
@@ -37,7 +41,7 @@ def process_token_address_reply(reply_message, wallet, bot_message_id):
         bot.delete_message(reply_message.chat.id, bot_message_id)
         bot.delete_message(reply_message.chat.id, reply_message.message_id)
 
-        contract = load_contract(token_address)
+        contract = load_erc20(token_address)
         token_details = get_token_details(contract)
 
         wallet["last_token_address"] = token_address
@@ -92,11 +96,11 @@ def buy_menu(wallet, token_info):
     markup.add(types.InlineKeyboardButton("💵 Custom Buy", callback_data=f"custom_buy_{wallet['address']}"))
 
     # btns for Gwei settings
-    current_gwei = user_gwei_preferences.get(wallet["chat_id"], 10)  
-    gwei_presets = [1, 5, 10]
+    current_gwei = user_gwei_preferences.get(wallet["chat_id"], DEFAULT_FEE_TIER)
+    gwei_presets = list(FEE_TIERS)  # slow / normal / fast, priced by the fee oracle
     gwei_buttons = [
         types.InlineKeyboardButton(
-            f"{preset} Gwei {'🟢' if preset == current_gwei else ''}",
+            f"{preset.capitalize()} {'🟢' if preset == current_gwei else ''}",
             callback_data=f"preset_gwei_{preset}_{wallet['address']}"
         ) for preset in gwei_presets
     ]
@@ -104,6 +108,7 @@ def buy_menu(wallet, token_info):
         types.InlineKeyboardButton("⛽ Set Gas:", callback_data=f"custom_gwei_{wallet['address']}"),
         *gwei_buttons
     )
+    markup.add(types.InlineKeyboardButton(f"🎯 Slippage: {get_slippage(wallet['chat_id'])}%", callback_data=f"custom_slippage_{wallet['address']}"))
 
     markup.add(types.InlineKeyboardButton("⬅️ Main Menu", callback_data="main_menu"))
     return markup
@@ -115,14 +120,14 @@ def handle_gwei_preset(call):
     Manages the selection of a Gwei preset.
     """
     data = call.data.split("_")
-    preset_gwei = int(data[2])
+    preset_gwei = data[2]
     wallet_address = data[3]
     chat_id = call.message.chat.id
 
-    # update user_gwei_preferences with the new preset value
+    # update user_gwei_preferences with the new fee tier
     user_gwei_preferences[chat_id] = preset_gwei
 
-    bot.answer_callback_query(call.id, f"{preset_gwei} Gwei successfully set!", show_alert=False)
+    bot.answer_callback_query(call.id, f"{preset_gwei.capitalize()} gas successfully set!", show_alert=False)
 
     # update the menu global
     wallet = next((w for w in user_wallets.get(chat_id, []) if w["address"] == wallet_address), None)
@@ -180,6 +185,68 @@ def process_custom_gwei(message, wallet_address, call):
 
 
 
+@bot.callback_query_handler(func=lambda call: call.data.startswith("custom_slippage_"))
+def handle_custom_slippage_prompt(call):
+    """
+    Displays a prompt for the user to enter a slippage tolerance.
+    """
+    wallet_address = call.data.split("_")[-1]
+    bot.send_message(
+        call.message.chat.id,
+        "Enter the slippage tolerance in % (0.1-50):",
+        parse_mode="Markdown"
+    )
+    bot.register_next_step_handler_by_chat_id(call.message.chat.id, process_custom_slippage, wallet_address, call)
+
+
+def process_custom_slippage(message, wallet_address, call):
+    """
+    Validates and saves the slippage tolerance supplied by the user.
+    """
+    chat_id = message.chat.id
+    try:
+        slippage = float(message.text.strip().rstrip("%"))
+        if slippage < 0.1 or slippage > 50:
+            raise ValueError("Invalid slippage. Enter a number between 0.1 and 50.")
+        user_slippage_preferences[chat_id] = slippage
+        bot.answer_callback_query(call.id, f"{slippage}% slippage successfully set!", show_alert=False)
+
+        # update the slippage button of the menu, buy or sell, keeping the rest of it as is
+        markup = call.message.reply_markup
+        if markup:
+            for row in markup.keyboard:
+                for button in row:
+                    if (button.callback_data or "").startswith("custom_slippage_"):
+                        button.text = f"🎯 Slippage: {get_slippage(chat_id)}%"
+            bot.edit_message_reply_markup(
+                chat_id=chat_id,
+                message_id=call.message.message_id,
+                reply_markup=markup
+            )
+    except ValueError as e:
+        bot.send_message(chat_id, f"⚠️ {e}\nPlease try again.")
+        handle_custom_slippage_prompt(call)
+    except Exception as e:
+        print(f"Error processing custom slippage: {e}")
+
+
+def format_buy_quote(quote_future, token_address, eth_amount, symbol, chat_id):
+    """
+    Quote line of the token card: expected output of a buy and the minimum accepted with the user slippage.
+    """
+    try:
+        amount_out = quote_future.result(timeout=5)[0]
+        if amount_out is None:
+            return "🔄 Quote: no route\n"
+        slippage = get_slippage(chat_id)
+        expected = from_token_units(amount_out, token_address)
+        minimum = from_token_units(apply_slippage(amount_out, slippage), token_address)
+        return f"🔄 Quote: {eth_amount} ETH ≈ {expected:,.2f} {symbol} (min {minimum:,.2f} at {slippage}% slippage)\n"
+    except Exception as e:
+        print(f"Error fetching quote: {e}")
+        return "🔄 Quote: N/A\n"
+
+
 @bot.callback_query_handler(func=lambda call: call.data == "manual_buy")
 def manual_buy_handler(call):
     """
@@ -221,7 +288,7 @@ def fetch_dexscreener_data(token_address):
     """
     try:
         url = f"https://api.dexscreener.com/latest/dex/tokens/{token_address}"
-        response = requests.get(url)
+        response = http_session.get(url)
         if response.status_code == 200:
             data = response.json()
             if "pairs" in data and data["pairs"]:
@@ -240,49 +307,29 @@ def get_token_details(contract, uniswap_pair_contract=None):
     Includes MarketCap and Liquidity information if available.
     """
     try:
-        # main infos
-        try:
-            name = contract.functions.name().call()
-        except Exception as e:
-            print(f"Error fetching name: {e}")
-            name = "N/A"
-
-        try:
-            symbol = contract.functions.symbol().call()
-        except Exception as e:
-            print(f"Error fetching symbol: {e}")
-            symbol = "N/A"
-
-        try:
-            decimals = contract.functions.decimals().call()
-        except Exception as e:
-            print(f"Error fetching decimals: {e}")
-            decimals = 18  # default to 20
-
+        # main infos and taxes, from the token registry (at most one eth_call)
         try:
-            total_supply = contract.functions.totalSupply().call() / (10 ** decimals)
+            token = get_token_metadata(contract.address)
+            name, symbol, decimals = token["name"], token["symbol"], get_token_decimals(contract.address)
+            total_supply, buy_tax, sell_tax = token["total_supply"], token["buy_tax_bps"], token["sell_tax_bps"]
+            total_supply = from_token_units(total_supply, contract.address) if total_supply is not None else 0
         except Exception as e:
-            print(f"Error fetching totalSupply: {e}")
+            print(f"Error fetching token infos: {e}")
+            name = symbol = decimals = buy_tax = sell_tax = None
             total_supply = 0
 
+        name = name if name is not None else "N/A"
+        symbol = symbol if symbol is not None else "N/A"
+
         # get price and liquidity with dexscreener
         price_usd, liquidity_usd = fetch_dexscreener_data(contract.address)
 
         # mcap calculation
         market_cap = total_supply * price_usd
 
-        # tax information
-        try:
-            buy_tax = contract.functions.projectBuyTaxBasisPoints().call() / 100 if hasattr(contract.functions, "projectBuyTaxBasisPoints") else "N/A"
-        except Exception as e:
-            print(f"Error fetching buy tax: {e}")
-            buy_tax = "N/A"
-
-        try:
-            sell_tax = contract.functions.projectSellTaxBasisPoints().call() / 100 if hasattr(contract.functions, "projectSellTaxBasisPoints") else "N/A"
-        except Exception as e:
-            print(f"Error fetching sell tax: {e}")
-            sell_tax = "N/A"
+        # tax information (only Virtuals tokens expose it)
+        buy_tax = buy_tax / 100 if buy_tax is not None else "N/A"
+        sell_tax = sell_tax / 100 if sell_tax is not None else "N/A"
 
         # cotnract address
         contract_address = contract.address if hasattr(contract, "address") else "N/A"
@@ -315,15 +362,21 @@ def process_token_address(message, wallet):
         return
 
     try:
-        contract = load_contract(token_address)
+        amount_to_swap = 0.05  # ETH Amount to swap
+
+        # the quote runs while the token details are fetched, simulated locally once the pools are loaded
+        tokens, fees = buy_path(token_address)
+        _, amount_after_fee = calculate_fees(amount_to_swap)
+        quote_future = prefetch_quotes([(tokens, fees, web3.to_wei(amount_after_fee, "ether"))], simulate=True)
+
+        contract = load_erc20(token_address)
         token_details = get_token_details(contract)
 
         wallet["last_token_address"] = token_address
 
         # define gwei parameters
-        amount_to_swap = 0.05  # ETH Amount to swap
-        gas_price_gwei = user_gwei_preferences.get(wallet["chat_id"], 20)  # gas defined by user
-        gas_limits = [21000, 100000, 250000]  # gas limits
+        gas_price_gwei = web3.from_wei(expected_gas_price(user_gwei_preferences.get(wallet["chat_id"], DEFAULT_FEE_TIER)), "gwei")  # gas defined by user
+        gas_limits = expected_buy_gas(token_address)  # gas of each transaction of the buy
 
         # fees calculation
         fees = calculate_total_fees(amount_to_swap, gas_price_gwei, gas_limits)
@@ -340,7 +393,8 @@ def process_token_address(message, wallet):
             f"🔹 Total Supply: {token_details.get('total_supply', 'N/A')} tokens\n"
             f"🔹 Price (USD): ${round(token_details.get('price_usd', 0), 4)}\n"
             f"💧 Liquidity: ${round(token_details.get('liquidity_usd', 0), 2):,}\n"
-            f"📊 MarketCap: `${round(token_details.get('market_cap', 0), 2):,}`\n\n",
+            f"📊 MarketCap: `${round(token_details.get('market_cap', 0), 2):,}`\n"
+            f"{format_buy_quote(quote_future, token_address, amount_to_swap, token_details.get('symbol', 'N/A'), message.chat.id)}\n",
             parse_mode="Markdown",
             reply_markup=buy_menu(wallet, {"ticker": {token_details.get('name', 'N/A')}, "contract": token_address})
         )
@@ -359,6 +413,10 @@ def buy_token(call):
     Handle buy token with a custom amount
     """
     _, eth_amount, wallet_address = call.data.split("_")
+    # acknowledge the button right away, the trade runs in the background
+    bot.answer_callback_query(call.id)
+    if not check_ready(call.message.chat.id):
+        return
     wallet = next((w for w in user_wallets.get(call.message.chat.id, []) if w["address"] == wallet_address), None)
 
     if not wallet:
@@ -371,16 +429,7 @@ def buy_token(call):
             bot.send_message(call.message.chat.id, "No token address found. Please start again.")
             return
 
-        tx_hash = swap_eth_to_token(wallet, token_address, Decimal(eth_amount))
-
-        bot.send_message(
-            call.message.chat.id,
-            f"Order completed! 🎉\nTransaction hash: `{tx_hash}`",
-            parse_mode="Markdown",
-            reply_markup=types.InlineKeyboardMarkup().add(
-                types.InlineKeyboardButton("⬅️ Main Menu", callback_data="main_menu")
-            )
-        )
+        start_trade(call.message.chat.id, "buy", wallet, token_address, Decimal(eth_amount), f"Buy {eth_amount} ETH of `{token_address}`")
     except Exception as e:
         bot.send_message(call.message.chat.id, f"Error during swap: {e}")
 
@@ -400,6 +449,8 @@ def custom_buy_handler(call):
 
 
 def process_custom_buy(message, wallet_address):
+    if not check_ready(message.chat.id):
+        return
     try:
         eth_amount = float(message.text.strip())
         if eth_amount <= 0:
@@ -428,16 +479,7 @@ def process_custom_buy(message, wallet_address):
             bot.send_message(message.chat.id, "No token address found. Please start again.")
             return
 
-        tx_hash = swap_eth_to_token(wallet, token_address, eth_amount)
-
-        bot.send_message(
-            message.chat.id,
-            f"Custom buy completed! 🎉\nTransaction hash: `{tx_hash}`",
-            parse_mode="Markdown",
-            reply_markup=types.InlineKeyboardMarkup().add(
-                types.InlineKeyboardButton("⬅️ Main Menu", callback_data="main_menu")
-            )
-        )
+        start_trade(message.chat.id, "buy", wallet, token_address, eth_amount, f"Custom buy {eth_amount} ETH of `{token_address}`")
     except ValueError as e:
         bot.send_message(message.chat.id, f"⚠️ Invalid input: {e}")
     except Exception as e:
@@ -1,9 +1,11 @@
 import requests
 from telebot import types
 from shared_data.shared_data import bot, user_wallets, user_gwei_preferences
-from actions.contracts import load_contract
-from actions.sell import execute_swap_to_eth
+from actions.contracts import load_erc20
 from actions.utils import calculate_total_fees
+from actions.fee_oracle import FEE_TIERS, DEFAULT_FEE_TIER
+from actions.quotes import get_slippage
+from handlers.trades import start_trade, check_ready
 
 
 def wallets_menu(wallets):
@@ -45,11 +47,11 @@ def sell_menu(wallet, token_info, position_info):
     markup.add(*buttons)
 
     # buttons for Gwei settings
-    current_gwei = user_gwei_preferences.get(wallet["chat_id"], 10)  # default value
-    gwei_presets = [1, 5, 10]
+    current_gwei = user_gwei_preferences.get(wallet["chat_id"], DEFAULT_FEE_TIER)  # default value
+    gwei_presets = list(FEE_TIERS)  # slow / normal / fast, priced by the fee oracle
     gwei_buttons = [
         types.InlineKeyboardButton(
-            f"{preset} Gwei {'🟢' if preset == current_gwei else ''}",
+            f"{preset.capitalize()} {'🟢' if preset == current_gwei else ''}",
             callback_data=f"preset_gwei_{preset}_{wallet['address']}"
         ) for preset in gwei_presets
     ]
@@ -57,6 +59,7 @@ def sell_menu(wallet, token_info, position_info):
         types.InlineKeyboardButton("⛽ Set Gas:", callback_data=f"custom_gwei_{wallet['address']}"),
         *gwei_buttons
     )
+    markup.add(types.InlineKeyboardButton(f"🎯 Slippage: {get_slippage(wallet['chat_id'])}%", callback_data=f"custom_slippage_{wallet['address']}"))
 
     markup.add(types.InlineKeyboardButton("⬅️ Back to Positions", callback_data="positions_menu"))
     return markup
@@ -150,6 +153,10 @@ def handle_sell(call):
     Manages the sale of a percentage or the initial amount.
     """
     _, percentage, wallet_address, token_address = call.data.split("_")
+    # acknowledge the button right away, the trade runs in the background
+    bot.answer_callback_query(call.id)
+    if not check_ready(call.message.chat.id):
+        return
 
     wallet = next((w for w in user_wallets.get(call.message.chat.id, []) if w["address"] == wallet_address), None)
     if not wallet:
@@ -157,7 +164,7 @@ def handle_sell(call):
         return
 
     # get contract and token balance
-    contract = load_contract(token_address)
+    contract = load_erc20(token_address)
     token_balance = contract.functions.balanceOf(wallet["address"]).call()
     if token_balance <= 0:
         bot.send_message(call.message.chat.id, "No tokens to sell.")
@@ -170,11 +177,7 @@ def handle_sell(call):
         sell_amount = (token_balance * int(percentage)) // 100
 
     try:
-        tx_hash = execute_swap_to_eth(wallet, token_address, sell_amount)
-        bot.send_message(
-            call.message.chat.id,
-            f"Sell completed! 🎉\nTransaction hash: `{tx_hash}`",
-            parse_mode="Markdown"
-        )
+        share = "the initial investment" if percentage == "initial" else f"{percentage}%"
+        start_trade(call.message.chat.id, "sell", wallet, token_address, sell_amount, f"Sell {share} of `{token_address}`")
     except Exception as e:
         bot.send_message(call.message.chat.id, f"Error during sell: {e}")
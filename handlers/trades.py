@@ -0,0 +1,72 @@
+from telebot import types
+from shared_data.shared_data import bot
+from shared_data.outbound import PRIORITY_HIGH
+from shared_data.startup import is_ready
+from actions.trades import submit_trade, recover_interrupted_trades
+
+STATE_ICONS = {"queued": "⏳", "running": "🔄", "done": "🎉", "failed": "⚠️", "interrupted": "⚠️"}
+STEP_ICONS = {"sent": "📤", "confirmed": "✅", "failed": "❌", "pending": "⏳"}
+
+
+def main_menu_button():
+    return types.InlineKeyboardMarkup().add(
+        types.InlineKeyboardButton("⬅️ Main Menu", callback_data="main_menu")
+    )
+
+
+def format_trade_status(job):
+    """
+    Status message of a trade job: its state and the transactions sent so far.
+    """
+    text = f"{STATE_ICONS.get(job['state'], '')} {job['title']}: {job['state']}\nJob `{job['id']}`\n"
+    for step in job["steps"]:
+        text += f"{STEP_ICONS.get(step['status'], '')} {step['label']} ({step['status']})\n"
+    if job["state"] == "done":
+        text += f"\nOrder completed! 🎉\nTransaction hash: `{job['tx_hash']}`"
+    elif job["error"]:
+        text += f"\nError during swap: {job['error']}"
+    return text
+
+
+def _edit_status(job):
+    bot.edit_message_text(
+        format_trade_status(job),
+        chat_id=job["chat_id"],
+        message_id=job["message_id"],
+        parse_mode="Markdown",
+        reply_markup=main_menu_button() if job["state"] in ("done", "failed") else None,
+        priority=PRIORITY_HIGH
+    )
+
+
+def check_ready(chat_id):
+    """
+    True if trades can be executed, otherwise tell the user the bot is still connecting to the chain.
+    """
+    if is_ready():
+        return True
+    bot.send_message(chat_id, "⏳ The bot is still starting, please try again in a few seconds.")
+    return False
+
+
+def start_trade(chat_id, kind, wallet, token_address, amount, title):
+    """
+    Send a status message and queue the trade, the message is then edited as the trade progresses.
+    Returns without waiting for the trade.
+    """
+    status_message = bot.send_message(chat_id, f"⏳ {title}: queued", parse_mode="Markdown", priority=PRIORITY_HIGH)
+    return submit_trade(
+        kind, wallet, token_address, amount,
+        on_update=_edit_status, chat_id=chat_id, title=title, message_id=status_message.message_id
+    )
+
+
+def report_interrupted_trades():
+    """
+    Tell users about the trades a restart interrupted, with what was mined of them.
+    """
+    for job in recover_interrupted_trades():
+        try:
+            bot.send_message(job["chat_id"], format_trade_status(job), parse_mode="Markdown", reply_markup=main_menu_button(), priority=PRIORITY_HIGH)
+        except Exception as e:
+            print(f"[ERROR] Failed to report interrupted trade {job['id']}: {e}")
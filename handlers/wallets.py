@@ -1,6 +1,6 @@
 from telebot import types
 from shared_data.shared_data import bot, user_wallets  
-from actions.wallets import create_wallet, check_balance
+from actions.wallets import create_wallet, check_balances
 
 
 # Wallets menu layout
@@ -29,12 +29,14 @@ def wallets_menu(wallets):
 @bot.callback_query_handler(func=lambda call: call.data == "wallets")
 def wallets_handler(call):
     # get users wallets
+    addresses = [wallet["address"] for wallet in user_wallets.get(call.message.chat.id, [])]
+    balances = check_balances(addresses)  # ETH balances, one batched request
     wallets = [
         {
-            "address": wallet["address"],
-            "balance": check_balance(wallet["address"], None)[0]  # ETH balance
+            "address": address,
+            "balance": balance
         }
-        for wallet in user_wallets.get(call.message.chat.id, [])
+        for address, balance in zip(addresses, balances)
     ]
     bot.edit_message_text(
         "Here are your wallets:",
@@ -1,5 +1,13 @@
-from shared_data.shared_data import bot  
+from shared_data.shared_data import bot, web3
+from shared_data.metrics import start_metrics_server
+from shared_data.startup import start_background_startup
+from shared_data.webhook import run_bot
+from shared_data.async_runtime import BOT_RUNTIME, run_bot_async
+from actions.blocks import start_block_poller
+from actions.fee_oracle import start_fee_oracle
 from handlers import wallets, positions, buy, sell  
+from handlers.trades import report_interrupted_trades
+from actions.trades import run_trades_on
 from telebot import types
 import sys
 import os
@@ -21,7 +29,19 @@ def setup_bot_commands(bot):
     ]
     bot.set_my_commands(commands)
 
-setup_bot_commands(bot)
+def start_chain_watchers():
+    """
+    Start the background block and fee samplers once the RPC is reachable.
+    """
+    start_block_poller()
+    start_fee_oracle()
+
+def on_rpc_ready():
+    """
+    Start the chain watchers and report the trades the last restart interrupted.
+    """
+    start_chain_watchers()
+    report_interrupted_trades()
 
 # main menu
 def main_menu():
@@ -55,4 +75,12 @@ def close_menu(call):
     bot.delete_message(call.message.chat.id, call.message.message_id)
 
 if __name__ == "__main__":
-    bot.polling()
+    start_metrics_server()
+    # RPC and Telegram commands are set up in the background, updates are received right away
+    start_background_startup(web3, lambda: setup_bot_commands(bot), on_ready=on_rpc_ready)
+    # webhook if WEBHOOK_URL is set, polling otherwise
+    if BOT_RUNTIME == "asyncio":
+        # trades wait for their receipts as coroutines instead of holding a thread each
+        run_bot_async(bot, on_loop=run_trades_on)
+    else:
+        run_bot(bot)
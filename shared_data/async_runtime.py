@@ -0,0 +1,85 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from telebot.async_telebot import AsyncTeleBot
+from shared_data.metrics import register_stats
+from shared_data.dispatcher import dispatch_update
+from shared_data.webhook import WEBHOOK_URL, run_bot
+
+BOT_RUNTIME = os.getenv("BOT_RUNTIME", "threads")  # "asyncio" to wait for trade receipts as coroutines and poll updates with AsyncTeleBot
+ASYNC_POLL_TIMEOUT = int(os.getenv("ASYNC_POLL_TIMEOUT", "30"))  # seconds a getUpdates long poll is held open
+ASYNC_STEP_THREADS = int(os.getenv("ASYNC_STEP_THREADS", "32"))  # threads running the blocking work between two awaits (RPC calls, signing)
+
+async_stats = {"polls": 0, "poll_errors": 0, "received": 0, "backpressure": 0}
+register_stats("asyncio_runtime", lambda: dict(async_stats, tasks=_task_count()))
+
+_loop = None
+
+
+def _task_count():
+    loop = _loop
+    if loop is None or not loop.is_running():
+        return 0
+    try:
+        return len(asyncio.all_tasks(loop))
+    except RuntimeError:
+        # the task set changed while it was read from another thread
+        return -1
+
+
+async def _dispatch(bot, update, received_at):
+    if dispatch_update(bot, update, received_at, block=False):
+        return
+    # the dispatcher is full: wait for room off the loop, polling resumes after
+    async_stats["backpressure"] += 1
+    await asyncio.to_thread(dispatch_update, bot, update, received_at)
+
+
+async def poll_updates(bot):
+    """
+    Long poll Telegram with AsyncTeleBot and hand each update to the handlers of `bot` on the chat dispatcher.
+    Runs forever.
+    """
+    async_bot = AsyncTeleBot(bot.token, validate_token=False)
+    offset = None
+    try:
+        while True:
+            try:
+                updates = await async_bot.get_updates(
+                    offset=offset, timeout=ASYNC_POLL_TIMEOUT, request_timeout=ASYNC_POLL_TIMEOUT + 10
+                )
+                async_stats["polls"] += 1
+            except Exception as e:
+                async_stats["poll_errors"] += 1
+                print(f"[ERROR] Failed to poll updates: {e}")
+                await asyncio.sleep(3)
+                continue
+            for update in updates:
+                offset = update.update_id + 1
+                async_stats["received"] += 1
+                await _dispatch(bot, update, time.time())
+    finally:
+        await async_bot.close_session()
+
+
+def run_bot_async(bot, on_loop=None):
+    """
+    asyncio runtime: `on_loop(loop)` is called with the event loop so it can run its own coroutines
+    on it (e.g. trades, see run_trades_on), then updates are polled on the loop.
+    Handlers and RPC calls stay synchronous, on the dispatcher and on the loop's executor.
+    With WEBHOOK_URL set, the webhook receives the updates and the loop runs on its own thread.
+    Blocks forever.
+    """
+    global _loop
+    _loop = asyncio.new_event_loop()
+    _loop.set_default_executor(ThreadPoolExecutor(max_workers=ASYNC_STEP_THREADS, thread_name_prefix="asyncio-steps"))
+    if on_loop:
+        on_loop(_loop)
+    print("[DEBUG] Running on the asyncio runtime")
+    if WEBHOOK_URL:
+        threading.Thread(target=_loop.run_forever, name="asyncio", daemon=True).start()
+        run_bot(bot)
+        return
+    _loop.run_until_complete(poll_updates(bot))
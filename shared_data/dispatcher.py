@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from collections import deque
+from telebot import TeleBot, types
+from shared_data.metrics import register_stats, observe_update
+from shared_data.startup import mark_updates_received
+
+DISPATCHER_WORKERS = int(os.getenv("DISPATCHER_WORKERS", "16"))  # handlers running at the same time, across all chats
+DISPATCHER_QUEUE_SIZE = int(os.getenv("DISPATCHER_QUEUE_SIZE", "1000"))  # tasks waiting or running before new ones are refused
+
+
+def chat_key(obj):
+    """
+    Chat an update, message or callback query belongs to, None if it has none.
+    """
+    if isinstance(obj, types.Update):
+        for name, value in vars(obj).items():
+            if name != "update_id" and value is not None:
+                return chat_key(value)
+        return None
+    if isinstance(obj, types.Message):
+        return obj.chat.id
+    if isinstance(obj, types.CallbackQuery):
+        return obj.message.chat.id if obj.message else obj.from_user.id
+    user = getattr(obj, "from_user", None)
+    return user.id if user else None
+
+
+class ChatDispatcher:
+    """
+    Runs tasks on a pool of threads, one at a time and in order for a same chat,
+    so a long handler (e.g. a swap waiting for receipts) only delays its own chat.
+    """
+
+    def __init__(self, workers=DISPATCHER_WORKERS, queue_size=DISPATCHER_QUEUE_SIZE, on_error=None):
+        self.workers = workers
+        self.on_error = on_error
+        self._chats = {}  # chat key -> deque of (task, args, kwargs, submitted at), while it has work
+        self._ready = deque()  # chat keys with work and no task running
+        self._cond = threading.Condition()
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._threads = []
+        self.stats = {"submitted": 0, "completed": 0, "errors": 0, "refused": 0, "busy_workers": 0, "queued": 0, "wait_seconds": 0.0}
+
+    def _start(self):
+        # under self._cond
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f"dispatcher-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def submit(self, key, task, *args, block=True, **kwargs):
+        """
+        Queue `task(*args, **kwargs)` behind the other tasks of chat `key` (None: no ordering).
+        When the queue is full, waits for room if `block`, returns False otherwise.
+        """
+        if not self._slots.acquire(blocking=block):
+            with self._cond:
+                self.stats["refused"] += 1
+            return False
+        if key is None:
+            key = object()
+        with self._cond:
+            self._start()
+            tasks = self._chats.get(key)
+            if tasks is None:
+                tasks = self._chats[key] = deque()
+                self._ready.append(key)
+                self._cond.notify()
+            tasks.append((task, args, kwargs, time.time()))
+            self.stats["submitted"] += 1
+            self.stats["queued"] += 1
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._ready:
+                    self._cond.wait()
+                key = self._ready.popleft()
+                task, args, kwargs, submitted_at = self._chats[key].popleft()
+                self.stats["queued"] -= 1
+                self.stats["busy_workers"] += 1
+                self.stats["wait_seconds"] += time.time() - submitted_at
+            error = False
+            try:
+                task(*args, **kwargs)
+            except Exception as e:
+                error = True
+                if not (self.on_error and self.on_error(e)):
+                    print(f"[ERROR] Handler {getattr(task, '__name__', task)} failed: {e}")
+            finally:
+                self._slots.release()
+                with self._cond:
+                    self.stats["busy_workers"] -= 1
+                    self.stats["completed"] += 1
+                    if error:
+                        self.stats["errors"] += 1
+                    if self._chats[key]:
+                        # next task of the same chat, after the other chats already waiting
+                        self._ready.append(key)
+                        self._cond.notify()
+                    else:
+                        del self._chats[key]
+
+    def metrics(self):
+        with self._cond:
+            depths = [len(tasks) for tasks in self._chats.values()]
+            return dict(
+                self.stats,
+                workers=self.workers,
+                chats=len(depths),
+                max_chat_depth=max(depths, default=0),
+            )
+
+
+dispatcher = ChatDispatcher()
+register_stats("dispatcher", dispatcher.metrics)
+
+
+def update_type(update):
+    """
+    Kind of a Telegram update (message, callback_query, ...), used as the metrics label.
+    """
+    for name, value in vars(update).items():
+        if name != "update_id" and value is not None:
+            return name
+    return "unknown"
+
+
+def handle_update(bot, update, received_at):
+    """
+    Run the handlers of an update on this thread and record its latency since `received_at`.
+    """
+    error = False
+    try:
+        # TeleBot's own processing, the bot's process_new_updates would dispatch the update again
+        TeleBot.process_new_updates(bot, [update])
+    except Exception as e:
+        error = True
+        print(f"[ERROR] Failed to handle update {update.update_id}: {e}")
+    finally:
+        observe_update(update_type(update), time.time() - received_at, error)
+
+
+def dispatch_update(bot, update, received_at, block=True):
+    """
+    Queue an update behind the other updates of its chat, however it was received (polling, webhook, asyncio).
+    Returns False if the dispatcher is full and `block` is not set.
+    """
+    if not dispatcher.submit(chat_key(update), handle_update, bot, update, received_at, block=block):
+        return False
+    mark_updates_received(1)
+    return True
@@ -0,0 +1,28 @@
+import threading
+
+# topic -> callbacks, called in the publishing thread
+_subscribers = {}
+_subscribers_lock = threading.Lock()
+
+
+def subscribe(topic, callback):
+    """
+    Call `callback(payload)` for every event published on `topic`.
+    Topics: "new_head" (header pushed by the websocket), "block" (each new block, from the websocket or polling),
+    "logs:<name>" (logs of a named websocket log subscription).
+    """
+    with _subscribers_lock:
+        _subscribers.setdefault(topic, []).append(callback)
+
+
+def publish(topic, payload):
+    """
+    Deliver an event to every subscriber of `topic`. A failing subscriber does not stop the others.
+    """
+    with _subscribers_lock:
+        callbacks = list(_subscribers.get(topic, []))
+    for callback in callbacks:
+        try:
+            callback(payload)
+        except Exception as e:
+            print(f"[ERROR] Event handler for {topic} failed: {e}")
@@ -0,0 +1,84 @@
+import os
+import threading
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# connection pool config, shared by the RPC provider, BaseScan and DexScreener
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))  # number of hosts kept in the pool
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))  # keep-alive connections per host
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))  # seconds
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))  # retries for idempotent requests (GET) only
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter with a default timeout that counts requests per host.
+    """
+
+    def __init__(self, timeout, **kwargs):
+        self.timeout = timeout
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+
+        host = urlparse(request.url).netloc
+        with self._stats_lock:
+            stats = self.stats.setdefault(host, {"requests": 0, "errors": 0, "in_flight": 0, "peak_in_flight": 0})
+            stats["requests"] += 1
+            stats["in_flight"] += 1
+            stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        try:
+            return super().send(request, **kwargs)
+        except Exception:
+            with self._stats_lock:
+                stats["errors"] += 1
+            raise
+        finally:
+            with self._stats_lock:
+                stats["in_flight"] -= 1
+
+
+def create_http_session():
+    adapter = PooledHTTPAdapter(
+        timeout=HTTP_TIMEOUT,
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=Retry(
+            total=HTTP_RETRIES,
+            backoff_factor=0.2,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+            raise_on_status=False,
+        ),
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session, adapter
+
+
+http_session, _adapter = create_http_session()
+
+
+def http_pool_stats():
+    """
+    Per-host pool utilization: requests, errors, in-flight requests, connections opened and idle.
+    A connection opened is a TCP (+TLS) handshake, so opened/requests close to 0 means keep-alive works.
+    """
+    with _adapter._stats_lock:
+        stats = {host: dict(host_stats) for host, host_stats in _adapter.stats.items()}
+    for pool_key in list(_adapter.poolmanager.pools.keys()):
+        pool = _adapter.poolmanager.pools.get(pool_key)
+        if pool is None:
+            continue
+        host = pool.host if pool.port in (None, 80, 443) else f"{pool.host}:{pool.port}"
+        host_stats = stats.setdefault(host, {"requests": 0, "errors": 0, "in_flight": 0, "peak_in_flight": 0})
+        host_stats["connections_opened"] = host_stats.get("connections_opened", 0) + pool.num_connections
+        host_stats["idle_connections"] = host_stats.get("idle_connections", 0) + sum(1 for conn in list(pool.pool.queue) if conn is not None)
+    return stats
@@ -0,0 +1,218 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from web3.middleware import Web3Middleware
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))  # 0 disables the endpoint
+METRICS_PREFIX = "virtuals_bot"
+
+# latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_rpc_metrics = {}
+_rpc_metrics_lock = threading.Lock()
+_update_metrics = {}
+_stats_sources = []
+_health_check = None
+
+
+def _observe(histograms, key, latency, error):
+    with _rpc_metrics_lock:
+        metrics = histograms.get(key)
+        if metrics is None:
+            metrics = {"count": 0, "errors": 0, "sum": 0.0, "buckets": [0] * len(LATENCY_BUCKETS)}
+            histograms[key] = metrics
+        metrics["count"] += 1
+        metrics["sum"] += latency
+        if error:
+            metrics["errors"] += 1
+        for idx, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                metrics["buckets"][idx] += 1
+                break
+
+
+def observe_rpc_call(method, latency, error=False):
+    """
+    Record one JSON-RPC call in the per-method counters and latency histogram.
+    """
+    _observe(_rpc_metrics, method, latency, error)
+
+
+def observe_update(update_type, latency, error=False):
+    """
+    Record one handled Telegram update, `latency` being the time from its reception to the end of its handlers.
+    """
+    _observe(_update_metrics, update_type, latency, error)
+
+
+def _is_error(response):
+    return isinstance(response, dict) and "error" in response
+
+
+class RPCMetricsMiddleware(Web3Middleware):
+    """
+    Records count, errors and latency of every RPC call made through the web3 instance.
+    Calls in a batch are each recorded with the latency of the whole batch.
+    """
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            started_at = time.time()
+            try:
+                response = make_request(method, params)
+            except Exception:
+                observe_rpc_call(method, time.time() - started_at, error=True)
+                raise
+            observe_rpc_call(method, time.time() - started_at, error=_is_error(response))
+            return response
+
+        return middleware
+
+    def wrap_make_batch_request(self, make_batch_request):
+        def middleware(requests_info):
+            started_at = time.time()
+            try:
+                responses = make_batch_request(requests_info)
+            except Exception:
+                latency = time.time() - started_at
+                for method, _ in requests_info:
+                    observe_rpc_call(method, latency, error=True)
+                raise
+            latency = time.time() - started_at
+            if not isinstance(responses, list):
+                # the whole batch was rejected
+                responses = [responses] * len(requests_info)
+            for (method, _), response in zip(requests_info, responses):
+                observe_rpc_call(method, latency, error=_is_error(response))
+            return responses
+
+        return middleware
+
+
+def register_stats(name, get_stats, label=None):
+    """
+    Expose a stats dict on the metrics endpoint as `<prefix>_<name>_<key>` gauges.
+    With `label`, get_stats returns {label value: {key: number}} instead.
+    """
+    _stats_sources.append((name, get_stats, label))
+
+
+def register_health_check(get_health):
+    """
+    Serve `get_health()` on /health, with status 200 if its "ready" key is set and 503 otherwise.
+    """
+    global _health_check
+    _health_check = get_health
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def _render_stats(lines):
+    for name, get_stats, label in list(_stats_sources):
+        try:
+            stats = get_stats()
+        except Exception as e:
+            print(f"[ERROR] Failed to collect {name} metrics: {e}")
+            continue
+        rows = stats.items() if label else [(None, stats)]
+        for label_value, values in rows:
+            labels = {label: label_value} if label else {}
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    lines.append(f"{METRICS_PREFIX}_{name}_{key}{_format_labels(labels)} {value}")
+
+
+def _render_histograms(lines, label, histograms, total, errors, duration):
+    """
+    Counters and latency histogram of `histograms`, each metric given as (name, help).
+    """
+    for (name, description), key in ((total, "count"), (errors, "errors")):
+        lines += [
+            f"# HELP {METRICS_PREFIX}_{name} {description}",
+            f"# TYPE {METRICS_PREFIX}_{name} counter",
+        ]
+        for value, metrics in sorted(histograms.items()):
+            lines.append(f'{METRICS_PREFIX}_{name}{{{label}="{value}"}} {metrics[key]}')
+
+    name, description = duration
+    lines += [
+        f"# HELP {METRICS_PREFIX}_{name} {description}",
+        f"# TYPE {METRICS_PREFIX}_{name} histogram",
+    ]
+    for value, metrics in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, metrics["buckets"]):
+            cumulative += count
+            lines.append(f'{METRICS_PREFIX}_{name}_bucket{{{label}="{value}",le="{bound}"}} {cumulative}')
+        lines.append(f'{METRICS_PREFIX}_{name}_bucket{{{label}="{value}",le="+Inf"}} {metrics["count"]}')
+        lines.append(f'{METRICS_PREFIX}_{name}_sum{{{label}="{value}"}} {metrics["sum"]}')
+        lines.append(f'{METRICS_PREFIX}_{name}_count{{{label}="{value}"}} {metrics["count"]}')
+
+
+def render_metrics():
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    with _rpc_metrics_lock:
+        rpc_metrics = {method: dict(metrics, buckets=list(metrics["buckets"])) for method, metrics in _rpc_metrics.items()}
+        update_metrics = {kind: dict(metrics, buckets=list(metrics["buckets"])) for kind, metrics in _update_metrics.items()}
+
+    lines = []
+    _render_histograms(
+        lines, "method", rpc_metrics,
+        ("rpc_requests_total", "JSON-RPC calls by method."),
+        ("rpc_errors_total", "JSON-RPC calls that failed or returned an error, by method."),
+        ("rpc_request_duration_seconds", "JSON-RPC call latency by method."),
+    )
+    _render_histograms(
+        lines, "type", update_metrics,
+        ("updates_total", "Telegram updates handled, by type."),
+        ("update_errors_total", "Telegram updates whose handlers raised, by type."),
+        ("update_duration_seconds", "Time from receiving a Telegram update to the end of its handlers, by type."),
+    )
+    _render_stats(lines)
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send(200, "text/plain; version=0.0.4", render_metrics().encode())
+        elif self.path == "/health" and _health_check:
+            health = _health_check()
+            self._send(200 if health.get("ready") else 503, "application/json", json.dumps(health).encode())
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """
+    Serve /metrics (and /health if a health check is registered) in the background. Does nothing if port is 0.
+    """
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"[DEBUG] Metrics available on http://{host}:{port}/metrics")
+    return server
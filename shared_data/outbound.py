@@ -0,0 +1,214 @@
+import bisect
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from telebot.apihelper import ApiTelegramException
+from shared_data.metrics import register_stats
+
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))  # messages per second across all chats
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))  # messages per second to a same chat
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))  # messages a chat can receive at once before being throttled
+TELEGRAM_SENDERS = int(os.getenv("TELEGRAM_SENDERS", "8"))  # API calls in flight at the same time
+TELEGRAM_QUEUE_SIZE = int(os.getenv("TELEGRAM_QUEUE_SIZE", "1000"))  # pending calls before low priority edits are dropped
+
+# lower is sent first
+PRIORITY_HIGH = 0  # trade progress and confirmations
+PRIORITY_NORMAL = 1  # new messages
+PRIORITY_LOW = 2  # menu redraws
+
+
+class _Bucket:
+    """
+    Token bucket of `rate` tokens per second, holding at most `burst`.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.time()
+
+    def delay(self, now):
+        """
+        Seconds until a token is available.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class OutboundScheduler:
+    """
+    Sends Telegram API calls within the global and per chat rate limits, highest priority first.
+    A chat has at most one call in flight, so its messages arrive in order. An edit of a message that
+    is still waiting replaces it, only the latest state is sent.
+    """
+
+    def __init__(self, global_rate=TELEGRAM_GLOBAL_RATE, chat_rate=TELEGRAM_CHAT_RATE, chat_burst=TELEGRAM_CHAT_BURST,
+                 senders=TELEGRAM_SENDERS, queue_size=TELEGRAM_QUEUE_SIZE):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.queue_size = queue_size
+        self._global = _Bucket(global_rate, global_rate)
+        self._chats = {}  # chat id -> _Bucket
+        self._paused_until = {}  # chat id -> time, after a 429
+        self._busy_chats = set()
+        self._pending = []  # requests, sorted by (priority, seq)
+        self._edits = {}  # (chat id, message id, method) -> pending request
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._senders = ThreadPoolExecutor(max_workers=senders, thread_name_prefix="telegram")
+        self._thread = None
+        self.stats = {"sent": 0, "errors": 0, "coalesced": 0, "dropped": 0, "throttled": 0, "wait_seconds": 0.0}
+
+    def _start(self):
+        # under self._cond
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._schedule, name="telegram-scheduler", daemon=True)
+            self._thread.start()
+
+    @staticmethod
+    def _sort_key(request):
+        return request["priority"], request["seq"]
+
+    def submit(self, chat_id, call, priority=PRIORITY_NORMAL, edit_key=None):
+        """
+        Queue `call()` (a Telegram API call to `chat_id`) and return a Future of its result.
+        With `edit_key`, a call still waiting with the same key is replaced by this one and shares its Future.
+        """
+        with self._cond:
+            self._start()
+            request = self._edits.get(edit_key) if edit_key is not None else None
+            if request is not None:
+                # only the latest state of the message is sent, at the highest priority asked
+                self.stats["coalesced"] += 1
+                request["call"] = call
+                if priority < request["priority"]:
+                    self._pending.remove(request)
+                    request["priority"] = priority
+                    bisect.insort(self._pending, request, key=self._sort_key)
+                return request["future"]
+
+            if len(self._pending) >= self.queue_size:
+                self._drop_lowest_edit()
+            request = {
+                "chat_id": chat_id,
+                "call": call,
+                "priority": priority,
+                "seq": next(self._seq),
+                "edit_key": edit_key,
+                "future": Future(),
+                "queued_at": time.time(),
+            }
+            bisect.insort(self._pending, request, key=self._sort_key)
+            if edit_key is not None:
+                self._edits[edit_key] = request
+            self._cond.notify()
+            return request["future"]
+
+    def _drop_lowest_edit(self):
+        # under self._cond, new messages are never dropped
+        for request in reversed(self._pending):
+            if request["edit_key"] is not None:
+                self._pending.remove(request)
+                del self._edits[request["edit_key"]]
+                request["future"].set_result(None)
+                self.stats["dropped"] += 1
+                return
+
+    def _next_request(self, now):
+        """
+        First pending request allowed to be sent now, and otherwise the delay before one may be.
+        """
+        global_delay = self._global.delay(now)
+        if global_delay > 0:
+            return None, global_delay
+        wait = None
+        for request in self._pending:
+            chat_id = request["chat_id"]
+            if chat_id in self._busy_chats:
+                continue
+            bucket = self._chats.get(chat_id)
+            if bucket is None:
+                bucket = self._chats[chat_id] = _Bucket(self.chat_rate, self.chat_burst)
+            delay = max(bucket.delay(now), self._paused_until.get(chat_id, 0) - now)
+            if delay <= 0:
+                return request, 0
+            wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    def _schedule(self):
+        while True:
+            with self._cond:
+                request, wait = self._next_request(time.time())
+                if request is None:
+                    self._cond.wait(timeout=wait)
+                    continue
+                self._pending.remove(request)
+                if request["edit_key"] is not None:
+                    del self._edits[request["edit_key"]]
+                self._global.take()
+                self._chats[request["chat_id"]].take()
+                self._busy_chats.add(request["chat_id"])
+                self.stats["wait_seconds"] += time.time() - request["queued_at"]
+            self._senders.submit(self._send, request)
+
+    def _send(self, request):
+        try:
+            result = request["call"]()
+        except ApiTelegramException as e:
+            if e.error_code == 429:
+                retry_after = (e.result_json or {}).get("parameters", {}).get("retry_after", 1)
+                print(f"[DEBUG] Telegram rate limit hit for chat {request['chat_id']}, retrying in {retry_after}s")
+                with self._cond:
+                    self.stats["throttled"] += 1
+                    self._paused_until[request["chat_id"]] = time.time() + retry_after
+                    self._busy_chats.discard(request["chat_id"])
+                    # sent again first, unless a newer edit of the same message was queued meanwhile
+                    if request["edit_key"] is None or request["edit_key"] not in self._edits:
+                        bisect.insort(self._pending, request, key=self._sort_key)
+                        if request["edit_key"] is not None:
+                            self._edits[request["edit_key"]] = request
+                    else:
+                        request["future"].set_result(None)
+                    self._cond.notify()
+                return
+            self._finish(request, error=e)
+        except Exception as e:
+            self._finish(request, error=e)
+        else:
+            self._finish(request, result=result)
+
+    def _finish(self, request, result=None, error=None):
+        with self._cond:
+            self._busy_chats.discard(request["chat_id"])
+            if error is not None:
+                self.stats["errors"] += 1
+            else:
+                self.stats["sent"] += 1
+            self._cond.notify()
+        if error is not None:
+            if request["edit_key"] is not None:
+                # nobody waits for edits
+                print(f"[ERROR] Failed to edit message {request['edit_key'][1]} in chat {request['chat_id']}: {error}")
+            request["future"].set_exception(error)
+        else:
+            request["future"].set_result(result)
+
+    def metrics(self):
+        with self._cond:
+            return dict(
+                self.stats,
+                pending=len(self._pending),
+                pending_edits=len(self._edits),
+                busy_chats=len(self._busy_chats),
+            )
+
+
+outbound = OutboundScheduler()
+register_stats("telegram_outbound", outbound.metrics)
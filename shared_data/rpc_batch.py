@@ -0,0 +1,37 @@
+import os
+from shared_data.shared_data import web3
+
+# max number of calls per JSON-RPC batch array (Alchemy accepts up to 1000, smaller batches fail faster)
+RPC_MAX_BATCH_SIZE = int(os.getenv("RPC_MAX_BATCH_SIZE", "50"))
+
+
+def batch_request(calls):
+    """
+    Send a list of (method, params) calls as JSON-RPC batch arrays of at most RPC_MAX_BATCH_SIZE calls.
+    Returns the raw result of each call in order, None for calls that returned an error.
+    """
+    results = []
+    for start in range(0, len(calls), RPC_MAX_BATCH_SIZE):
+        chunk = calls[start:start + RPC_MAX_BATCH_SIZE]
+        # through the middleware, so batched calls show up in the RPC metrics
+        responses = web3.provider.batch_request_func(web3, web3.middleware_onion)(chunk)
+        if not isinstance(responses, list):
+            # the whole batch was rejected
+            raise Exception(f"Batch request failed: {responses.get('error')}")
+
+        for (method, params), response in zip(chunk, responses):
+            if "error" in response:
+                print(f"[ERROR] Batch call {method} {params} failed: {response['error']}")
+                results.append(None)
+            else:
+                results.append(response.get("result"))
+    return results
+
+
+def get_balances(addresses, block_identifier="latest"):
+    """
+    Get the ETH balance (in wei) of every address with batched eth_getBalance calls.
+    Returns None for addresses whose balance could not be read.
+    """
+    results = batch_request([("eth_getBalance", [address, block_identifier]) for address in addresses])
+    return [int(result, 16) if result is not None else None for result in results]
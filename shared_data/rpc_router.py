@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+from web3 import HTTPProvider
+from web3.providers.base import JSONBaseProvider
+
+RPC_ROUTER_WINDOW = int(os.getenv("RPC_ROUTER_WINDOW", "100"))  # calls kept per endpoint for latency/error stats
+RPC_ROUTER_MAX_FAILURES = int(os.getenv("RPC_ROUTER_MAX_FAILURES", "3"))  # consecutive failures before an endpoint is benched
+RPC_ROUTER_COOLDOWN = float(os.getenv("RPC_ROUTER_COOLDOWN", "30"))  # seconds an endpoint stays benched
+RPC_ROUTER_ERROR_STEP = float(os.getenv("RPC_ROUTER_ERROR_STEP", "0.05"))  # error rates closer than this rank on latency alone
+
+# calls that submit transactions, only sent to the transaction endpoints
+WRITE_METHODS = {"eth_sendRawTransaction", "eth_sendTransaction"}
+
+# JSON-RPC error codes meaning "this endpoint is overloaded", not "your call is wrong"
+_RATE_LIMIT_CODES = {429, -32005, -32029}
+
+
+def _percentile(values, percentile):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
+
+class RPCEndpoint:
+    """
+    One upstream RPC endpoint and its rolling latency/error stats.
+    """
+
+    def __init__(self, uri, session=None, request_kwargs=None):
+        self.uri = uri
+        self.name = urlparse(uri).netloc or uri  # host only for logs, the path usually holds an API key
+        self.label = self.name  # unique per router, set by it
+        # failover is handled by the router, so the provider must not retry on its own
+        self.provider = HTTPProvider(uri, session=session, request_kwargs=request_kwargs, exception_retry_configuration=None)
+        self.latencies = deque(maxlen=RPC_ROUTER_WINDOW)
+        self.results = deque(maxlen=RPC_ROUTER_WINDOW)  # True for success, False for failure
+        self.consecutive_failures = 0
+        self.benched_until = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency, success):
+        with self.lock:
+            self.results.append(success)
+            if success:
+                self.latencies.append(latency)
+                self.consecutive_failures = 0
+            else:
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= RPC_ROUTER_MAX_FAILURES:
+                    self.benched_until = time.time() + RPC_ROUTER_COOLDOWN
+                    print(f"[ERROR] RPC endpoint {self.name} benched for {RPC_ROUTER_COOLDOWN}s")
+
+    def is_healthy(self):
+        return time.time() >= self.benched_until
+
+    def stats(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            results = list(self.results)
+        return {
+            "healthy": self.is_healthy(),
+            "calls": len(results),
+            "error_rate": results.count(False) / len(results) if results else 0.0,
+            "p50": _percentile(latencies, 0.5),
+            "p99": _percentile(latencies, 0.99),
+        }
+
+
+def _is_rate_limited(response):
+    error = response.get("error") if isinstance(response, dict) else None
+    if not error:
+        return False
+    return error.get("code") in _RATE_LIMIT_CODES or "rate limit" in str(error.get("message", "")).lower()
+
+
+class RPCRouterProvider(JSONBaseProvider):
+    """
+    web3 provider spreading calls over several HTTP endpoints.
+    Reads go to the fastest healthy endpoint (rolling p50), transactions only to the transaction endpoints,
+    and a failing or rate-limited endpoint is skipped for the next one.
+    """
+
+    def __init__(self, endpoint_uris, tx_endpoint_uris=None, session=None, request_kwargs=None):
+        super().__init__()
+        if not endpoint_uris:
+            raise ValueError("RPCRouterProvider needs at least one endpoint.")
+        self.endpoints = [RPCEndpoint(uri, session, request_kwargs) for uri in endpoint_uris]
+        tx_endpoint_uris = tx_endpoint_uris or endpoint_uris[:1]
+        by_uri = {endpoint.uri: endpoint for endpoint in self.endpoints}
+        self.tx_endpoints = [by_uri.get(uri) or RPCEndpoint(uri, session, request_kwargs) for uri in tx_endpoint_uris]
+        # endpoints of a same provider often only differ by their API key, which must not be published
+        for index, endpoint in enumerate(self._all_endpoints()):
+            endpoint.label = f"{endpoint.name}#{index}"
+
+    def __str__(self):
+        return f"RPC router ({len(self.endpoints)} endpoints)"
+
+    def _all_endpoints(self):
+        return list({endpoint.uri: endpoint for endpoint in self.endpoints + self.tx_endpoints}.values())
+
+    def _ranked(self, endpoints):
+        """
+        Healthy endpoints first, then the ones failing the least, fastest first.
+        Endpoints without calls yet are tried before measured ones.
+        """
+        def sort_key(endpoint):
+            stats = endpoint.stats()
+            if not stats["calls"]:
+                return (not endpoint.is_healthy(), -1, 0)
+            error_level = round(stats["error_rate"] / RPC_ROUTER_ERROR_STEP) if RPC_ROUTER_ERROR_STEP > 0 else stats["error_rate"]
+            p50 = stats["p50"] if stats["p50"] is not None else float("inf")
+            return (not endpoint.is_healthy(), error_level, p50)
+        return sorted(endpoints, key=sort_key)
+
+    def _route(self, endpoints, send):
+        last_error = None
+        for endpoint in self._ranked(endpoints):
+            started_at = time.time()
+            try:
+                response = send(endpoint.provider)
+            except Exception as e:
+                endpoint.record(time.time() - started_at, False)
+                print(f"[ERROR] RPC endpoint {endpoint.name} failed: {e}")
+                last_error = e
+                continue
+            if _is_rate_limited(response):
+                endpoint.record(time.time() - started_at, False)
+                last_error = Exception(f"RPC endpoint {endpoint.name} rate limited: {response['error']}")
+                continue
+            endpoint.record(time.time() - started_at, True)
+            return response
+        raise last_error
+
+    def make_request(self, method, params):
+        endpoints = self.tx_endpoints if method in WRITE_METHODS else self.endpoints
+        return self._route(endpoints, lambda provider: provider.make_request(method, params))
+
+    def make_batch_request(self, requests):
+        if any(method in WRITE_METHODS for method, _ in requests):
+            endpoints = self.tx_endpoints
+        else:
+            endpoints = self.endpoints
+        return self._route(endpoints, lambda provider: provider.make_batch_request(requests))
+
+    def is_connected(self, show_traceback=False):
+        return any(endpoint.provider.is_connected(show_traceback) for endpoint in self.endpoints)
+
+    def endpoint_stats(self):
+        """
+        Rolling stats per endpoint: health, calls, error rate, p50 and p99 latency (seconds).
+        Keyed by host and position ("host#0"), the URL itself may hold an API key.
+        """
+        return {endpoint.label: endpoint.stats() for endpoint in self._all_endpoints()}
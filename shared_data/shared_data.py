@@ -1,25 +1,126 @@
 from web3 import Web3
+from web3.middleware import Web3Middleware
+from functools import partial
 from telebot import TeleBot
 from dotenv import load_dotenv
 import os
+import time
 
 # load dotenv 
 load_dotenv()
 
+from shared_data.http_session import http_session, http_pool_stats, HTTP_TIMEOUT
+from shared_data.rpc_router import RPCRouterProvider
+from shared_data.ws_transport import WebSocketTransport
+from shared_data.metrics import RPCMetricsMiddleware, register_stats
+from shared_data.dispatcher import dispatcher, dispatch_update
+from shared_data.outbound import outbound, PRIORITY_NORMAL, PRIORITY_LOW
+
 # alchemy config
 ALCHEMY_URL = os.getenv("ALCHEMY_URL")
-web3 = Web3(Web3.HTTPProvider(ALCHEMY_URL))
+# optional fallback RPC endpoints (comma separated), and the endpoints allowed to submit transactions
+RPC_URLS = [url.strip() for url in os.getenv("RPC_URLS", "").split(",") if url.strip()]
+RPC_TX_URLS = [url.strip() for url in os.getenv("RPC_TX_URLS", "").split(",") if url.strip()]
+# optional websocket endpoint (wss://...), pushes new blocks instead of polling for them
+ALCHEMY_WS_URL = os.getenv("ALCHEMY_WS_URL")
+
+if RPC_URLS:
+    web3 = Web3(RPCRouterProvider(
+        [ALCHEMY_URL] + RPC_URLS,
+        tx_endpoint_uris=RPC_TX_URLS or [ALCHEMY_URL],
+        session=http_session,
+        request_kwargs={"timeout": HTTP_TIMEOUT},
+    ))
+    register_stats("rpc_endpoint", web3.provider.endpoint_stats, label="endpoint")
+else:
+    web3 = Web3(Web3.HTTPProvider(ALCHEMY_URL, session=http_session, request_kwargs={"timeout": HTTP_TIMEOUT}))
+
+# per-method RPC call count, errors and latency
+web3.middleware_onion.add(RPCMetricsMiddleware, "rpc_metrics")
+register_stats("http_pool", http_pool_stats, label="host")
+
+ws_transport = WebSocketTransport(ALCHEMY_WS_URL) if ALCHEMY_WS_URL else None
+if ws_transport:
+    register_stats("ws", lambda: ws_transport.stats)
+
+_chain_id_response = None
+
+
+class ChainIdCacheMiddleware(Web3Middleware):
+    """
+    Answers eth_chainId from memory after the first successful call: web3 asks for it
+    to validate every eth_call and gas estimate, and to fill the transactions it builds.
+    """
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            global _chain_id_response
+            if method != "eth_chainId":
+                return make_request(method, params)
+            if _chain_id_response is None:
+                response = make_request(method, params)
+                if "result" not in response:
+                    return response
+                _chain_id_response = response
+            return dict(_chain_id_response)
+
+        return middleware
+
+
+web3.middleware_onion.add(ChainIdCacheMiddleware, "chain_id_cache")
+
+
+def get_chain_id():
+    """
+    Chain id of the RPC, only asked to the node once.
+    """
+    return web3.eth.chain_id
+
+
+class TradingBot(TeleBot):
+    """
+    TeleBot that runs each polled update on the chat dispatcher (in order per chat, in parallel across chats)
+    like the webhook does, and sends messages and edits through the outbound rate limiter.
+    Messages wait for their turn and return the sent message, edits return right away.
+    """
+
+    def send_message(self, chat_id, text, *args, priority=PRIORITY_NORMAL, **kwargs):
+        return outbound.submit(chat_id, partial(super().send_message, chat_id, text, *args, **kwargs), priority).result()
+
+    def edit_message_text(self, text, chat_id=None, message_id=None, *args, priority=PRIORITY_LOW, **kwargs):
+        call = partial(super().edit_message_text, text, chat_id, message_id, *args, **kwargs)
+        outbound.submit(chat_id, call, priority, edit_key=(chat_id, message_id, "text"))
+
+    def edit_message_reply_markup(self, chat_id=None, message_id=None, *args, priority=PRIORITY_LOW, **kwargs):
+        call = partial(super().edit_message_reply_markup, chat_id, message_id, *args, **kwargs)
+        outbound.submit(chat_id, call, priority, edit_key=(chat_id, message_id, "markup"))
+
+    def process_new_updates(self, updates):
+        received_at = time.time()
+        for update in updates:
+            # TeleBot moves the polling offset while processing, the handlers now run later
+            self.last_update_id = max(self.last_update_id, update.update_id)
+            dispatch_update(self, update, received_at)
+
 
 # init telegram bot
 BOT_TOKEN = os.getenv("BOT_TOKEN")
-bot = TeleBot(BOT_TOKEN)
+# whole updates are dispatched, their handlers then run inline so their latency is measured
+bot = TradingBot(BOT_TOKEN, threaded=False)
+dispatcher.on_error = bot._handle_exception
 
 fee_recipient = ""
 virtual_token_address = "0x0b3e328455c4059EEb9e3f84b5543F74E24e7E1b"
 weth_address = "0x4200000000000000000000000000000000000006"
 
+# trade routing: "single" sends the whole path as one router call, "hops" sends one swap per hop
+TRADE_ROUTE_MODE = os.getenv("TRADE_ROUTE_MODE", "single")
+# broadcast independent transactions of a trade back-to-back instead of waiting for each receipt
+PIPELINE_TRANSACTIONS = os.getenv("PIPELINE_TRANSACTIONS", "true").lower() == "true"
+
 
 # store user data (temporary, a DB is better. If process is stopped, all data is lost)
 user_wallets = {}
 user_positions = {}  
 user_gwei_preferences = {}  
+user_slippage_preferences = {}  # chat id -> slippage tolerance in percent
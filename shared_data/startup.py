@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from shared_data.metrics import register_stats, register_health_check
+
+# max seconds between two startup attempts (the delay doubles from 1s up to this)
+STARTUP_RETRY_MAX_DELAY = float(os.getenv("STARTUP_RETRY_MAX_DELAY", "30"))
+
+_started_at = time.time()
+_health_lock = threading.Lock()
+
+# seconds are measured from process start, None until it happened
+health = {
+    "ready": False,
+    "rpc_connected": False,
+    "commands_set": False,
+    "startup_attempts": 0,
+    "time_to_ready": None,
+    "time_to_first_update": None,
+    "updates": 0,
+}
+register_stats("health", lambda: health)
+register_health_check(lambda: dict(health))
+
+
+def is_ready():
+    """
+    True once the RPC is reachable, trades can be executed.
+    """
+    return health["ready"]
+
+
+def mark_updates_received(count):
+    """
+    Count Telegram updates, the first one gives the time to first update.
+    """
+    with _health_lock:
+        if health["time_to_first_update"] is None:
+            health["time_to_first_update"] = time.time() - _started_at
+            print(f"[DEBUG] First update received {health['time_to_first_update']:.2f}s after start")
+        health["updates"] += count
+
+
+def retry_in_background(name, attempt, on_success=None):
+    """
+    Run `attempt` in a daemon thread until it returns True, with exponential backoff.
+    Exceptions count as a failed attempt.
+    """
+    def run():
+        delay = 1
+        while True:
+            with _health_lock:
+                health["startup_attempts"] += 1
+            try:
+                if attempt():
+                    break
+                print(f"[ERROR] Startup step {name} failed, retrying in {delay}s")
+            except Exception as e:
+                print(f"[ERROR] Startup step {name} failed: {e}, retrying in {delay}s")
+            time.sleep(delay)
+            delay = min(delay * 2, STARTUP_RETRY_MAX_DELAY)
+        if on_success:
+            on_success()
+
+    thread = threading.Thread(target=run, name=f"startup-{name}", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_background_startup(web3, setup_commands, on_ready=None):
+    """
+    Connect to the RPC and register the bot commands in the background, so polling starts right away.
+    `on_ready` runs once the RPC is reachable.
+    """
+    def rpc_connected():
+        with _health_lock:
+            health["rpc_connected"] = True
+            health["ready"] = True
+            health["time_to_ready"] = time.time() - _started_at
+        print(f"[DEBUG] Connected to RPC {health['time_to_ready']:.2f}s after start")
+        if on_ready:
+            on_ready()
+
+    def commands_set():
+        health["commands_set"] = True
+
+    def set_commands():
+        setup_commands()
+        return True
+
+    retry_in_background("rpc", web3.is_connected, rpc_connected)
+    retry_in_background("commands", set_commands, commands_set)
@@ -0,0 +1,101 @@
+import hmac
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telebot import types
+from shared_data.metrics import register_stats
+from shared_data.dispatcher import dispatch_update
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # public https URL Telegram posts to, empty to poll instead
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")  # the local server sits behind a TLS reverse proxy
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # sent back by Telegram in X-Telegram-Bot-Api-Secret-Token, required with WEBHOOK_URL
+
+webhook_stats = {"received": 0, "rejected": 0, "invalid": 0, "queue_full": 0}
+_stats_lock = threading.Lock()
+register_stats("webhook", lambda: webhook_stats)
+
+
+def _count(key, value=1):
+    with _stats_lock:
+        webhook_stats[key] += value
+
+
+def _make_handler(bot, path, secret):
+    class _WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received_at = time.time()
+            if self.path != path:
+                self._reply(404)
+                return
+            token = self.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if not hmac.compare_digest(token.encode(), secret.encode()):
+                _count("rejected")
+                self._reply(403)
+                return
+            try:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                update = types.Update.de_json(json.loads(body))
+            except Exception as e:
+                _count("invalid")
+                print(f"[ERROR] Invalid webhook update: {e}")
+                self._reply(400)
+                return
+            if not dispatch_update(bot, update, received_at, block=False):
+                # Telegram retries the update later
+                _count("queue_full")
+                self._reply(503)
+                return
+            _count("received")
+            self._reply(200)
+
+        def _reply(self, status):
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return _WebhookHandler
+
+
+def start_webhook_server(bot, host=WEBHOOK_HOST, port=WEBHOOK_PORT, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+    """
+    Receive updates on http://host:port/path and run their handlers on the chat dispatcher.
+    Returns the HTTP server, its serve_forever() must be called by the caller.
+    """
+    # without the secret token anyone knowing the URL could send updates, trade buttons included
+    if not secret:
+        raise Exception("WEBHOOK_SECRET must be set to receive updates through a webhook.")
+    server = ThreadingHTTPServer((host, port), _make_handler(bot, path, secret))
+    print(f"[DEBUG] Webhook listening on http://{host}:{port}{path}")
+    return server
+
+
+def run_bot(bot):
+    """
+    Receive updates through the webhook if WEBHOOK_URL is set, by polling otherwise or if the webhook cannot be set
+    (e.g. WEBHOOK_SECRET is missing).
+    Blocks forever.
+    """
+    if WEBHOOK_URL:
+        server = None
+        try:
+            server = start_webhook_server(bot, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET)
+            bot.set_webhook(url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET)
+        except Exception as e:
+            print(f"[ERROR] Failed to start the webhook, falling back to polling: {e}")
+            if server is not None:
+                server.server_close()
+        else:
+            server.serve_forever()
+            return
+        try:
+            bot.remove_webhook()
+        except Exception as e:
+            print(f"[ERROR] Failed to remove the webhook: {e}")
+    bot.polling()
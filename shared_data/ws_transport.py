@@ -0,0 +1,125 @@
+import itertools
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+from websockets.sync.client import connect
+from shared_data.events import publish
+
+WS_RECONNECT_MAX_DELAY = float(os.getenv("WS_RECONNECT_MAX_DELAY", "30"))  # max seconds between two reconnects
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "20"))  # keepalive, a dead connection is detected within 2 pings
+
+_HEADER_INT_FIELDS = ("number", "timestamp", "baseFeePerGas", "gasLimit", "gasUsed")
+
+
+def _format_header(raw_header):
+    header = dict(raw_header)
+    for field in _HEADER_INT_FIELDS:
+        if isinstance(header.get(field), str):
+            header[field] = int(header[field], 16)
+    return header
+
+
+class WebSocketTransport:
+    """
+    Persistent WebSocket connection subscribed to newHeads and to named log filters.
+    Reconnects with backoff and resubscribes everything; events are published on the event bus:
+    "new_head" with the block header, "logs:<name>" with each log.
+    """
+
+    def __init__(self, uri):
+        self.uri = uri
+        self.name = urlparse(uri).netloc or uri  # host only, the path usually holds an API key
+        self.log_filters = {}  # name -> eth_subscribe logs filter
+        self.stats = {"connected": False, "connects": 0, "disconnects": 0, "heads": 0, "logs": 0, "last_message_at": 0}
+        self._connection = None
+        self._requests = {}  # request id -> topic, until the node answers with a subscription id
+        self._subscriptions = {}  # subscription id -> topic
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """
+        Connect in a background thread. Does nothing if already started.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="ws-transport", daemon=True)
+        self._thread.start()
+
+    def is_connected(self):
+        return self.stats["connected"]
+
+    def add_log_subscription(self, name, log_filter):
+        """
+        Subscribe to logs matching `log_filter` ({"address": ..., "topics": [...]}), published as "logs:<name>".
+        Kept across reconnects.
+        """
+        with self._lock:
+            self.log_filters[name] = log_filter
+            connection = self._connection
+        if connection is not None:
+            self._subscribe(connection, f"logs:{name}", ["logs", log_filter])
+
+    def _subscribe(self, connection, topic, params):
+        request_id = next(self._ids)
+        with self._lock:
+            self._requests[request_id] = topic
+        connection.send(json.dumps({"jsonrpc": "2.0", "id": request_id, "method": "eth_subscribe", "params": params}))
+
+    def _handle(self, message):
+        message = json.loads(message)
+        self.stats["last_message_at"] = time.time()
+        if "id" in message:
+            with self._lock:
+                topic = self._requests.pop(message["id"], None)
+                if topic is not None and "result" in message:
+                    self._subscriptions[message["result"]] = topic
+            if "error" in message:
+                print(f"[ERROR] WebSocket subscription to {topic} failed: {message['error']}")
+            return
+
+        if message.get("method") != "eth_subscription":
+            return
+        params = message["params"]
+        topic = self._subscriptions.get(params["subscription"])
+        if topic == "new_head":
+            self.stats["heads"] += 1
+            publish("new_head", _format_header(params["result"]))
+        elif topic is not None:
+            self.stats["logs"] += 1
+            publish(topic, params["result"])
+
+    def _run(self):
+        delay = 1
+        while True:
+            try:
+                with connect(self.uri, ping_interval=WS_PING_INTERVAL, ping_timeout=WS_PING_INTERVAL, max_size=None) as connection:
+                    with self._lock:
+                        self._connection = connection
+                        self._requests.clear()
+                        self._subscriptions.clear()
+                        log_filters = dict(self.log_filters)
+                    self.stats["connected"] = True
+                    self.stats["connects"] += 1
+                    print(f"[DEBUG] WebSocket connected to {self.name}")
+                    delay = 1
+
+                    self._subscribe(connection, "new_head", ["newHeads"])
+                    for name, log_filter in log_filters.items():
+                        self._subscribe(connection, f"logs:{name}", ["logs", log_filter])
+                    for message in connection:
+                        self._handle(message)
+            except Exception as e:
+                print(f"[ERROR] WebSocket connection to {self.name} lost: {e}")
+            finally:
+                with self._lock:
+                    self._connection = None
+                if self.stats["connected"]:
+                    self.stats["disconnects"] += 1
+                self.stats["connected"] = False
+            time.sleep(delay)
+            delay = min(delay * 2, WS_RECONNECT_MAX_DELAY)
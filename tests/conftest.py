@@ -0,0 +1,9 @@
+import os
+import sys
+
+# the bot reads its config at import time, tests never reach these endpoints
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("ALCHEMY_URL", "http://127.0.0.1:1")
+os.environ.setdefault("METRICS_PORT", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
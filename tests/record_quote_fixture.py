@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared_data.shared_data import web3, get_chain_id
+from actions.contracts import encode_path
+from actions import pools
+from actions.pools import _get_pool_address, _load_pool, _sort_tokens
+from actions.quotes import quoter
+
+# Records a quote fixture for tests/test_v3_simulation.py: the state of every pool of a path and the
+# QuoterV2 output, all read at the same block. Needs the bot's .env with a Base RPC (ALCHEMY_URL).
+#
+#   python tests/record_quote_fixture.py --name weth_virtual --amount-in 1000000000000000000 \
+#       0x4200000000000000000000000000000000000006 3000 0x0b3e328455c4059EEb9e3f84b5543F74E24e7E1b
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "quotes")
+
+
+def pool_snapshot(pool):
+    """
+    JSON-friendly copy of a loaded pool state.
+    """
+    return {
+        "address": pool["address"],
+        "token0": pool["token0"],
+        "token1": pool["token1"],
+        "fee": pool["fee"],
+        "tick_spacing": pool["tick_spacing"],
+        "sqrt_price": pool["sqrt_price"],
+        "tick": pool["tick"],
+        "liquidity": pool["liquidity"],
+        "ticks": [[tick, pool["gross"][tick], pool["net"][tick]] for tick in pool["ticks"]],
+        "min_word": pool["min_word"],
+        "max_word": pool["max_word"],
+    }
+
+
+def record(tokens, fees, amount_in, block_number):
+    pools = []
+    for token_in, token_out, fee in zip(tokens, tokens[1:], fees):
+        address = _get_pool_address(token_in, token_out, fee)
+        if address is None:
+            raise Exception(f"No pool for {token_in}/{token_out}/{fee}")
+        pools.append(pool_snapshot(_load_pool(address, *_sort_tokens(token_in, token_out), fee, block_number=block_number)))
+    amount_out = quoter.functions.quoteExactInput(encode_path(tokens, fees), amount_in).call(block_identifier=block_number)[0]
+    return {
+        "chain_id": get_chain_id(),
+        "block": block_number,
+        "tokens": [token.lower() for token in tokens],
+        "fees": fees,
+        "amount_in": amount_in,
+        "pools": pools,
+        "quoter_amount_out": amount_out,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record pool states and a QuoterV2 output as a test fixture.")
+    parser.add_argument("--name", required=True, help="fixture file name, without .json")
+    parser.add_argument("--amount-in", type=int, required=True, help="raw amount of the first token")
+    parser.add_argument("--block", type=int, help="block to read at, the latest one by default")
+    parser.add_argument("--bitmap-words", type=int, default=pools.POOL_BITMAP_WORDS, help="tick bitmap words loaded on each side, for swaps moving the price far")
+    parser.add_argument("path", nargs="+", help="token fee token [fee token ...]")
+    args = parser.parse_args()
+
+    tokens, fees = args.path[::2], [int(fee) for fee in args.path[1::2]]
+    pools.POOL_BITMAP_WORDS = args.bitmap_words
+    fixture = record(tokens, fees, args.amount_in, args.block or web3.eth.block_number)
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    path = os.path.join(FIXTURES_DIR, args.name + ".json")
+    with open(path, "w") as f:
+        json.dump(fixture, f, indent=1)
+    print(f"[DEBUG] Recorded {path} at block {fixture['block']}: {fixture['quoter_amount_out']}")
+
+
+if __name__ == "__main__":
+    main()
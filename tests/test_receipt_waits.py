@@ -0,0 +1,49 @@
+import asyncio
+from concurrent.futures import Future
+from types import SimpleNamespace
+import pytest
+from actions import receipts
+from actions.transactions import ReceiptWait, _loop_future
+
+TX_HASH = "0x" + "ab" * 32
+
+
+def test_cancelled_waiter_leaves_the_shared_future_alone():
+    shared = Future()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        _loop_future(shared, loop).cancel()
+        # another trade waiting on the same transaction still gets its receipt
+        other = asyncio.create_task(ReceiptWait([TX_HASH], timeout=5, futures=[shared]).async_result())
+        await asyncio.sleep(0.01)
+        shared.set_result(SimpleNamespace(status=1))
+        return await other
+
+    result = asyncio.run(main())
+    assert not shared.cancelled()
+    assert result[0].status == 1
+
+
+def test_timeout_names_the_missing_transaction():
+    async def main():
+        return await ReceiptWait([TX_HASH], timeout=0.01, futures=[Future()]).async_result()
+
+    with pytest.raises(Exception, match=TX_HASH):
+        asyncio.run(main())
+
+
+def test_tracker_skips_futures_already_done(monkeypatch):
+    cancelled, pending = Future(), Future()
+    cancelled.cancel()
+    other_hash = "0x" + "cd" * 32
+    monkeypatch.setattr(receipts, "_pending", {
+        TX_HASH: {"future": cancelled, "tracked_at": 0},
+        other_hash: {"future": pending, "tracked_at": 0},
+    })
+    monkeypatch.setattr(receipts, "batch_request", lambda calls: [{"status": "0x1", "blockNumber": "0x10"}] * len(calls))
+
+    receipts._poll_receipts()
+
+    assert pending.result().status == 1
+    assert receipts._pending == {}
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from shared_data import rpc_router
+from shared_data.rpc_router import RPCRouterProvider
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    # routed on the first path segment, the rest stands for an API key:
+    # /fail answers 500, /flaky every second call, /slow and /fast answer eth_blockNumber with their own block number
+    delays = {"slow": 0.2, "fast": 0.0, "flaky": 0.0}
+    blocks = {"slow": "0x1", "fast": "0x2", "flaky": "0x3"}
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        route = self.path.split("/")[1]
+        self.server.calls.append("/" + route)
+        if route == "fail" or (route == "flaky" and self.server.calls.count("/flaky") % 2 == 0):
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        time.sleep(self.delays[route])
+        body = json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": self.blocks[route]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+    server.calls = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", server
+    server.shutdown()
+    server.server_close()
+
+
+def test_failing_endpoint_is_ranked_last(stand_in):
+    base, server = stand_in
+    router = RPCRouterProvider([base + "/fail", base + "/slow"])
+
+    for _ in range(3):
+        assert router.make_request("eth_blockNumber", [])["result"] == "0x1"
+
+    # tried first while unmeasured, then only behind the endpoint that answers
+    assert server.calls == ["/fail", "/slow", "/slow", "/slow"]
+    stats = router.endpoint_stats()
+    assert list(stats.values())[0]["error_rate"] == 1.0
+    assert list(stats.values())[1]["calls"] == 3
+
+
+def test_failing_endpoint_is_benched(stand_in, monkeypatch):
+    base, server = stand_in
+    monkeypatch.setattr(rpc_router, "RPC_ROUTER_MAX_FAILURES", 2)
+    router = RPCRouterProvider([base + "/fail"])
+
+    for _ in range(2):
+        with pytest.raises(Exception):
+            router.make_request("eth_blockNumber", [])
+
+    assert not list(router.endpoint_stats().values())[0]["healthy"]
+
+
+def test_faster_endpoint_on_the_same_host_is_preferred(stand_in):
+    base, server = stand_in
+    router = RPCRouterProvider([base + "/slow", base + "/fast"])
+
+    # unmeasured endpoints are tried first, in order, then the fastest one wins
+    router.make_request("eth_blockNumber", [])
+    results = [router.make_request("eth_blockNumber", [])["result"] for _ in range(3)]
+
+    assert results == ["0x2"] * 3
+    slow, fast = router.endpoint_stats().values()
+    assert slow["p50"] >= 0.2
+    assert fast["p50"] < 0.2
+
+
+def test_fast_endpoint_with_errors_goes_behind_a_reliable_one(stand_in):
+    base, server = stand_in
+    router = RPCRouterProvider([base + "/slow", base + "/flaky"])
+
+    results = [router.make_request("eth_blockNumber", [])["result"] for _ in range(5)]
+
+    # /flaky answers first, fails its second call, then the slower but reliable endpoint is used
+    assert results == ["0x1", "0x3", "0x1", "0x1", "0x1"]
+    assert server.calls == ["/slow", "/flaky", "/flaky", "/slow", "/slow", "/slow"]
+
+
+def test_stats_do_not_expose_the_endpoint_urls(stand_in):
+    base, server = stand_in
+    router = RPCRouterProvider([base + "/slow/v2/secret-key-1", base + "/fast/v2/secret-key-2"], [base + "/fast/v2/secret-key-3"])
+    router.make_request("eth_blockNumber", [])
+
+    host = base.split("//")[1]
+    assert list(router.endpoint_stats()) == [f"{host}#0", f"{host}#1", f"{host}#2"]
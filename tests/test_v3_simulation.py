@@ -0,0 +1,168 @@
+import glob
+import json
+import os
+from decimal import Decimal, getcontext
+import pytest
+from shared_data.shared_data import web3
+from actions.pools import SWAP_TOPIC, MINT_TOPIC, BURN_TOPIC, _apply_log, _simulate_swap
+from actions.v3_math import MIN_TICK, MAX_TICK, MIN_SQRT_RATIO, MAX_SQRT_RATIO, Q96, TICK_SPACINGS, get_sqrt_ratio_at_tick
+
+# recorded with tests/record_quote_fixture.py: pool states and the QuoterV2 output at one block, single pools and
+# whole buy/sell paths, with amounts staying inside the current ranges and amounts crossing initialized ticks
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "quotes")
+FIXTURES = sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.json")))
+
+TOKEN0 = "0x" + "11" * 20
+TOKEN1 = "0x" + "22" * 20
+L1 = 10**21  # position on [-600, 600]
+L2 = 5 * 10**20  # position on [-1200, 1200]
+
+
+def pool_from_snapshot(snapshot, block=100):
+    """
+    Pool state as loaded by actions.pools, from a fixture snapshot.
+    """
+    ticks = sorted(snapshot["ticks"])
+    return dict(
+        {key: value for key, value in snapshot.items() if key != "ticks"},
+        ticks=[tick for tick, _, _ in ticks],
+        gross={tick: gross for tick, gross, _ in ticks},
+        net={tick: net for tick, _, net in ticks},
+        block=block,
+        applied=(block, float("inf")),
+        loaded_at=0,
+        pending_logs=[],
+    )
+
+
+def two_position_pool(**changes):
+    snapshot = {
+        "address": "0x" + "33" * 20,
+        "token0": TOKEN0,
+        "token1": TOKEN1,
+        "fee": 3000,
+        "tick_spacing": TICK_SPACINGS[3000],
+        "sqrt_price": Q96,
+        "tick": 0,
+        "liquidity": L1 + L2,
+        "ticks": [[-1200, L2, L2], [-600, L1, L1], [600, L1, -L1], [1200, L2, -L2]],
+        "min_word": -2,
+        "max_word": 1,
+    }
+    snapshot.update(changes)
+    return pool_from_snapshot(snapshot)
+
+
+def ceil_div(a, b):
+    return -(-a // b)
+
+
+def reference_zero_for_one(sqrt_price, liquidity, amount_in, fee):
+    # whitepaper 6.15/6.16 with the rounding of the Solidity libraries, swap staying in one range
+    less_fee = amount_in * (10**6 - fee) // 10**6
+    sqrt_next = ceil_div(liquidity * Q96 * sqrt_price, liquidity * Q96 + less_fee * sqrt_price)
+    return liquidity * (sqrt_price - sqrt_next) // Q96
+
+
+def reference_one_for_zero(sqrt_price, liquidity, amount_in, fee):
+    less_fee = amount_in * (10**6 - fee) // 10**6
+    sqrt_next = sqrt_price + less_fee * Q96 // liquidity
+    return liquidity * Q96 * (sqrt_next - sqrt_price) // sqrt_next // sqrt_price
+
+
+def test_sqrt_ratio_at_tick_bounds():
+    # MIN_SQRT_RATIO and MAX_SQRT_RATIO are defined by TickMath as the ratios at MIN_TICK and MAX_TICK
+    assert get_sqrt_ratio_at_tick(MIN_TICK) == MIN_SQRT_RATIO
+    assert get_sqrt_ratio_at_tick(MAX_TICK) == MAX_SQRT_RATIO
+    assert get_sqrt_ratio_at_tick(0) == Q96
+    with pytest.raises(Exception):
+        get_sqrt_ratio_at_tick(MAX_TICK + 1)
+
+
+@pytest.mark.parametrize("tick", [-887272, -500000, -60000, -1, 1, 60, 12345, 200000, 887272])
+def test_sqrt_ratio_at_tick_matches_high_precision(tick):
+    getcontext().prec = 100
+    expected = (Decimal("1.0001") ** tick).sqrt() * Q96
+    # TickMath inverts the Q128.128 ratio for positive ticks, which keeps about 2^-64 relative precision
+    assert abs(get_sqrt_ratio_at_tick(tick) - expected) <= 1 + expected * Decimal("1e-18")
+
+
+@pytest.mark.parametrize("zero_for_one", [True, False])
+def test_swap_within_one_range(zero_for_one):
+    pool = two_position_pool()
+    amount_in = 10**18
+    if zero_for_one:
+        expected = reference_zero_for_one(Q96, L1 + L2, amount_in, 3000)
+    else:
+        expected = reference_one_for_zero(Q96, L1 + L2, amount_in, 3000)
+    assert _simulate_swap(pool, TOKEN0 if zero_for_one else TOKEN1, amount_in) == expected
+
+
+def test_swap_crossing_an_initialized_tick():
+    pool = two_position_pool()
+    amount_in = 5 * 10**19
+    sqrt_current, sqrt_boundary = Q96, get_sqrt_ratio_at_tick(-600)
+
+    # first step ends exactly on tick -600, the fee is taken on what it used
+    step_in = ceil_div(ceil_div((L1 + L2) * Q96 * (sqrt_current - sqrt_boundary), sqrt_current), sqrt_boundary)
+    step_fee = ceil_div(step_in * 3000, 10**6 - 3000)
+    step_out = (L1 + L2) * (sqrt_current - sqrt_boundary) // Q96
+    # crossing down leaves the [-600, 600] position
+    rest_out = reference_zero_for_one(sqrt_boundary, L2, amount_in - step_in - step_fee, 3000)
+
+    assert amount_in > step_in + step_fee
+    assert _simulate_swap(pool, TOKEN0, amount_in) == step_out + rest_out
+
+
+def test_swap_leaving_the_loaded_ticks_is_not_simulated():
+    pool = two_position_pool(min_word=-1, max_word=0)
+    assert _simulate_swap(pool, TOKEN0, 10**30) is None
+
+
+def _topic(value, kind):
+    return "0x" + web3.codec.encode([kind], [value]).hex()
+
+
+def _log(block, index, topics, types, values):
+    return {"blockNumber": block, "logIndex": index, "topics": topics, "data": "0x" + web3.codec.encode(types, values).hex()}
+
+
+def test_log_replay_matches_a_fresh_load():
+    pool = two_position_pool()
+    owner = _topic("0x" + "44" * 20, "address")
+    mint = _log(101, 0, [MINT_TOPIC, owner, _topic(-180, "int24"), _topic(180, "int24")],
+                ["address", "uint128", "uint256", "uint256"], ["0x" + "44" * 20, 3 * 10**20, 0, 0])
+    swap = _log(101, 1, [SWAP_TOPIC, owner, owner],
+                ["int256", "int256", "uint160", "uint128", "int24"], [10**18, -10**18, get_sqrt_ratio_at_tick(-30), L1 + L2 + 3 * 10**20, -30])
+    burn = _log(102, 0, [BURN_TOPIC, owner, _topic(-1200, "int24"), _topic(1200, "int24")],
+                ["uint128", "uint256", "uint256"], [L2, 0, 0])
+    stale = _log(100, 5, [BURN_TOPIC, owner, _topic(-600, "int24"), _topic(600, "int24")],
+                 ["uint128", "uint256", "uint256"], [L1, 0, 0])
+
+    # logs at or before the loaded block are already in the state, a log seen twice is applied once
+    for log in (stale, mint, swap, swap, burn, mint):
+        _apply_log(pool, log)
+
+    fresh = two_position_pool(
+        sqrt_price=get_sqrt_ratio_at_tick(-30),
+        tick=-30,
+        liquidity=L1 + 3 * 10**20,
+        ticks=[[-600, L1, L1], [-180, 3 * 10**20, 3 * 10**20], [180, 3 * 10**20, -3 * 10**20], [600, L1, -L1]],
+    )
+    assert pool["applied"] == (102, 0)
+    for key in ("sqrt_price", "tick", "liquidity", "ticks", "gross", "net"):
+        assert pool[key] == fresh[key], key
+    for token_in, amount_in in ((TOKEN0, 10**18), (TOKEN1, 10**18), (TOKEN0, 4 * 10**19)):
+        assert _simulate_swap(pool, token_in, amount_in) == _simulate_swap(fresh, token_in, amount_in)
+
+
+@pytest.mark.parametrize("path", FIXTURES or [None], ids=lambda path: os.path.basename(path or "none"))
+def test_simulation_matches_recorded_quoter_output(path):
+    assert path is not None, f"no quote fixture in {FIXTURES_DIR}, record some with tests/record_quote_fixture.py"
+    with open(path) as f:
+        fixture = json.load(f)
+    amount = fixture["amount_in"]
+    for token_in, snapshot in zip(fixture["tokens"], fixture["pools"]):
+        amount = _simulate_swap(pool_from_snapshot(snapshot, fixture["block"]), token_in, amount)
+        assert amount is not None, "the recorded swap left the loaded ticks, record more bitmap words"
+    assert amount == fixture["quoter_amount_out"]
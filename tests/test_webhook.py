@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+import pytest
+from types import SimpleNamespace
+from telebot import TeleBot, types
+from shared_data import dispatcher as dispatcher_module, metrics, webhook
+from shared_data.dispatcher import ChatDispatcher
+from shared_data.shared_data import TradingBot
+
+# a /start message as Telegram posts it to the webhook
+UPDATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "updates", "start_command.json")
+SECRET = "s3cret"
+
+
+@pytest.fixture
+def update_body():
+    with open(UPDATE_PATH, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """
+    Webhook server on a free port, with its own bot and dispatcher. Yields (post, bot, dispatcher).
+    """
+    dispatcher = ChatDispatcher(workers=1, queue_size=1)
+    monkeypatch.setattr(dispatcher_module, "dispatcher", dispatcher)
+    bot = TeleBot("123456:TEST", threaded=False)
+    server = webhook.start_webhook_server(bot, host="127.0.0.1", port=0, path="/telegram", secret=SECRET)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def post(body, secret=SECRET, path="/telegram"):
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{server.server_port}{path}",
+            data=body,
+            headers={"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": secret},
+        )
+        try:
+            return urllib.request.urlopen(request).status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    yield post, bot, dispatcher
+    server.shutdown()
+    server.server_close()
+
+
+def test_recorded_update_runs_its_handler(server, update_body):
+    post, bot, _ = server
+    handled = threading.Event()
+    seen = []
+
+    @bot.message_handler(commands=["start"])
+    def start(message):
+        seen.append((message.chat.id, message.text))
+        handled.set()
+
+    assert post(update_body) == 200
+    assert handled.wait(5)
+    assert seen == [(5203318765, "/start")]
+
+
+def test_wrong_secret_token_is_rejected(server, update_body):
+    post, bot, dispatcher = server
+    bot.message_handler(commands=["start"])(lambda message: pytest.fail("handler ran"))
+    rejected = webhook.webhook_stats["rejected"]
+
+    assert post(update_body, secret="wrong") == 403
+    assert post(update_body, secret="") == 403
+    assert webhook.webhook_stats["rejected"] == rejected + 2
+    assert dispatcher.stats["submitted"] == 0
+
+
+def test_invalid_body_and_unknown_path(server, update_body):
+    post, _, dispatcher = server
+    assert post(b"not json") == 400
+    assert post(update_body, path="/other") == 404
+    assert dispatcher.stats["submitted"] == 0
+
+
+def test_full_dispatcher_answers_503(server, update_body):
+    post, bot, dispatcher = server
+    release = threading.Event()
+    started = threading.Event()
+
+    @bot.message_handler(commands=["start"])
+    def start(message):
+        started.set()
+        release.wait(5)
+
+    # the single queue slot is held by the first update until its handler returns
+    assert post(update_body) == 200
+    assert started.wait(5)
+    queue_full = webhook.webhook_stats["queue_full"]
+    assert post(update_body) == 503
+    assert webhook.webhook_stats["queue_full"] == queue_full + 1
+    assert dispatcher.stats["refused"] == 1
+
+    release.set()
+    update = json.loads(update_body)
+    update["update_id"] += 1
+    for _ in range(50):
+        # Telegram retries, accepted once the slot is free again
+        if post(json.dumps(update).encode()) == 200:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail("update still refused after the handler returned")
+
+
+def test_webhook_needs_a_secret():
+    with pytest.raises(Exception, match="WEBHOOK_SECRET"):
+        webhook.start_webhook_server(TeleBot("123456:TEST", threaded=False), host="127.0.0.1", port=0, secret="")
+
+
+def test_webhook_without_secret_falls_back_to_polling(monkeypatch):
+    monkeypatch.setattr(webhook, "WEBHOOK_URL", "https://bot.example.com")
+    monkeypatch.setattr(webhook, "WEBHOOK_SECRET", "")
+    calls = []
+    bot = SimpleNamespace(
+        set_webhook=lambda **kwargs: calls.append("set_webhook"),
+        remove_webhook=lambda: calls.append("remove_webhook"),
+        polling=lambda: calls.append("polling"),
+    )
+
+    webhook.run_bot(bot)
+
+    assert calls == ["remove_webhook", "polling"]
+
+
+def test_polled_update_latency_is_recorded(monkeypatch, update_body):
+    monkeypatch.setattr(dispatcher_module, "dispatcher", ChatDispatcher(workers=1))
+    bot = TradingBot("123456:TEST", threaded=False)
+    handled = threading.Event()
+    bot.message_handler(commands=["start"])(lambda message: handled.set())
+    before = dict(metrics._update_metrics.get("message", {"count": 0}))
+
+    # what polling does with each batch of getUpdates
+    bot.process_new_updates([types.Update.de_json(json.loads(update_body))])
+
+    # the next getUpdates asks for the following updates only, even before the handlers ran
+    assert bot.last_update_id == json.loads(update_body)["update_id"]
+    assert handled.wait(5)
+    for _ in range(50):
+        if metrics._update_metrics.get("message", {"count": 0})["count"] == before["count"] + 1:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail("the polled update was not measured")